@@ -0,0 +1,83 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import config, capture, ledger, payments
+from synthetic import make_ledger
+
+# Capture queue benchmark: how long a clerk waits for "Save" when it goes
+# straight to the ledger against journaling it for the background flusher,
+# as the ledger grows and when every ledger write is slowed down as on a
+# busy network drive, plus how long the flusher takes to drain the queue.
+# Usage: python benchmarks/bench_capture.py --rows 10000 200000 1000000 --saves 200
+
+def make_payment(i):
+    """Build the records of one monthly fee payment for a fresh student"""
+    return payments.build_fee_records(
+        f"Capture Student {i}", "Class 5", "A", "Monthly Fee", 2000, 2000,
+        "Cash", date(2025, 6, 1), "bench", months=["JUNE"]
+    )
+
+def time_saves(save, start, count):
+    """Latency of each of count saves, in seconds"""
+    latencies = []
+    for i in range(start, start + count):
+        records = make_payment(i)
+        began = time.perf_counter()
+        save(records)
+        latencies.append(time.perf_counter() - began)
+    return latencies
+
+def describe(latencies):
+    """Median and worst latency in milliseconds"""
+    return f"median {statistics.median(latencies) * 1000:7.2f} ms, worst {max(latencies) * 1000:8.2f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark save latency through the capture queue")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 200_000, 1_000_000])
+    parser.add_argument("--saves", type=int, default=200)
+    parser.add_argument("--slow-write", type=float, default=0.2, help="seconds added to each ledger write")
+    args = parser.parse_args()
+
+    append_records = ledger.append_records
+    def slow_append_records(records):
+        time.sleep(args.slow_write)
+        return append_records(records)
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as data_dir:
+            config.DATA_DIR = data_dir
+            payments.initialize_data_files()
+            payments.replace_records(make_ledger(rows))
+            ledger.get_ledger_table()
+
+            direct = time_saves(lambda records: payments.save_records(records, actor="bench"), 0, args.saves)
+            queued = time_saves(lambda records: capture.capture_records(records, actor="bench"), args.saves, args.saves)
+            start = time.perf_counter()
+            while capture.count_pending():
+                time.sleep(0.01)
+            drain_seconds = time.perf_counter() - start
+
+            ledger.append_records = slow_append_records
+            slow_direct = time_saves(lambda records: payments.save_records(records, actor="bench"), 2 * args.saves, 10)
+            slow_queued = time_saves(lambda records: capture.capture_records(records, actor="bench"), 3 * args.saves, args.saves)
+            while capture.count_pending():
+                time.sleep(0.01)
+            ledger.append_records = append_records
+
+            print(f"{rows:,} ledger rows, {args.saves} saves:")
+            print(f"  straight to ledger:        {describe(direct)}")
+            print(f"  capture queue:             {describe(queued)}  (queue drained {drain_seconds:.2f} s after the last save)")
+            print(f"  +{args.slow_write:.1f} s per ledger write:")
+            print(f"    straight to ledger:      {describe(slow_direct)}")
+            print(f"    capture queue:           {describe(slow_queued)}")
+            print(f"  ledger rows after: {ledger.get_ledger_table().num_rows:,}")
+
+if __name__ == "__main__":
+    main()
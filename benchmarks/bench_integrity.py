@@ -0,0 +1,71 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from fees import config, integrity, students
+from synthetic import make_ledger
+
+# Integrity checker benchmark: stream a multi-million-row ledger with some
+# injected corruption, writing the issue report and a repaired Arrow copy,
+# and compare its peak memory with loading the whole file with pandas.
+# Usage: python benchmarks/bench_integrity.py --rows 2000000
+
+CORRUPT_LINES = [
+    "bad,line",
+    ",,,,,,,,,,,,,",
+    "0000ABCD,Student 1,Nursery,A,APRIL,-2000,0,0,-2000,Cash,2023-05-01,bench,2023-05-01 09:00:00,2023-2024",
+    "0000ABCD,Student 1,Nursery,A,MAY,2000,0,0,abc,Cash,31-02-2023,bench,,2020-2021",
+]
+
+def write_ledger(path, n_rows, chunk_rows=200_000):
+    """Write a synthetic ledger with generated IDs and a corrupt line every 10,000 rows"""
+    student_ids = {}
+    for seed, start in enumerate(range(0, n_rows, chunk_rows)):
+        df = make_ledger(min(chunk_rows, n_rows - start), n_students=n_rows // 12, seed=seed)
+        for pair in zip(df["Student Name"], df["Class Category"]):
+            if pair not in student_ids:
+                student_ids[pair] = students.generate_student_id(*pair)
+        df["ID"] = [student_ids[pair] for pair in zip(df["Student Name"], df["Class Category"])]
+        df.to_csv(path, mode='a' if start else 'w', header=not start, index=False)
+        with open(path, 'a') as f:
+            f.writelines(f"{CORRUPT_LINES[i % len(CORRUPT_LINES)]}\n" for i in range(len(df) // 10_000))
+
+def run_child(args):
+    """Run a Python child process, returning its output and the peak RSS of the children so far in MB"""
+    output = subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=ROOT_DIR).stdout
+    return output, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ledger integrity checker")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--block-size", type=int, default=integrity.BLOCK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        csv_file = os.path.join(data_dir, config.CSV_FILE)
+        write_ledger(csv_file, args.rows)
+        size_mb = os.path.getsize(csv_file) / 1024 / 1024
+
+        # Each side runs in its own process, so peak memory is its own
+        start = time.perf_counter()
+        output, check_mb = run_child([
+            "-m", "fees.integrity", "--ledger", csv_file, "--block-size", str(args.block_size),
+            "--report", os.path.join(data_dir, "report.csv"), "--repair", os.path.join(data_dir, "repaired.arrow")
+        ])
+        elapsed = time.perf_counter() - start
+        _, load_mb = run_child(["-c", f"import pandas as pd; pd.read_csv({csv_file!r}, dtype=str, on_bad_lines='skip')"])
+
+        print(f"{size_mb:.0f} MB ledger, read in {args.block_size / 1024 / 1024:.0f} MB blocks")
+        print(f"  check + report + repaired Arrow copy: {elapsed:.1f} s")
+        print(f"  peak RSS: checker {check_mb:.0f} MB, whole-file pandas load {max(load_mb, check_mb):.0f} MB")
+        print("  " + "\n  ".join(line for line in output.splitlines() if not line.startswith("    ")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pyarrow.compute as pc
+from fees import config, ledger, payments, query
+from synthetic import make_ledger
+
+# Ledger query benchmark: typical filtered reads through fees.query against
+# the ad-hoc pattern of loading the whole ledger as a DataFrame and masking
+# it, and against filtering every row of the shared Arrow table.
+# Usage: python benchmarks/bench_query.py --rows 200000 1000000
+
+def time_call(fn, repeat):
+    """Average seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filtered ledger reads")
+    parser.add_argument("--rows", type=int, nargs="+", default=[200_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as data_dir:
+            config.DATA_DIR = data_dir
+            payments.initialize_data_files()
+            df = make_ledger(rows)
+            payments.replace_records(df)
+            table = ledger.get_ledger_table()
+            student_id = df["ID"].iloc[0]
+
+            cases = [
+                (
+                    "one student, one year",
+                    lambda: query.find_records(student_id=student_id, academic_year="2024-2025"),
+                    lambda frame: frame[(frame["ID"] == student_id) & (frame["Academic Year"] == "2024-2025")],
+                    lambda: table.filter(pc.and_(
+                        pc.equal(table["ID"], student_id), pc.equal(table["Academic Year"], "2024-2025")
+                    )).to_pandas(),
+                ),
+                (
+                    "class totals, year + 2 months",
+                    lambda: query.aggregate_records("Class Category", academic_year="2024-2025", month=["APRIL", "MAY"]),
+                    lambda frame: frame[(frame["Academic Year"] == "2024-2025") & frame["Month"].isin(["APRIL", "MAY"])]
+                        .groupby("Class Category")[config.AMOUNT_COLUMNS].sum(),
+                    lambda: table.filter(pc.and_(
+                        pc.equal(table["Academic Year"], "2024-2025"), pc.is_in(table["Month"], pc.cast(["APRIL", "MAY"], "string"))
+                    )).group_by("Class Category").aggregate([(col, "sum") for col in config.AMOUNT_COLUMNS]),
+                ),
+                (
+                    "cash in one month",
+                    lambda: query.find_records(date_from="2024-05-01", date_to="2024-05-31", payment_method="Cash"),
+                    lambda frame: frame[
+                        pd.to_datetime(frame["Date"], format="%d-%m-%Y").between("2024-05-01", "2024-05-31")
+                        & (frame["Payment Method"] == "Cash")
+                    ],
+                    lambda: table.filter(pc.and_(
+                        pc.and_(
+                            pc.greater_equal(pc.strptime(table["Date"], format="%d-%m-%Y", unit="s"), pc.strptime("01-05-2024", format="%d-%m-%Y", unit="s")),
+                            pc.less_equal(pc.strptime(table["Date"], format="%d-%m-%Y", unit="s"), pc.strptime("31-05-2024", format="%d-%m-%Y", unit="s")),
+                        ),
+                        pc.equal(table["Payment Method"], "Cash"),
+                    )).to_pandas(),
+                ),
+            ]
+
+            print(f"{rows:,} ledger rows (ms per query):")
+            print(f"  {'':32}{'query':>10}{'first call':>12}{'load + mask':>13}{'table scan':>12}")
+            for label, run_query, mask_frame, scan_table in cases:
+                query._query_indexes.clear()
+                first = time_call(run_query, 1)
+                indexed = time_call(run_query, args.repeat)
+                masked = time_call(lambda: mask_frame(ledger.load_ledger_frame()), max(args.repeat // 10, 1))
+                scanned = time_call(scan_table, max(args.repeat // 4, 1))
+                print(f"  {label:32}{indexed * 1000:10.2f}{first * 1000:12.1f}{masked * 1000:13.1f}{scanned * 1000:12.2f}")
+
+if __name__ == "__main__":
+    main()
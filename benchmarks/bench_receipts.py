@@ -0,0 +1,93 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import pyarrow.compute as pc
+from fees import config, ledger, payments, receipts
+from synthetic import make_ledger
+
+# Receipt numbering benchmark: allocation throughput with per-process blocks
+# against taking the counter file lock for every number, uniqueness across
+# threads and processes, and receipt lookup through the index against
+# filtering the ledger table.
+# Usage: python benchmarks/bench_receipts.py --allocations 20000 --rows 200000
+
+def time_allocations(count, threads):
+    """Seconds to allocate count receipt numbers across threads, and the numbers allocated"""
+    numbers = []
+    def allocate():
+        for _ in range(count // threads):
+            numbers.extend(receipts.allocate_receipt_numbers("2025-2026"))
+    workers = [threading.Thread(target=allocate) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, numbers
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark receipt number allocation and lookup")
+    parser.add_argument("--allocations", type=int, default=20_000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = data_dir
+        print(f"{args.allocations:,} receipt numbers:")
+        for block_size in (1, receipts.RECEIPT_BLOCK_SIZE):
+            receipts.RECEIPT_BLOCK_SIZE = block_size
+            for threads in (1, 4):
+                receipts._blocks.clear()
+                seconds, numbers = time_allocations(args.allocations, threads)
+                print(f"  block of {block_size:>3}, {threads} thread(s): {seconds / len(numbers) * 1e6:8.1f} us per number, "
+                      f"{len(set(numbers)) == len(numbers) and 'all unique' or 'DUPLICATES'}")
+
+        code = (
+            "import sys; from fees import config, receipts; config.DATA_DIR = sys.argv[1]; "
+            f"print('\\n'.join(n for _ in range({args.allocations // args.processes}) "
+            "for n in receipts.allocate_receipt_numbers('2026-2027')))"
+        )
+        children = [
+            subprocess.Popen([sys.executable, "-c", code, data_dir], stdout=subprocess.PIPE, text=True, cwd=ROOT_DIR)
+            for _ in range(args.processes)
+        ]
+        numbers = [number for child in children for number in child.communicate()[0].split()]
+        print(f"  {args.processes} processes: {len(numbers):,} numbers, "
+              f"{len(set(numbers)) == len(numbers) and 'all unique' or 'DUPLICATES'}")
+
+        df = make_ledger(args.rows)
+        # Rows of the same student on the same day share a receipt
+        payment_ids = df.groupby(["ID", "Date"], sort=False).ngroup()
+        df["Receipt No"] = [receipts.format_receipt_number("2025-2026", number + 1) for number in payment_ids]
+        payments.replace_records(df)
+        table = ledger.get_ledger_table()
+        lookups = [df["Receipt No"].iloc[i] for i in range(0, len(df), max(len(df) // args.lookups, 1))]
+
+        start = time.perf_counter()
+        receipts.get_receipt_index()
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for receipt_number in lookups:
+            receipts.find_receipt(receipt_number)
+        index_seconds = (time.perf_counter() - start) / len(lookups)
+        start = time.perf_counter()
+        for receipt_number in lookups[:50]:
+            table.filter(pc.equal(table["Receipt No"], receipt_number)).to_pandas()
+        scan_seconds = (time.perf_counter() - start) / min(len(lookups), 50)
+
+        print(f"{args.rows:,} ledger rows, {payment_ids.max() + 1:,} receipts:")
+        print(f"  lookup: index {index_seconds * 1000:.3f} ms | table scan {scan_seconds * 1000:.3f} ms"
+              f" (index built once per ledger version in {build_seconds * 1000:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import config, ledger, payments, query, reminders, students
+from synthetic import make_ledger
+
+# Defaulter pipeline benchmark: the whole-school defaulter list in one pass,
+# against checking students one at a time the way the Enter Fees page does,
+# plus rendering and writing every reminder to the outbox.
+# Usage: python benchmarks/bench_reminders.py --rows 200000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the defaulter list and reminder outbox")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--academic-year", default="2025-2026")
+    parser.add_argument("--month", default="OCTOBER", choices=config.MONTHS)
+    parser.add_argument("--sample", type=int, default=200, help="students checked one at a time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = data_dir
+        payments.initialize_data_files()
+        payments.replace_records(make_ledger(args.rows))
+        ledger.get_ledger_table()
+
+        start = time.perf_counter()
+        defaulters = reminders.find_defaulters(args.academic_year, args.month)
+        batch_seconds = time.perf_counter() - start
+
+        student_ids = query.find_records(["ID"], academic_year=args.academic_year)["ID"].unique()
+        start = time.perf_counter()
+        for student_id in student_ids[:args.sample]:
+            students.get_unpaid_months(student_id, args.academic_year)
+            students.check_annual_admission_paid(student_id, args.academic_year)
+        per_student = (time.perf_counter() - start) / min(args.sample, len(student_ids))
+
+        start = time.perf_counter()
+        reminders.write_outbox(defaulters, args.academic_year, args.month)
+        outbox_seconds = time.perf_counter() - start
+
+        print(f"{args.rows:,} ledger rows, {len(student_ids):,} students in {args.academic_year}, "
+              f"{len(defaulters):,} defaulters as of {args.month}")
+        print(f"  defaulter list, one pass:       {batch_seconds:8.2f} s")
+        print(f"  one student at a time (est.):   {per_student * len(student_ids):8.2f} s"
+              f"  ({per_student * 1000:.1f} ms x {len(student_ids):,})")
+        print(f"  letters + SMS to outbox:        {outbox_seconds:8.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.elements.arrow import marshall
+from streamlit.proto.ArrowData_pb2 import ArrowData as ArrowProto
+
+import main as app
+from fees import config
+from synthetic import make_ledger
+
+# Render-cost benchmark for fee tables: cell-by-cell Styler formatting versus
+# precomputed display columns, measured up to the payload sent to the browser.
+# Usage: python benchmarks/bench_render.py --rows 100 1000 10000
+
+def styler_payload(df):
+    """Build the table payload the way the app did with Styler.format"""
+    proto = ArrowProto()
+    marshall(proto, df.style.format({col: app.format_currency for col in config.AMOUNT_COLUMNS}), default_uuid="bench")
+    return proto
+
+def display_payload(df):
+    """Build the table payload from precomputed currency columns"""
+    display_df = df.copy()
+    for col in config.AMOUNT_COLUMNS:
+        display_df[col] = app.format_currency_column(df[col])
+    display_df.insert(0, "Status", app.get_row_status(df))
+    proto = ArrowProto()
+    marshall(proto, display_df)
+    return proto
+
+def time_payload(build, df, repeat):
+    """Return the best time and payload size over repeat builds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proto = build(df)
+        best = min(best, time.perf_counter() - start)
+    return best, proto.ByteSize()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fee table render cost")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    columns = [
+        "Student Name", "Month", "Monthly Fee", "Annual Charges",
+        "Admission Fee", "Received Amount", "Payment Method", "Date", "Academic Year"
+    ]
+    for rows in args.rows:
+        df = make_ledger(rows)[columns]
+        styler_seconds, styler_bytes = time_payload(styler_payload, df, args.repeat)
+        display_seconds, display_bytes = time_payload(display_payload, df, args.repeat)
+        print(f"{rows:>8,} rows: Styler {styler_seconds:7.3f}s {styler_bytes / 1024:9.0f} KiB | "
+              f"display columns {display_seconds:7.3f}s {display_bytes / 1024:9.0f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import config, reports
+from fees.ledger import to_typed_ledger
+from synthetic import make_ledger
+
+# Scaling benchmark for the parallel report executor. Each worker count is
+# timed end to end, as a report run by aggregate_ledger pays for it: writing
+# the partitions, starting the worker processes and aggregating. The last
+# line times aggregate_ledger itself, which stays in one process below
+# reports.PARALLEL_MIN_CPUS CPUs.
+# Usage: python benchmarks/bench_reports.py --rows 2000000 --workers 1 2 4 8
+
+def time_call(func, *args, **kwargs):
+    """Run func once and return (seconds, result)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel ledger reports")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    group_by = ["Academic Year", "Class Category"]
+    value_columns = config.AMOUNT_COLUMNS
+
+    print(f"Generating {args.rows:,} ledger rows on {os.cpu_count()} CPU(s)...")
+    df = make_ledger(args.rows)
+
+    seconds, expected = time_call(
+        lambda: reports.merge_partials(
+            [reports.aggregate_frame(to_typed_ledger(df[group_by + value_columns]), group_by, value_columns)],
+            group_by, value_columns
+        )
+    )
+    print(f"{'single process':>20}: {seconds:8.3f}s")
+
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as out_dir:
+            write_seconds, paths = time_call(
+                reports.write_partitions, df[group_by + value_columns], out_dir, num_partitions=workers
+            )
+            executor = reports.get_report_executor(workers)
+            # Time the first task on its own, since it waits for a worker to start
+            startup_seconds, _ = time_call(lambda: executor.submit(int, 0).result())
+            agg_seconds, result = time_call(reports.parallel_aggregate, paths, group_by, value_columns, executor)
+            executor.shutdown()
+        total_seconds = time.perf_counter() - start
+
+        assert result.sort_values(group_by).reset_index(drop=True).equals(
+            expected.sort_values(group_by).reset_index(drop=True)
+        )
+        print(f"{f'{workers} worker(s)':>20}: {total_seconds:8.3f}s ({write_seconds:.3f}s partition write, "
+              f"{startup_seconds:.3f}s first worker start, {agg_seconds:.3f}s aggregate)")
+
+    seconds, _ = time_call(reports.aggregate_ledger, df, group_by, value_columns)
+    path = "worker processes" if reports.use_workers(len(df)) else "one process"
+    print(f"{'aggregate_ledger':>20}: {seconds:8.3f}s ({path})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import payments, users
+from synthetic import make_ledger
+
+# Click-to-refreshed-panel benchmark for "Save Fee Record" on the Enter Fees page.
+# Times the run that follows the click and lists the data files opened by the
+# save itself and by the refresh of the panel after it.
+# Usage: python benchmarks/bench_save_refresh.py --rows 200000 --runs 5
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILES = ["main.py", "fees"]
+DATA_FILES = [".csv", ".json", ".jsonl", ".arrow"]
+
+RUNNER = """
+import json, os, sys, time
+from streamlit.testing.v1 import AppTest
+import fees.payments
+
+data_exts = tuple(json.loads(sys.argv[2]))
+opened = {"save": [], "refresh": []}
+phase = [None]
+
+def audit(event, args):
+    if phase[0] and event == "open" and isinstance(args[0], str) and args[0].endswith(data_exts):
+        opened[phase[0]].append(f"{os.path.basename(args[0])} ({args[1]})")
+
+sys.addaudithook(audit)
+
+# Everything after the save returns is the refresh of the panel
+save_records = fees.payments.save_records
+def timed_save_records(records, **kwargs):
+    phase[0] = "save"
+    result = save_records(records, **kwargs)
+    phase[0] = "refresh"
+    return result
+fees.payments.save_records = timed_save_records
+
+at = AppTest.from_file("main.py", default_timeout=120)
+at.session_state.authenticated = True
+at.session_state.current_user = "bench"
+at.session_state.is_admin = True
+at.run()
+at.text_input(key="student_name_0").set_value(sys.argv[1])
+[b for b in at.button if "Check Student Records" in b.label][0].click().run()
+at.selectbox(key="month_select_0").set_value(at.session_state.available_months[0])
+at.text_input(key="signature_0").set_value("bench")
+
+start = time.perf_counter()
+[b for b in at.button if "Save" in b.label][0].click().run()
+elapsed = time.perf_counter() - start
+phase[0] = None
+
+print(json.dumps({
+    "seconds": elapsed,
+    "opened": opened,
+    "exceptions": [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+}))
+"""
+
+def measure(app_dir, student_name):
+    """Save one fee record in a fresh app session and return its timing record"""
+    result = subprocess.run(
+        [sys.executable, "-c", RUNNER, student_name, json.dumps(DATA_FILES)],
+        cwd=app_dir, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the refresh after saving a fee record")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as app_dir:
+        for name in APP_FILES:
+            source = os.path.join(REPO_DIR, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(app_dir, name), ignore=shutil.ignore_patterns("__pycache__"))
+            else:
+                shutil.copy(source, app_dir)
+
+        print(f"Generating {args.rows:,} ledger rows...")
+        cwd = os.getcwd()
+        os.chdir(app_dir)
+        try:
+            payments.initialize_data_files()
+            payments.replace_records(make_ledger(args.rows))
+            users.create_user("bench", "bench", "bench@gmail.com", is_admin=True)
+        finally:
+            os.chdir(cwd)
+
+        # A new student per run, so every save is accepted
+        records = [measure(app_dir, f"Bench Student {i}") for i in range(args.runs)]
+        errors = [err for record in records for err in record["exceptions"]]
+        if errors:
+            raise SystemExit(f"Save failed: {errors[0]}")
+
+        seconds = [record["seconds"] for record in records]
+        opened = records[-1]["opened"]
+        print(f"click to refreshed panel: median {statistics.median(seconds):.3f}s, "
+              f"min {min(seconds):.3f}s over {args.runs} runs")
+        for phase in ["save", "refresh"]:
+            print(f"data files opened during the {phase}: {len(opened[phase])} {opened[phase]}")
+
+if __name__ == "__main__":
+    main()
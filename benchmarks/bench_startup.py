@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Time-to-first-render benchmark for the landing page and the first main_app() view.
+# Every run uses a fresh interpreter, so module import cost is included.
+# Usage: python benchmarks/bench_startup.py --runs 5
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILES = ["main.py", "fees"]
+
+RUNNER = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+view = sys.argv[1]
+at = AppTest.from_file("main.py", default_timeout=120)
+if view == "main_app":
+    at.session_state.authenticated = True
+    at.session_state.current_user = "bench"
+    at.session_state.is_admin = False
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "exceptions": [str(e.value) for e in at.exception],
+    "pandas_loaded": "pandas.core" in sys.modules
+}))
+"""
+
+def measure(view, app_dir):
+    """Render one view in a fresh interpreter and return its timing record"""
+    result = subprocess.run(
+        [sys.executable, "-c", RUNNER, view],
+        cwd=app_dir, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-start render time")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as app_dir:
+        for name in APP_FILES:
+            source = os.path.join(REPO_DIR, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(app_dir, name), ignore=shutil.ignore_patterns("__pycache__"))
+            else:
+                shutil.copy(source, app_dir)
+        # The main_app view needs a logged-in account that exists
+        subprocess.run(
+            [sys.executable, "-c", "from fees import users; users.create_user('bench', 'bench', 'bench@gmail.com')"],
+            cwd=app_dir, check=True
+        )
+
+        for view in ["home_page", "main_app"]:
+            records = [measure(view, app_dir) for _ in range(args.runs)]
+            errors = [err for record in records for err in record["exceptions"]]
+            if errors:
+                raise SystemExit(f"{view} raised: {errors[0]}")
+            seconds = [record["seconds"] for record in records]
+            print(
+                f"{view:>10}: median {statistics.median(seconds):.3f}s, "
+                f"min {min(seconds):.3f}s over {args.runs} runs, "
+                f"pandas loaded: {records[-1]['pandas_loaded']}"
+            )
+
+if __name__ == "__main__":
+    main()
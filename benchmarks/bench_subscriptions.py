@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import config, storage, subscriptions, users
+
+# Subscription expiry benchmark: per-rerun expiry checks and "expiring this
+# week" listings over many accounts, against parsing trial_end each time.
+# Usage: python benchmarks/bench_subscriptions.py --users 10000
+
+def make_users(n_users, seed=0):
+    """Build accounts with trials ending up to 60 days either side of now"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    accounts = {}
+    for i in range(n_users):
+        trial_end = now + timedelta(seconds=rng.randint(-60, 60) * subscriptions.DAY_SECONDS)
+        accounts[f"user{i}"] = {
+            "password": users.hash_password("pw"),
+            "is_admin": False,
+            "email": f"user{i}@gmail.com",
+            "trial_end": trial_end.strftime("%Y-%m-%d %H:%M:%S"),
+            "trial_end_ts": int(trial_end.timestamp())
+        }
+    return accounts
+
+def time_calls(func, repeat):
+    """Average seconds per call over repeat calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark subscription expiry checks")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = data_dir
+        storage.write_json(config.data_path(config.USER_DB_FILE), make_users(args.users), indent=None)
+        week = 7 * subscriptions.DAY_SECONDS
+
+        def parse_check():
+            user = users.load_users()["user42"]
+            return datetime.now() < datetime.strptime(user["trial_end"], "%Y-%m-%d %H:%M:%S")
+
+        def parse_expiring():
+            cutoff = datetime.now() + timedelta(days=7)
+            return sorted(
+                (datetime.strptime(user["trial_end"], "%Y-%m-%d %H:%M:%S"), username)
+                for username, user in users.load_users().items()
+                if datetime.strptime(user["trial_end"], "%Y-%m-%d %H:%M:%S") <= cutoff
+            )
+
+        build_seconds = time_calls(lambda: subscriptions.build_expiry_index(users.load_users()), 3)
+        subscriptions.get_expiry_index()
+        expiring = subscriptions.list_expiring(week)
+        assert len(expiring) == len(parse_expiring())
+
+        print(f"{args.users:,} accounts, {len(expiring):,} expired or expiring within 7 days")
+        print(f"  expiry check per rerun: parse users.json {time_calls(parse_check, 20) * 1000:8.3f} ms"
+              f" | index {time_calls(lambda: subscriptions.is_active('user42'), args.repeat * 10) * 1000:8.3f} ms")
+        print(f"  expiring this week:     parse users.json {time_calls(parse_expiring, 5) * 1000:8.3f} ms"
+              f" | heap  {time_calls(lambda: subscriptions.list_expiring(week), args.repeat) * 1000:8.3f} ms")
+        print(f"  index rebuild after users.json changes: {build_seconds * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        extended = subscriptions.extend_trials(30)
+        print(f"  extend all trials by 30 days: {extended:,} accounts in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fees import config, ledger, students, tenants, payments
+from synthetic import make_ledger
+
+# Multi-school benchmark: many schools in one process, looked up in random
+# order, with the number of schools kept in memory bounded by the LRU cache.
+# Usage: python benchmarks/bench_tenants.py --schools 40 --rows 20000 --cached 4 16 40
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serving many schools from one process")
+    parser.add_argument("--schools", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--cached", type=int, nargs="+", default=[4, 16, 40])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = data_dir
+        print(f"Creating {args.schools} schools with {args.rows:,} ledger rows each...")
+        school_ids = [f"school-{i:03d}" for i in range(args.schools)]
+        for i, school_id in enumerate(school_ids):
+            tenants.create_tenant(school_id, None)
+            with config.use_tenant(school_id):
+                payments.replace_records(make_ledger(args.rows, seed=i))
+
+        student_ids = make_ledger(args.rows)["ID"].unique().tolist()
+        for cached in args.cached:
+            config.MAX_CACHED_TENANTS = cached
+            rng = random.Random(0)
+            start = time.perf_counter()
+            for _ in range(args.lookups):
+                with config.use_tenant(rng.choice(school_ids)):
+                    students.get_unpaid_months(rng.choice(student_ids), "2024-2025")
+            elapsed = time.perf_counter() - start
+            max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{cached:>3} schools cached: {elapsed / args.lookups * 1000:6.2f} ms per lookup, "
+                  f"{len(ledger._ledger_tables)} ledgers in memory, peak RSS {max_rss_mb:.0f} MB")
+
+if __name__ == "__main__":
+    main()
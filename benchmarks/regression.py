@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyarrow as pa
+from fees import config, ledger, payments, schedules, students, users
+from synthetic import make_ledger
+
+# Regression suite for the data functions the app is built on, run on
+# synthetic ledgers of 1k, 100k and 1M rows. Each case is timed (median of
+# several calls after a warm-up call), and the peak memory of one more call
+# is measured as the tracemalloc peak of Python and NumPy allocations plus
+# the peak of a fresh Arrow memory pool, since pandas keeps strings in Arrow
+# memory. Each ledger size runs in its own process.
+#
+# Results are compared with the baselines of the machine running the suite
+# in baselines.json; the run fails when a case is slower than
+# LATENCY_TOLERANCE times its baseline, or its peak memory grows past
+# MEMORY_TOLERANCE times its baseline, beyond a small absolute slack for very
+# fast or very small cases.
+#
+# Timings depend on the machine, so baselines.json keeps one set per machine,
+# keyed by architecture, CPU count and Python version (or FEES_BENCH_MACHINE
+# to name a machine explicitly), and is committed. The reference machine,
+# the CI runner, records its baselines with --update after each merge to the
+# main branch and runs the plain comparison on every change. A run on a
+# machine, or of a case, with no baseline cannot pass: it prints the results
+# and exits with status 2 rather than reporting no regressions.
+#
+# Usage: python benchmarks/regression.py                 # compare with this machine's baselines
+#        python benchmarks/regression.py --update        # record this machine's baselines
+#        python benchmarks/regression.py --sizes 1000 100000
+
+SIZES = [1_000, 100_000, 1_000_000]
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+MISSING_BASELINE_STATUS = 2
+LATENCY_TOLERANCE = 1.5
+MEMORY_TOLERANCE = 1.2
+LATENCY_SLACK_SECONDS = 0.002
+MEMORY_SLACK_MB = 2.0
+
+# Case names are the functions the app started with; each is measured on the
+# service call that does that job today
+CASES = [
+    "load_data",                    # ledger.load_ledger: parse the ledger CSV
+    "save_to_csv",                  # payments.save_records: append one payment
+    "update_data",                  # payments.replace_records: rewrite the whole ledger
+    "get_unpaid_months",            # students.get_unpaid_months
+    "check_annual_admission_paid",  # students.check_annual_admission_paid
+    "load_student_fees",            # schedules.load_student_fees
+    "create_user",                  # users.create_user
+    "authenticate_user",            # users.authenticate_user
+]
+
+def get_repeats(rows):
+    """Timed calls per case; fewer for the big ledgers, whose slow cases take seconds"""
+    return 15 if rows <= 1_000 else 5 if rows <= 100_000 else 3
+
+# Buffers allocated while a case is measured (e.g. rows appended to the
+# cached ledger table) outlive the case, so its memory pool must too
+_pools = []
+
+def make_users(count):
+    """Build a user database of count accounts with active trials"""
+    trial_end = datetime.now().replace(microsecond=0) + timedelta(days=config.TRIAL_DAYS)
+    return {
+        f"user{i}": {
+            "password": users.hash_password(f"password{i}"),
+            "is_admin": False,
+            "email": f"user{i}@gmail.com",
+            "created_at": "2025-01-01 00:00:00",
+            "trial_start": "2025-01-01 00:00:00",
+            "trial_end": trial_end.strftime("%Y-%m-%d %H:%M:%S"),
+            "trial_end_ts": int(trial_end.timestamp())
+        }
+        for i in range(count)
+    }
+
+def build_cases(rows):
+    """Set up a data directory with a ledger of the given size and return each case's call"""
+    df = make_ledger(rows)
+    payments.initialize_data_files()
+    payments.replace_records(df)
+    student_ids = df["ID"].drop_duplicates().tolist()
+    schedules.save_student_fees({
+        student_id: {"monthly_fee": 2500, "annual_charges": 6000, "admission_fee": 1500}
+        for student_id in student_ids
+    })
+    user_count = max(rows // 100, 10)
+    users.save_users(make_users(user_count))
+    ledger.get_ledger_table()
+
+    counter = iter(range(10**9))
+    def save_one_payment():
+        i = next(counter)
+        payments.save_records(payments.build_fee_records(
+            f"Regression Student {i}", "Class 4", "B", "Monthly Fee", 2000, 2000,
+            "Cash", date(2025, 6, 2), "bench", months=["JUNE"]
+        ), actor="bench")
+
+    def create_one_user():
+        i = next(counter)
+        users.create_user(f"new{i}", "secret", f"new{i}@gmail.com")
+
+    def log_in():
+        i = next(counter) % user_count
+        ok, _ = users.authenticate_user(f"user{i}", f"password{i}")
+        assert ok
+
+    return {
+        "load_data": ledger.load_ledger,
+        "save_to_csv": save_one_payment,
+        "update_data": lambda: payments.replace_records(df, actor="bench"),
+        "get_unpaid_months": lambda: students.get_unpaid_months(
+            student_ids[next(counter) % len(student_ids)], "2024-2025"
+        ),
+        "check_annual_admission_paid": lambda: students.check_annual_admission_paid(
+            student_ids[next(counter) % len(student_ids)], "2024-2025"
+        ),
+        "load_student_fees": schedules.load_student_fees,
+        "create_user": create_one_user,
+        "authenticate_user": log_in,
+    }
+
+def measure(fn, repeats):
+    """Median seconds per call, and the peak memory in MB of one call"""
+    fn()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+
+    # Memory is traced on a call of its own, since tracing slows allocations down
+    base_pool = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(base_pool)
+    _pools.append(pool)
+    pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        fn()
+        python_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(base_pool)
+    return statistics.median(seconds), (python_peak + pool.max_memory()) / 1024 / 1024
+
+def run_size(rows):
+    """Measure every case on one ledger size, in this process"""
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = data_dir
+        cases = build_cases(rows)
+        for name in CASES:
+            seconds, peak_mb = measure(cases[name], get_repeats(rows))
+            results[name] = {"seconds": round(seconds, 6), "peak_mb": round(peak_mb, 2)}
+    return results
+
+def run_sizes(sizes):
+    """Measure each ledger size in a child process of its own"""
+    results = {}
+    for rows in sizes:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-size", str(rows)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results[str(rows)] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+def get_machine_key():
+    """Name this machine's baselines in the baselines file"""
+    python_version = ".".join(platform.python_version_tuple()[:2])
+    return os.environ.get("FEES_BENCH_MACHINE") or f"{platform.machine()}-{os.cpu_count()}cpu-py{python_version}"
+
+def load_baselines(path):
+    """Load the baselines of every machine from the baselines file"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("machines", {})
+
+def compare(results, baselines):
+    """List the regressions and the cases without a baseline, printing a table of both"""
+    regressions = []
+    missing = []
+    for size, cases in results.items():
+        print(f"{int(size):,} rows{'':24}{'ms':>10}{'baseline':>10}{'peak MB':>10}{'baseline':>10}")
+        for name, result in cases.items():
+            baseline = baselines.get(size, {}).get(name)
+            marks = []
+            if baseline:
+                if result["seconds"] > baseline["seconds"] * LATENCY_TOLERANCE + LATENCY_SLACK_SECONDS:
+                    marks.append("SLOWER")
+                if result["peak_mb"] > baseline["peak_mb"] * MEMORY_TOLERANCE + MEMORY_SLACK_MB:
+                    marks.append("MORE MEMORY")
+            else:
+                marks.append("no baseline")
+            print(f"  {name:30}{result['seconds'] * 1000:10.2f}"
+                  f"{baseline['seconds'] * 1000 if baseline else float('nan'):10.2f}"
+                  f"{result['peak_mb']:10.1f}{baseline['peak_mb'] if baseline else float('nan'):10.1f}"
+                  f"  {' '.join(marks)}")
+            regressions.extend(f"{name} at {int(size):,} rows: {mark}" for mark in marks if mark != "no baseline")
+            if not baseline:
+                missing.append(f"{name} at {int(size):,} rows")
+    return regressions, missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data functions against tracked baselines")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--machine", help="baselines to compare with or record (default: this machine's)")
+    parser.add_argument("--update", action="store_true", help="record the results as this machine's new baselines")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        print(json.dumps(run_size(args.run_size)))
+        return
+
+    machine = args.machine or get_machine_key()
+    machines = load_baselines(args.baseline)
+    results = run_sizes(args.sizes)
+    baselines = machines.get(machine, {}).get("results", {})
+
+    if args.update:
+        baselines.update(results)
+        machines[machine] = {
+            "machine": f"{platform.machine()}, {os.cpu_count()} CPU, Python {platform.python_version()}",
+            "recorded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "results": baselines
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump({"machines": dict(sorted(machines.items()))}, f, indent=4)
+            f.write("\n")
+        print(f"Baselines for {machine} written to {args.baseline}")
+        compare(results, baselines)
+        return
+
+    print(f"Comparing with the baselines of {machine}\n")
+    regressions, missing = compare(results, baselines)
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    if missing:
+        print(f"\nNOT COMPARED: no baseline for {machine} in {args.baseline} for:\n  " + "\n  ".join(missing))
+        print(f"Run on a machine with baselines ({', '.join(sorted(machines)) or 'none'}), "
+              f"or record this one's with --update.")
+        sys.exit(MISSING_BASELINE_STATUS)
+    print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from fees import config
+
+# Synthetic fee ledgers shaped like fees_data.csv, for benchmarks
+
+ACADEMIC_YEARS = ["2021-2022", "2022-2023", "2023-2024", "2024-2025", "2025-2026"]
+
+def make_ledger(n_rows, n_students=None, seed=0):
+    """Build a random ledger with monthly, annual and admission fee rows"""
+    rng = np.random.default_rng(seed)
+    n_students = n_students or max(n_rows // 12, 1)
+
+    student = rng.integers(0, n_students, n_rows)
+    kind = rng.choice(3, n_rows, p=[0.9, 0.05, 0.05])
+    monthly = np.where(kind == 0, 2000, 0)
+    annual = np.where(kind == 1, 5000, 0)
+    admission = np.where(kind == 2, 1000, 0)
+    owed = monthly + annual + admission
+    received = (owed * rng.choice([1.0, 0.5], n_rows, p=[0.9, 0.1])).astype("int64")
+
+    months = np.array(config.MONTHS + ["ANNUAL", "ADMISSION"])
+    month_idx = np.where(kind == 0, rng.integers(0, 12, n_rows), np.where(kind == 1, 12, 13))
+    year_idx = rng.integers(0, len(ACADEMIC_YEARS), n_rows)
+    day = rng.integers(1, 29, n_rows)
+    dates = pd.to_datetime([f"{2021 + y}-04-01" for y in range(len(ACADEMIC_YEARS))])[year_idx] + pd.to_timedelta(
+        rng.integers(0, 365, n_rows), unit="D"
+    )
+
+    return pd.DataFrame({
+        "ID": pd.Series(student).map(lambda i: f"{i:08X}"),
+        "Student Name": pd.Series(student).map(lambda i: f"Student {i}"),
+        "Class Category": np.array(config.CLASS_CATEGORIES)[student % len(config.CLASS_CATEGORIES)],
+        "Class Section": np.array(["A", "B", "C"])[student % 3],
+        "Month": months[month_idx],
+        "Monthly Fee": monthly,
+        "Annual Charges": annual,
+        "Admission Fee": admission,
+        "Received Amount": received,
+        "Payment Method": np.array(config.PAYMENT_METHODS)[rng.integers(0, len(config.PAYMENT_METHODS), n_rows)],
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Signature": "bench",
+        "Entry Timestamp": (dates + pd.to_timedelta(day, unit="h")).strftime("%Y-%m-%d %H:%M:%S"),
+        "Academic Year": np.array(ACADEMIC_YEARS)[year_idx],
+    })
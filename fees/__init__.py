@@ -0,0 +1,35 @@
+"""Headless school fees service layer.
+
+The Streamlit app in main.py is a thin client on top of these modules, and
+scripts, benchmarks and tests can drive them directly:
+
+    config     file locations, the current school and fixed lists
+    tenants    registry of the schools served by one deployment
+    storage    JSON file helpers shared by the other modules
+    users      user accounts and passwords
+    subscriptions  trial expiry index, checks and bulk extensions
+    ledger     the fee ledger CSV and its shared memory-mapped Arrow copy
+    query      indexed filtered reads and totals over the ledger
+    students   student IDs, academic years and per-student payment status
+    schedules  per-student fee schedules
+    balances   incrementally maintained per-student balances and arrears
+    rollups    daily collection rollups for the dashboard
+    payments   building, validating and saving fee records
+    audit      append-only audit log of ledger writes, with replay
+    receipts   per-year receipt number sequences and receipt lookup
+    capture    durable journal of saves, drained into the ledger in the background
+    idempotency  hashed index of paid months and fees, to reject duplicates
+    integrity  offline ledger integrity checker and repair tool
+    reminders  defaulter lists and templated fee reminders written to an outbox
+    reports    parallel report aggregation over the ledger
+    jobs       background job runner for reports and exports
+
+Modules import pandas only where they need it; import the ones you use,
+e.g. ``from fees import payments``.
+"""
+
+__all__ = [
+    "config", "tenants", "storage", "users", "subscriptions", "ledger", "query", "students", "schedules",
+    "balances", "rollups", "payments", "receipts", "capture", "audit", "idempotency", "integrity",
+    "reminders", "reports", "jobs"
+]
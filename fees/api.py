@@ -0,0 +1,330 @@
+import os
+import re
+import hmac
+import json
+import asyncio
+import argparse
+from datetime import datetime
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from fees import config, payments, query, receipts, students, tenants
+
+# Optional HTTP/JSON API for fee entry and lookups, as a plain ASGI app with
+# no framework dependency. It shares the process-wide ledger cache and write
+# lock with every other caller of the fees package; blocking service calls
+# run on a small thread pool so the event loop stays free.
+#
+#   GET  /health
+#   GET  /students/id?student_name=...&class_category=...
+#   GET  /students/{id}/unpaid-months
+#   GET  /students/{id}/annual-admission?academic_year=2025-2026
+#   GET  /receipts/{receipt no}   e.g. /receipts/2025-26/000123
+#   GET  /records?academic_year=2025-2026&month=APRIL,MAY&limit=100
+#   GET  /records/totals?group_by=Class Category&academic_year=2025-2026
+#   POST /payments          one payment object, or {"payments": [...]}
+#
+# Run with: python -m fees.api --port 8600   (needs uvicorn)
+# If FEES_API_KEY is set, requests must send it in the X-API-Key header.
+# On a deployment serving several schools, the X-School-ID header picks the
+# school; without it requests work on the main school.
+
+API_WORKERS = 4
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SIZE = 500
+MAX_RECORDS = 10_000
+# Recorded as the author of API writes in the audit log
+API_ACTOR = "api"
+
+_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="fees-api")
+
+class ApiError(Exception):
+    """Error returned to the client as a JSON message with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def parse_payment(data):
+    """Convert one JSON payment object into record_payment() arguments"""
+    if not isinstance(data, dict):
+        raise ApiError(400, "Each payment must be a JSON object")
+
+    missing = [
+        field for field in ["student_name", "class_category", "fee_type", "amount", "payment_method", "payment_date", "signature"]
+        if data.get(field) in (None, "")
+    ]
+    if missing:
+        raise ApiError(400, f"Missing fields: {', '.join(missing)}")
+    if data["fee_type"] not in config.FEE_TYPES:
+        raise ApiError(400, f"fee_type must be one of: {', '.join(config.FEE_TYPES)}")
+    if data["class_category"] not in config.CLASS_CATEGORIES:
+        raise ApiError(400, f"Unknown class_category: {data['class_category']}")
+    if data["payment_method"] not in config.PAYMENT_METHODS:
+        raise ApiError(400, f"Unknown payment_method: {data['payment_method']}")
+
+    months = data.get("months") or []
+    if data["fee_type"] == "Monthly Fee" and any(month not in config.MONTHS for month in months):
+        raise ApiError(400, f"months must be taken from: {', '.join(config.MONTHS)}")
+
+    try:
+        payment_date = datetime.strptime(data["payment_date"], "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ApiError(400, "payment_date must be YYYY-MM-DD")
+    amount = parse_amount(data["amount"], "amount")
+    # amount is per month for a monthly fee, so by default every month is paid in full
+    total_amount = amount * len(months) if data["fee_type"] == "Monthly Fee" else amount
+    received_amount = parse_amount(data.get("received_amount", total_amount), "received_amount")
+    if amount < 0 or received_amount < 0:
+        raise ApiError(400, "Amounts cannot be negative")
+
+    return {
+        "student_name": data["student_name"],
+        "class_category": data["class_category"],
+        "class_section": data.get("class_section", ""),
+        "fee_type": data["fee_type"],
+        "amount": amount,
+        "received_amount": received_amount,
+        "payment_method": data["payment_method"],
+        "payment_date": payment_date,
+        "signature": data["signature"],
+        "months": months
+    }
+
+def parse_amount(value, name):
+    """Read a whole-number amount from a request; fractions, text and booleans are rejected"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ApiError(400, f"{name} must be a whole number")
+    return value
+
+def handle_health(query, body):
+    """Report that the API is up"""
+    return 200, {"status": "ok"}
+
+def handle_student_id(query, body):
+    """Look up the ID generated for a student name and class"""
+    student_name = query.get("student_name")
+    class_category = query.get("class_category")
+    if not student_name or not class_category:
+        raise ApiError(400, "student_name and class_category are required")
+    return 200, {"student_id": students.generate_student_id(student_name, class_category)}
+
+def handle_unpaid_months(query, body, student_id):
+    """List the months a student has not paid yet in an academic year"""
+    academic_year = query.get("academic_year") or students.get_academic_year(datetime.now())
+    return 200, {
+        "student_id": student_id,
+        "academic_year": academic_year,
+        "unpaid_months": students.get_unpaid_months(student_id, academic_year)
+    }
+
+def handle_annual_admission(query, body, student_id):
+    """Tell whether annual charges and admission fee are paid for an academic year"""
+    academic_year = query.get("academic_year") or students.get_academic_year(datetime.now())
+    annual_paid, admission_paid = students.check_annual_admission_paid(student_id, academic_year)
+    return 200, {
+        "student_id": student_id,
+        "academic_year": academic_year,
+        "annual_paid": annual_paid,
+        "admission_paid": admission_paid
+    }
+
+def handle_receipt(query, body, receipt_number):
+    """Look up the fee records of a receipt"""
+    receipt_df = receipts.find_receipt(receipt_number)
+    if receipt_df.empty:
+        raise ApiError(404, f"No receipt {receipt_number}")
+    records = receipt_df.astype(object).where(receipt_df.notna(), None).to_dict('records')
+    return 200, {"receipt_no": receipt_number, "records": records}
+
+def parse_record_filters(params):
+    """Read ledger filters from query parameters; list filters are comma-separated"""
+    filters = {}
+    for name in query.FILTER_COLUMNS:
+        if params.get(name):
+            values = [value.strip() for value in params[name].split(",") if value.strip()]
+            filters[name] = values if len(values) > 1 else values[0]
+    for name in ("date_from", "date_to"):
+        if params.get(name):
+            try:
+                filters[name] = datetime.strptime(params[name], "%Y-%m-%d").date()
+            except ValueError:
+                raise ApiError(400, f"{name} must be a date like 2025-05-02")
+    return filters
+
+def handle_records(params, body):
+    """List the ledger rows matching the filters, up to limit rows"""
+    try:
+        limit = int(params.get("limit", MAX_RECORDS))
+    except ValueError:
+        raise ApiError(400, "limit must be a number")
+    if not 0 < limit <= MAX_RECORDS:
+        raise ApiError(400, f"limit must be between 1 and {MAX_RECORDS}")
+    records_df = query.find_records(**parse_record_filters(params))
+    matched = len(records_df)
+    records_df = records_df.head(limit)
+    records = records_df.astype(object).where(records_df.notna(), None).to_dict('records')
+    return 200, {"matched": matched, "records": records}
+
+def handle_record_totals(params, body):
+    """Sum the amounts of the ledger rows matching the filters, optionally per group"""
+    group_by = [column.strip() for column in params.get("group_by", "").split(",") if column.strip()]
+    unknown = [column for column in group_by if column not in config.LEDGER_COLUMNS or column in config.AMOUNT_COLUMNS]
+    if unknown:
+        raise ApiError(400, f"Cannot group by {', '.join(unknown)}")
+    totals = query.aggregate_records(group_by, **parse_record_filters(params))
+    if not group_by:
+        return 200, {"totals": totals}
+    return 200, {"totals": totals.astype(object).where(totals.notna(), None).to_dict('records')}
+
+def handle_payments(query, body):
+    """Record one payment or a batch of payments"""
+    batch = isinstance(body, dict) and "payments" in body
+    items = body["payments"] if batch else [body]
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, "payments must be a non-empty list")
+    if len(items) > MAX_BATCH_SIZE:
+        raise ApiError(413, f"At most {MAX_BATCH_SIZE} payments per request")
+
+    # A malformed payment in a batch is rejected on its own, like a duplicate
+    parsed = []
+    for item in items:
+        try:
+            parsed.append(parse_payment(item))
+        except ApiError as e:
+            if not batch:
+                raise
+            parsed.append(e)
+
+    saved = iter(payments.record_payments([item for item in parsed if not isinstance(item, ApiError)], actor=API_ACTOR))
+    results = [(False, item.message) if isinstance(item, ApiError) else next(saved) for item in parsed]
+    response = [
+        {"ok": True, "records": result} if ok else {"ok": False, "error": result}
+        for ok, result in results
+    ]
+
+    if batch:
+        return 200, {"results": response}
+    return (201 if response[0]["ok"] else 409), response[0]
+
+def run_for_tenant(tenant_id, handler, query, body, params):
+    """Run a handler on one school's data, in the worker thread that serves it"""
+    with config.use_tenant(tenant_id):
+        return handler(query, body, **params)
+
+ROUTES = [
+    ("GET", re.compile(r"^/health$"), handle_health),
+    ("GET", re.compile(r"^/students/id$"), handle_student_id),
+    ("GET", re.compile(r"^/students/(?P<student_id>[0-9A-Fa-f]{8})/unpaid-months$"), handle_unpaid_months),
+    ("GET", re.compile(r"^/students/(?P<student_id>[0-9A-Fa-f]{8})/annual-admission$"), handle_annual_admission),
+    ("GET", re.compile(r"^/receipts/(?P<receipt_number>\d{4}-\d{2}/\d{6})$"), handle_receipt),
+    ("GET", re.compile(r"^/records$"), handle_records),
+    ("GET", re.compile(r"^/records/totals$"), handle_record_totals),
+    ("POST", re.compile(r"^/payments$"), handle_payments),
+]
+
+async def read_body(receive):
+    """Read the full request body, enforcing the size limit"""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise ApiError(413, "Request body too large")
+        if not message.get("more_body"):
+            return body
+
+async def send_json(send, status, payload):
+    """Send a JSON response"""
+    body = json.dumps(payload, default=str).encode('utf-8')
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+def initialize_all_schools():
+    """Initialize the data files of the main school and of every registered school"""
+    payments.initialize_data_files()
+    for tenant_id in tenants.load_tenants():
+        with config.use_tenant(tenant_id):
+            payments.initialize_data_files()
+
+async def handle_lifespan(receive, send):
+    """Initialize every school's data files on startup, so no school's first request pays for it"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.get_running_loop().run_in_executor(_executor, initialize_all_schools)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "lifespan":
+        await handle_lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    try:
+        api_key = os.environ.get("FEES_API_KEY")
+        headers = dict(scope.get("headers", []))
+        # Compared in constant time, so the response time does not reveal the key
+        if api_key and not hmac.compare_digest(headers.get(b"x-api-key", b""), api_key.encode()):
+            raise ApiError(401, "Invalid or missing API key")
+
+        try:
+            tenant_id = config.validate_tenant_id(headers.get(b"x-school-id", b"").decode().strip().lower() or None)
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        if not tenants.tenant_exists(tenant_id):
+            raise ApiError(404, "Unknown school")
+
+        for method, pattern, handler in ROUTES:
+            match = pattern.match(scope["path"])
+            if match:
+                break
+        else:
+            raise ApiError(404, "Not found")
+        if scope["method"] != method:
+            raise ApiError(405, "Method not allowed")
+
+        query = {key: values[-1] for key, values in parse_qs(scope["query_string"].decode()).items()}
+        body = None
+        if method == "POST":
+            try:
+                body = json.loads(await read_body(receive) or b"null")
+            except ValueError:
+                raise ApiError(400, "Request body must be JSON")
+
+        status, payload = await asyncio.get_running_loop().run_in_executor(
+            _executor, run_for_tenant, tenant_id, handler, query, body, match.groupdict()
+        )
+    except ApiError as e:
+        status, payload = e.status, {"error": e.message}
+    except Exception as e:
+        status, payload = 500, {"error": f"Internal error: {str(e)}"}
+
+    await send_json(send, status, payload)
+
+def main():
+    """Serve the API with uvicorn"""
+    parser = argparse.ArgumentParser(description="School fees HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The fees API needs uvicorn: pip install 'app-demo[api]'")
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
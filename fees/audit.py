@@ -0,0 +1,342 @@
+import os
+import csv
+import json
+import glob
+import argparse
+import threading
+from hashlib import sha256
+from collections import Counter
+from datetime import datetime
+from fees import config, storage
+
+# Append-only audit log of every write to the fee ledger. Each write is one
+# JSON line recording who made it, when, and the rows it added and removed.
+# Lines are chained by the hash of the previous line, so edits to past
+# events are detectable. The log is split into segments of SEGMENT_EVENTS
+# events, named after their first sequence number. Events are appended with
+# the ledger write lock held (ledger.get_write_lock), so processes append
+# in turn and each continues the chain where the last one left off.
+#
+# Every SNAPSHOT_EVERY events a background thread writes a snapshot of the
+# replayed ledger, so rebuilding a past state only replays the events after
+# the nearest snapshot. Snapshots are built from the previous snapshot and
+# the events after it, which never change, so no lock is needed and saves
+# do not wait for them. Only the latest MAX_SNAPSHOTS are kept.
+#
+#   python -m fees.audit verify
+#   python -m fees.audit replay --as-of "2025-06-01 00:00:00" --out ledger_then.csv
+
+SEGMENT_EVENTS = 10000
+SNAPSHOT_EVERY = 1000
+MAX_SNAPSHOTS = 3
+
+_audit_lock = threading.Lock()
+# Per school: last sequence number and hash written, with the segment file
+# state they match
+_log_states = {}
+# Per school: the thread writing its snapshot, if one is running
+_snapshot_threads = {}
+
+def get_audit_dir():
+    """Get the audit log directory, creating it if needed"""
+    audit_dir = config.data_path(config.AUDIT_DIR)
+    os.makedirs(audit_dir, exist_ok=True)
+    return audit_dir
+
+def encode_row(record):
+    """Encode a fee record as a list of CSV field values in ledger column order"""
+    row = []
+    for col in config.LEDGER_COLUMNS:
+        value = record.get(col)
+        # None and NaN are written to the CSV as empty fields
+        row.append("" if value is None or value != value else str(value))
+    return row
+
+def read_ledger_rows():
+    """Read the ledger CSV as raw field values in ledger column order"""
+    csv_file = config.data_path(config.CSV_FILE)
+    if not os.path.exists(csv_file):
+        return []
+    with open(csv_file, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        return [encode_row(dict(zip(header, line))) for line in reader if line]
+
+def list_segments():
+    """List the log segment files in sequence order"""
+    return sorted(glob.glob(os.path.join(get_audit_dir(), "events-*.jsonl")))
+
+def list_snapshots():
+    """List the snapshot files in sequence order"""
+    return sorted(glob.glob(os.path.join(get_audit_dir(), "snapshot-*.json")))
+
+def get_file_seq(path):
+    """Get the sequence number a segment starts at or a snapshot was taken at"""
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+def read_last_line(path):
+    """Read the last line of a file without reading the whole file"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        tail = b""
+        while position > 0 and tail.rstrip(b"\n").count(b"\n") == 0:
+            position = max(position - 65536, 0)
+            f.seek(position)
+            tail = f.read(end - position)
+    return tail.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+
+def hash_line(line):
+    """Hash one encoded event line for the chain"""
+    return sha256(line).hexdigest()
+
+def get_log_state():
+    """Get the last sequence number, its hash and the current segment; needs the audit lock"""
+    state = _log_states.setdefault(get_audit_dir(), {"segment": None, "version": None, "seq": 0, "hash": ""})
+    segments = list_segments()
+    if not segments:
+        state.update({"segment": None, "version": None, "seq": 0, "hash": ""})
+        return state
+
+    segment = segments[-1]
+    version = storage.get_file_version(segment)
+    if state["segment"] != segment or state["version"] != version:
+        # Another process has written since our last event
+        last_line = read_last_line(segment)
+        state.update({
+            "segment": segment,
+            "version": version,
+            "seq": json.loads(last_line)["seq"] if last_line else get_file_seq(segment) - 1,
+            "hash": hash_line(last_line) if last_line else state["hash"]
+        })
+    return state
+
+def is_empty():
+    """Tell whether no event has been recorded yet"""
+    return not list_segments()
+
+def record_event(action, actor, added=None, removed=None):
+    """Append one event to the log and return its sequence number
+
+    added and removed are lists of rows as encoded by encode_row(). Call
+    with the ledger write lock held.
+    """
+    with _audit_lock:
+        state = get_log_state()
+        seq = state["seq"] + 1
+        event = {
+            "seq": seq,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "actor": actor or "",
+            "action": action,
+            "added": added or [],
+            "removed": removed or [],
+            "prev": state["hash"]
+        }
+        line = json.dumps(event, separators=(",", ":")).encode('utf-8')
+
+        segment = state["segment"]
+        if segment is None or seq - get_file_seq(segment) >= SEGMENT_EVENTS:
+            segment = os.path.join(get_audit_dir(), f"events-{seq:010d}.jsonl")
+        with open(segment, 'ab') as f:
+            f.write(line + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        state.update({
+            "segment": segment,
+            "version": storage.get_file_version(segment),
+            "seq": seq,
+            "hash": hash_line(line)
+        })
+
+    if seq % SNAPSHOT_EVERY == 0:
+        start_snapshot(seq)
+    return seq
+
+def record_baseline(actor):
+    """Record the existing ledger as the first event if the log is still empty
+
+    Keeps ledgers that predate the audit log replayable.
+    """
+    if is_empty():
+        rows = read_ledger_rows()
+        if rows:
+            record_event("baseline", actor, added=rows)
+
+def record_append(records, actor):
+    """Record fee records appended to the ledger"""
+    return record_event("append", actor, added=[encode_row(record) for record in records])
+
+def record_replace(before_rows, after_rows, actor):
+    """Record a whole-ledger replacement as the rows it removed and added"""
+    before = Counter(map(tuple, before_rows))
+    after = Counter(map(tuple, after_rows))
+    removed = [list(row) for row in (before - after).elements()]
+    added = [list(row) for row in (after - before).elements()]
+    return record_event("replace", actor, added=added, removed=removed)
+
+def iter_events(after_seq=0):
+    """Yield logged events with a sequence number above after_seq, in order"""
+    segments = list_segments()
+    for i, segment in enumerate(segments):
+        # Skip segments that end before the events we need
+        if i + 1 < len(segments) and get_file_seq(segments[i + 1]) <= after_seq + 1:
+            continue
+        with open(segment, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["seq"] > after_seq:
+                    yield event
+
+def pad_rows(rows):
+    """Pad rows logged before columns were added to the end of the ledger with empty fields"""
+    width = len(config.LEDGER_COLUMNS)
+    return [row + [""] * (width - len(row)) if len(row) < width else row for row in rows]
+
+def apply_event(rows, event):
+    """Apply one event to a list of ledger rows in place
+
+    Added rows are appended, so replaying many appends does not copy the
+    list each time.
+    """
+    if event["removed"]:
+        removed = Counter(map(tuple, pad_rows(event["removed"])))
+        kept = []
+        for row in rows:
+            key = tuple(row)
+            if removed[key] > 0:
+                removed[key] -= 1
+            else:
+                kept.append(row)
+        rows[:] = kept
+    rows.extend(pad_rows(event["added"]))
+
+def load_snapshot(seq=None, as_of=None):
+    """Load the latest snapshot taken at or before a sequence number or time
+
+    Returns (seq, time, rows), or (0, "", []) when there is none to start from.
+    """
+    for path in reversed(list_snapshots()):
+        if seq is not None and get_file_seq(path) > seq:
+            continue
+        try:
+            snapshot = storage.read_json(path)
+        except FileNotFoundError:
+            # Pruned by another process since it was listed
+            continue
+        if as_of is not None and snapshot["time"] > as_of:
+            continue
+        return snapshot["seq"], snapshot["time"], pad_rows(snapshot["rows"])
+    return 0, "", []
+
+def rebuild_rows(seq=None, as_of=None):
+    """Replay the log into the ledger rows as of a sequence number or time
+
+    Starts from the nearest earlier snapshot. as_of is a
+    "YYYY-MM-DD HH:MM:SS" string; with neither argument the current
+    state is rebuilt. Returns (last applied seq, rows).
+    """
+    last_seq, _, rows = load_snapshot(seq, as_of)
+    for event in iter_events(last_seq):
+        if (seq is not None and event["seq"] > seq) or (as_of is not None and event["time"] > as_of):
+            break
+        apply_event(rows, event)
+        last_seq = event["seq"]
+    return last_seq, rows
+
+def rebuild_ledger(seq=None, as_of=None):
+    """Rebuild the ledger as a DataFrame of raw CSV values as of a sequence number or time"""
+    import pandas as pd
+    _, rows = rebuild_rows(seq, as_of)
+    return pd.DataFrame(rows, columns=config.LEDGER_COLUMNS)
+
+def write_snapshot(seq):
+    """Write a snapshot of the replayed ledger at a sequence number"""
+    last_seq, rows = rebuild_rows(seq)
+    path = os.path.join(get_audit_dir(), f"snapshot-{last_seq:010d}.json")
+    storage.write_json(path, {
+        "seq": last_seq,
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "rows": rows
+    }, indent=None)
+    prune_snapshots()
+    return path
+
+def prune_snapshots():
+    """Delete all but the latest MAX_SNAPSHOTS snapshots"""
+    for path in list_snapshots()[:-MAX_SNAPSHOTS]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def start_snapshot(seq):
+    """Write a snapshot at a sequence number in the background, unless one is already being written"""
+    audit_dir = get_audit_dir()
+    tenant = config.get_tenant()
+    def run():
+        with config.use_tenant(tenant):
+            write_snapshot(seq)
+    with _audit_lock:
+        running = _snapshot_threads.get(audit_dir)
+        if running and running.is_alive():
+            return None
+        thread = _snapshot_threads[audit_dir] = threading.Thread(target=run, name="audit-snapshot", daemon=True)
+        thread.start()
+    return thread
+
+def verify_log():
+    """Check the hash chain and that replaying the log reproduces the ledger CSV
+
+    Returns (True, message) or (False, message describing the first problem).
+    """
+    expected_seq = 1
+    previous_hash = ""
+    for segment in list_segments():
+        with open(segment, 'rb') as f:
+            for line in f:
+                line = line.rstrip(b"\n")
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["seq"] != expected_seq:
+                    return False, f"Expected event {expected_seq} but found {event['seq']} in {os.path.basename(segment)}"
+                if event["prev"] != previous_hash:
+                    return False, f"Event {event['seq']} does not follow the event before it; the log was modified"
+                previous_hash = hash_line(line)
+                expected_seq += 1
+
+    _, rows = rebuild_rows()
+    if Counter(map(tuple, rows)) != Counter(map(tuple, read_ledger_rows())):
+        return False, f"Replaying {expected_seq - 1} events does not reproduce the current ledger"
+    return True, f"{expected_seq - 1} events verified; replay matches the current ledger"
+
+def main():
+    """Verify, snapshot or replay the audit log from the command line"""
+    parser = argparse.ArgumentParser(description="Fee ledger audit log")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("verify", help="check the hash chain and replay against the ledger")
+    subparsers.add_parser("snapshot", help="write a snapshot at the latest event")
+    replay = subparsers.add_parser("replay", help="rebuild the ledger as of an event or time")
+    replay.add_argument("--seq", type=int)
+    replay.add_argument("--as-of", help='e.g. "2025-06-01 00:00:00"')
+    replay.add_argument("--out", required=True, help="CSV file to write")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        ok, message = verify_log()
+        print(message)
+        raise SystemExit(0 if ok else 1)
+    if args.command == "snapshot":
+        with _audit_lock:
+            seq = get_log_state()["seq"]
+        print(write_snapshot(seq) if seq else "No events to snapshot")
+        return
+    rebuild_ledger(args.seq, args.as_of).to_csv(args.out, index=False)
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+from datetime import datetime
+import pandas as pd
+from fees import config, storage, ledger, schedules, students
+
+# Per-student running balances. What a student owes comes from their fee
+# schedule (schedules.get_fee_schedule): the monthly fee for every month of
+# the academic year up to the current one, plus the annual charges and the
+# admission fee. What they have paid is kept per academic year and maintained
+# incrementally as records are saved, so a balance is one schedule lookup
+# and one dict lookup, and the arrears list is one pass over the students.
+#
+# Stored as a keyed JSON store (storage.load_keyed_json), so a save appends
+# the balances of the students it touched instead of rewriting every
+# student's.
+
+def initialize_balances():
+    """Build the balance ledger from existing fee records if it doesn't exist or predates per-year totals"""
+    if not is_current_format():
+        with ledger.get_write_lock():
+            if not is_current_format():
+                save_balances(rebuild_balances(ledger.load_ledger()))
+
+def is_current_format():
+    """Whether the balance ledger exists and keeps received amounts per academic year"""
+    if not os.path.exists(config.data_path(config.BALANCES_FILE)):
+        return False
+    return all("received_by_year" in entry for entry in load_balances().values())
+
+def load_balances():
+    """Load the per-student running balances"""
+    return storage.load_keyed_json(config.data_path(config.BALANCES_FILE))
+
+def save_balances(balances):
+    """Replace all the per-student running balances; call with the ledger write lock held"""
+    storage.write_keyed_json(config.data_path(config.BALANCES_FILE), balances)
+
+def rebuild_balances(df):
+    """Recompute every student's received totals per academic year from the full ledger"""
+    if df.empty:
+        return {}
+    
+    received = pd.to_numeric(df["Received Amount"], errors='coerce').fillna(0)
+    totals = pd.DataFrame({
+        "ID": df["ID"],
+        "academic_year": df["Academic Year"],
+        "received": received
+    }).groupby(["ID", "academic_year"], sort=False)["received"].sum()
+    names = df.groupby("ID", sort=False)[["Student Name", "Class Category"]].last()
+    
+    balances = {
+        student_id: {"student_name": row["Student Name"], "class_category": row["Class Category"], "received_by_year": {}}
+        for student_id, row in names.iterrows()
+    }
+    for (student_id, academic_year), amount in totals.items():
+        balances[student_id]["received_by_year"][academic_year] = int(amount)
+    return balances
+
+def apply_balance_records(balances, records):
+    """Add the received amounts of new fee records to the running balances
+
+    Returns the updated balances of the students in the records, without
+    changing the ones passed in, which may be shared with other readers.
+    """
+    changes = {}
+    for record in records:
+        entry = changes.get(record["ID"])
+        if entry is None:
+            entry = dict(balances.get(record["ID"], {}))
+            entry["received_by_year"] = dict(entry.get("received_by_year", {}))
+            changes[record["ID"]] = entry
+        entry["student_name"] = record["Student Name"]
+        entry["class_category"] = record["Class Category"]
+        received_by_year = entry["received_by_year"]
+        received_by_year[record["Academic Year"]] = received_by_year.get(record["Academic Year"], 0) + int(record.get("Received Amount") or 0)
+    return changes
+
+def update_balances(records):
+    """Incrementally apply newly saved fee records to the balance ledger"""
+    storage.update_keyed_json(config.data_path(config.BALANCES_FILE), apply_balance_records(load_balances(), records))
+
+def get_due_month(academic_year):
+    """The month an academic year's fees are due up to: this month in the current year, all of an earlier one"""
+    now = datetime.now()
+    if academic_year == students.get_academic_year(now):
+        return config.MONTHS[(now.month - 4) % 12]
+    return config.MONTHS[-1]
+
+def get_owed(schedule, month):
+    """What a fee schedule charges for an academic year up to and including a month"""
+    months_due = config.MONTHS.index(month) + 1
+    return schedule["monthly_fee"] * months_due + schedule["annual_charges"] + schedule["admission_fee"]
+
+def get_student_balance(student_id, academic_year=None, month=None, balances=None):
+    """Get a student's owed, received and outstanding amounts for an academic year up to a month
+
+    Defaults to the current academic year; month defaults to get_due_month().
+    Outstanding is negative when the student has paid ahead.
+    """
+    if balances is None:
+        balances = load_balances()
+    academic_year = academic_year or students.get_academic_year(datetime.now())
+    month = month or get_due_month(academic_year)
+    owed = get_owed(schedules.get_fee_schedule(student_id)[0], month)
+    received = balances.get(student_id, {}).get("received_by_year", {}).get(academic_year, 0)
+    return {"owed": owed, "received": received, "outstanding": owed - received}
+
+def get_arrears_list(academic_year=None, balances=None):
+    """List every enrolled student who owes more than they have paid for an academic year, largest first
+
+    Enrolled students are those with a record in the year or the year before,
+    or with fees set, as for fee reminders.
+    """
+    if balances is None:
+        balances = load_balances()
+    academic_year = academic_year or students.get_academic_year(datetime.now())
+    previous_year = students.get_previous_academic_year(academic_year)
+    month = get_due_month(academic_year)
+    fees_data = schedules.load_student_fees()
+    
+    arrears = []
+    for student_id, entry in balances.items():
+        received_by_year = entry.get("received_by_year", {})
+        if academic_year not in received_by_year and previous_year not in received_by_year and student_id not in fees_data:
+            continue
+        owed = get_owed(schedules.get_fee_schedule(student_id, fees_data)[0], month)
+        received = received_by_year.get(academic_year, 0)
+        if owed > received:
+            arrears.append({
+                "ID": student_id,
+                "Student Name": entry.get("student_name", ""),
+                "Class Category": entry.get("class_category", ""),
+                "Owed": owed,
+                "Received": received,
+                "Outstanding": owed - received
+            })
+    
+    columns = ["ID", "Student Name", "Class Category", "Owed", "Received", "Outstanding"]
+    return pd.DataFrame(arrears, columns=columns).sort_values("Outstanding", ascending=False)
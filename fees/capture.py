@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from fees import config, storage, receipts, payments
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks each process only drains its own journal
+    fcntl = None
+
+# Offline capture queue. A save is first appended to this process's journal
+# (one JSON entry per line, fsynced) and returns at once; a background
+# flusher then drains the journal into the ledger through save_records, so
+# a locked, slow or missing ledger never loses a clerk's entry.
+#
+# - Order: entries are applied in journal order, consecutive entries of the
+#   same user in one batch of up to FLUSH_BATCH_RECORDS records.
+# - Idempotency: receipt numbers are stamped when an entry is captured, and
+#   an entry whose receipt is already in the ledger is not applied again, so
+#   replaying a journal after a crash is safe. An entry that can never be
+#   saved, because it pays for something already recorded
+#   (DuplicatePaymentError), is moved to rejected.jsonl.
+# - Progress: the byte offset applied so far is kept in <journal>.offset.
+#   Any other error leaves the entries in place and the flusher retries
+#   with backoff, up to MAX_RETRY_SECONDS apart.
+# - Recovery: each process holds a lock on its journal's .owner file while
+#   it runs, so journals of processes that have exited are drained (and
+#   then deleted) by whichever process gets their lock first.
+
+JOURNAL_PREFIX = "journal-"
+JOURNAL_SUFFIX = ".jsonl"
+REJECTED_FILE = "rejected.jsonl"
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH_RECORDS = 500
+MAX_RETRY_SECONDS = 30
+MAX_TRACKED_ENTRIES = 10_000
+
+_capture_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_status_changed = threading.Condition()
+_journals = {}
+_statuses = OrderedDict()
+_pending_tenants = set()
+_flush_wakeup = threading.Event()
+_flusher = None
+
+def get_capture_dir():
+    """Get the directory holding the current school's capture journals"""
+    if config.CAPTURE_DIR:
+        path = os.path.join(config.CAPTURE_DIR, config.get_tenant() or "_default")
+    else:
+        path = config.data_path(config.CAPTURE_QUEUE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_journal():
+    """Open this process's journal for the current school; call with the capture lock held"""
+    capture_dir = get_capture_dir()
+    journal = _journals.get(capture_dir)
+    if journal is None:
+        path = os.path.join(capture_dir, f"{JOURNAL_PREFIX}{os.getpid()}{JOURNAL_SUFFIX}")
+        owner = open(f"{path}.owner", 'a')
+        if fcntl:
+            # Held for the life of the process, so no other process drains this journal
+            fcntl.flock(owner, fcntl.LOCK_EX)
+        journal = _journals[capture_dir] = {"path": path, "file": open(path, 'a'), "owner": owner, "seq": 0}
+    return journal
+
+def set_status(entry_id, status):
+    """Record what happened to an entry captured by this process"""
+    with _status_changed:
+        if entry_id in _statuses or status == "pending":
+            _statuses[entry_id] = status
+            while len(_statuses) > MAX_TRACKED_ENTRIES:
+                _statuses.popitem(last=False)
+        _status_changed.notify_all()
+
+def get_status(entry_id):
+    """Get an entry's status: pending, saved, rejected: <reason>, or None if unknown"""
+    with _status_changed:
+        return _statuses.get(entry_id)
+
+def wait_for_entries(entry_ids, timeout):
+    """Wait up to timeout seconds for entries to leave the queue; returns their statuses"""
+    deadline = time.monotonic() + timeout
+    with _status_changed:
+        while any(_statuses.get(entry_id) == "pending" for entry_id in entry_ids):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            _status_changed.wait(remaining)
+        return [_statuses.get(entry_id) for entry_id in entry_ids]
+
+def capture_records(records, actor=None):
+    """Journal fee records for saving and return the entry ID
+
+    The records are stamped with their receipt numbers first, so the caller
+    can show them straight away.
+    """
+    receipts.stamp_receipts(records)
+    tenant = config.get_tenant()
+    with _capture_lock:
+        journal = get_journal()
+        journal["seq"] += 1
+        entry_id = f"{os.getpid()}-{time.time_ns()}-{journal['seq']}"
+        entry = {"id": entry_id, "time": datetime.now().isoformat(), "actor": actor, "records": records}
+        journal["file"].write(json.dumps(entry) + "\n")
+        journal["file"].flush()
+        os.fsync(journal["file"].fileno())
+        set_status(entry_id, "pending")
+        _pending_tenants.add(tenant)
+    start_flusher()
+    _flush_wakeup.set()
+    return entry_id
+
+def read_entries(path, offset):
+    """Read the complete entries after a byte offset, each with the offset just past it"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    entries = []
+    # A line without its newline is still being written and is left for later
+    for line in data.split(b"\n")[:-1]:
+        offset += len(line) + 1
+        if line.strip():
+            entries.append((offset, json.loads(line)))
+    return entries
+
+def get_batches(entries):
+    """Group consecutive entries of the same user into batches for saving"""
+    batches = []
+    for end_offset, entry in entries:
+        batch = batches[-1] if batches else None
+        if (batch is None or batch["actor"] != entry["actor"]
+                or batch["records"] + len(entry["records"]) > FLUSH_BATCH_RECORDS):
+            batch = {"actor": entry["actor"], "entries": [], "records": 0}
+            batches.append(batch)
+        batch["entries"].append(entry)
+        batch["records"] += len(entry["records"])
+        batch["end_offset"] = end_offset
+    return batches
+
+def is_applied(entry):
+    """Whether an entry's receipts are already in the ledger, e.g. from before a crash"""
+    receipt_numbers = [record.get("Receipt No") for record in entry["records"]]
+    index, _ = receipts.get_receipt_index()
+    return all(receipt_numbers) and all(number in index["receipts"] for number in receipt_numbers)
+
+def reject_entry(entry, reason):
+    """Move an entry that cannot be saved to the rejected file"""
+    rejected = dict(entry, rejected=datetime.now().isoformat(), reason=reason)
+    with open(os.path.join(get_capture_dir(), REJECTED_FILE), 'a') as f:
+        f.write(json.dumps(rejected) + "\n")
+    set_status(entry["id"], f"rejected: {reason}")
+
+def apply_batch(batch):
+    """Save a batch of entries to the ledger, one entry at a time if any of them is rejected
+
+    Only a DuplicatePaymentError rejects an entry; any other error, including
+    a ValueError from a corrupt data file or one raised after the records were
+    appended, is raised so the batch is retried later.
+    """
+    entries = []
+    for entry in batch["entries"]:
+        if is_applied(entry):
+            set_status(entry["id"], "saved")
+        else:
+            entries.append(entry)
+    if not entries:
+        return
+
+    try:
+        payments.save_records([record for entry in entries for record in entry["records"]], actor=batch["actor"])
+        for entry in entries:
+            set_status(entry["id"], "saved")
+        return
+    except payments.DuplicatePaymentError as e:
+        if len(entries) == 1:
+            reject_entry(entries[0], str(e))
+            return
+
+    # Save the rest of the batch around the entries that cannot be saved
+    for entry in entries:
+        try:
+            payments.save_records(entry["records"], actor=batch["actor"])
+            set_status(entry["id"], "saved")
+        except payments.DuplicatePaymentError as e:
+            reject_entry(entry, str(e))
+
+def drain_journal(path):
+    """Apply a journal's unsaved entries to the ledger; returns the offset reached"""
+    offset_file = f"{path}.offset"
+    offset = storage.read_json(offset_file).get("offset", 0)
+    for batch in get_batches(read_entries(path, offset)):
+        apply_batch(batch)
+        offset = batch["end_offset"]
+        storage.write_json(offset_file, {"offset": offset})
+    return offset
+
+def drain_own_journal(journal):
+    """Drain this process's journal, emptying it once everything is saved"""
+    offset = drain_journal(journal["path"])
+    with _capture_lock:
+        # Nothing can be appended while the capture lock is held
+        if offset and offset == os.path.getsize(journal["path"]):
+            os.truncate(journal["path"], 0)
+            storage.write_json(f"{journal['path']}.offset", {"offset": 0})
+            return True
+    return offset == os.path.getsize(journal["path"])
+
+def drain_abandoned_journal(path):
+    """Drain and delete the journal of a process that has exited
+
+    Returns False if the process is still running, or on platforms without
+    file locks.
+    """
+    if not fcntl:
+        return False
+    with open(f"{path}.owner", 'a') as owner:
+        try:
+            fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        try:
+            drain_journal(path)
+            for leftover in (path, f"{path}.offset"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            os.remove(f"{path}.owner")
+        finally:
+            fcntl.flock(owner, fcntl.LOCK_UN)
+    return True
+
+def flush():
+    """Drain every journal of the current school that this process can; returns True when all are empty"""
+    capture_dir = get_capture_dir()
+    with _flush_lock:
+        own = _journals.get(capture_dir)
+        done = drain_own_journal(own) if own else True
+        for name in sorted(os.listdir(capture_dir)):
+            path = os.path.join(capture_dir, name)
+            if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX) and not (own and path == own["path"]):
+                drain_abandoned_journal(path)
+    return done
+
+def run_flusher():
+    """Drain queued entries whenever something is captured, retrying failed flushes with backoff"""
+    delay = FLUSH_INTERVAL
+    while True:
+        _flush_wakeup.wait(delay)
+        _flush_wakeup.clear()
+        failed = False
+        for tenant in list(_pending_tenants):
+            try:
+                with config.use_tenant(tenant):
+                    if flush():
+                        _pending_tenants.discard(tenant)
+            except Exception:
+                # Whatever went wrong, the entries stay in the journal for the next try
+                failed = True
+        delay = min(delay * 2, MAX_RETRY_SECONDS) if failed else FLUSH_INTERVAL
+
+def start_flusher():
+    """Start this process's background flusher, and have it check the current school's queue
+
+    Call once per session so journals left by exited processes are drained.
+    """
+    global _flusher
+    _pending_tenants.add(config.get_tenant())
+    with _capture_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=run_flusher, name="capture-flusher", daemon=True)
+            _flusher.start()
+    _flush_wakeup.set()
+
+def count_pending():
+    """Count entries captured by this process that are not saved yet"""
+    with _status_changed:
+        return sum(1 for status in _statuses.values() if status == "pending")
+
+def load_rejected():
+    """Get the current school's rejected entries, oldest first"""
+    path = os.path.join(get_capture_dir(), REJECTED_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main():
+    """Drain journals left by exited processes, or report the queue, from the command line"""
+    parser = argparse.ArgumentParser(description="Drain or inspect the offline capture queue")
+    parser.add_argument("command", choices=["flush", "status"])
+    parser.add_argument("--school", help="school ID when serving several schools")
+    args = parser.parse_args()
+
+    config.set_tenant(args.school)
+    if args.command == "flush":
+        flush()
+    capture_dir = get_capture_dir()
+    for name in sorted(os.listdir(capture_dir)):
+        if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX):
+            path = os.path.join(capture_dir, name)
+            offset = storage.read_json(f"{path}.offset").get("offset", 0)
+            print(f"{name}: {len(read_entries(path, offset))} entries waiting")
+    print(f"{len(load_rejected())} rejected entries in {os.path.join(capture_dir, REJECTED_FILE)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import re
+import contextvars
+from contextlib import contextmanager
+
+# File locations and fixed lists shared by the fee service modules.
+# All data files live in DATA_DIR (the working directory by default). When
+# one deployment serves several schools, each school's files live in their
+# own directory under DATA_DIR/tenants, chosen per session, request or job
+# with set_tenant() or use_tenant().
+
+DATA_DIR = os.environ.get("FEES_DATA_DIR", ".")
+TENANTS_DIR = "tenants"
+TENANTS_FILE = "tenants.json"
+# School IDs become directory names, so only simple slugs are allowed
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+# How many schools keep their ledger and indexes cached in memory at once
+MAX_CACHED_TENANTS = int(os.environ.get("FEES_MAX_CACHED_TENANTS", "16"))
+# Where saves are journaled before they reach the ledger; set this to a local
+# disk when DATA_DIR is on a network drive. Defaults to each school's data
+# directory.
+CAPTURE_DIR = os.environ.get("FEES_CAPTURE_DIR")
+
+# The school being worked on; None is the single-school layout with every
+# file directly in DATA_DIR
+_current_tenant = contextvars.ContextVar("fees_tenant", default=None)
+
+CSV_FILE = "fees_data.csv"
+USER_DB_FILE = "users.json"
+STUDENT_FEES_FILE = "student_fees.json"
+BALANCES_FILE = "student_balances.json"
+LEDGER_ARROW_FILE = "fees_data.arrow"
+ROLLUPS_FILE = "collections_rollup.json"
+JOBS_FILE = "jobs.json"
+JOB_RESULTS_DIR = "job_results"
+AUDIT_DIR = "audit_log"
+PAYMENT_INDEX_FILE = "payment_index.txt"
+RECEIPT_COUNTERS_FILE = "receipt_counters.json"
+CAPTURE_QUEUE_DIR = "capture_queue"
+LEDGER_LOCK_FILE = "ledger.lock"
+USERS_LOCK_FILE = "users.lock"
+
+LEDGER_COLUMNS = [
+    "ID", "Student Name", "Class Category", "Class Section", "Month",
+    "Monthly Fee", "Annual Charges", "Admission Fee",
+    "Received Amount", "Payment Method", "Date", "Signature",
+    "Entry Timestamp", "Academic Year", "Receipt No"
+]
+# Student IDs are hex strings that can look like numbers (e.g. "03356450"),
+# so text columns must never be parsed as numbers when reading the CSV
+LEDGER_DTYPES = {"ID": str, "Class Section": str, "Receipt No": str}
+FEE_COLUMNS = ["Monthly Fee", "Annual Charges", "Admission Fee"]
+AMOUNT_COLUMNS = FEE_COLUMNS + ["Received Amount"]
+FEE_TYPES = ["Monthly Fee", "Annual Charges", "Admission Fee"]
+
+MONTHS = [
+    "APRIL", "MAY", "JUNE", "JULY", "AUGUST", "SEPTEMBER",
+    "OCTOBER", "NOVEMBER", "DECEMBER", "JANUARY", "FEBRUARY", "MARCH"
+]
+
+CLASS_CATEGORIES = [
+    "Nursery", "KGI", "KGII",
+    "Class 1", "Class 2", "Class 3", "Class 4", "Class 5",
+    "Class 6", "Class 7", "Class 8", "Class 9", "Class 10 (Matric)"
+]
+
+PAYMENT_METHODS = ["Cash", "Bank Transfer", "Cheque", "Online Payment", "Other"]
+
+DEFAULT_FEES = {"monthly_fee": 2000, "annual_charges": 5000, "admission_fee": 1000}
+
+TRIAL_DAYS = 30
+
+def validate_tenant_id(tenant_id):
+    """Check a school ID, returning it or raising ValueError"""
+    if tenant_id is not None and not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError("School ID must be 1-40 lowercase letters, digits, '-' or '_'")
+    return tenant_id
+
+def get_tenant():
+    """Get the school the current session, request or job is working on"""
+    return _current_tenant.get()
+
+def set_tenant(tenant_id):
+    """Work on a school's data for the rest of the current context"""
+    _current_tenant.set(validate_tenant_id(tenant_id))
+
+@contextmanager
+def use_tenant(tenant_id):
+    """Work on a school's data inside a with block"""
+    token = _current_tenant.set(validate_tenant_id(tenant_id))
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+def get_tenant_dir(tenant_id=None):
+    """Get the directory holding a school's data files"""
+    if tenant_id is None:
+        return DATA_DIR
+    return os.path.join(DATA_DIR, TENANTS_DIR, tenant_id)
+
+def data_path(name):
+    """Get the full path of a data file for the current school"""
+    return os.path.join(get_tenant_dir(get_tenant()), name)
@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+from hashlib import md5
+import pandas as pd
+from fees import config
+
+# Idempotency index of every payment already in the ledger. A payment is
+# identified by student ID, academic year and month (or ANNUAL/ADMISSION
+# for the yearly fees); the index stores one hash of that key per line in
+# payment_index.txt and is kept in memory as a set, so checking a new
+# payment against it is a single lookup. New keys are appended to the file,
+# and other processes' appends are picked up by reading only the new lines.
+# Each school has its own index file and in-memory set.
+
+# One in-memory index per school, least recently used first out
+_index_lock = threading.Lock()
+_indexes = OrderedDict()
+
+def get_payment_key(student_id, academic_year, month):
+    """Build the idempotency key for one paid month or yearly fee"""
+    return f"{student_id}|{academic_year}|{month}"
+
+def get_record_key(record):
+    """Build the idempotency key for a ledger record"""
+    return get_payment_key(record["ID"], record["Academic Year"], record["Month"])
+
+def hash_key(key):
+    """Hash an idempotency key to a fixed-size index entry"""
+    return md5(key.encode('utf-8')).hexdigest()[:16]
+
+def is_paid_record(record):
+    """Tell whether a record counts as a payment, the same way the paid-month checks do"""
+    amounts = pd.to_numeric(pd.Series([record.get(col) for col in config.FEE_COLUMNS]), errors='coerce')
+    return amounts.fillna(0).sum() > 0
+
+def get_paid_key_series(df):
+    """Idempotency keys of the ledger rows that count as payments, indexed like the rows"""
+    fees = df[config.FEE_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+    paid = df[fees > 0]
+    return paid["ID"].astype(str) + "|" + paid["Academic Year"].astype(str) + "|" + paid["Month"].astype(str)
+
+def write_index(keys):
+    """Replace the index file with the given keys and reset the in-memory copy"""
+    index_file = config.data_path(config.PAYMENT_INDEX_FILE)
+    tmp_file = f"{index_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    hashes = {hash_key(key) for key in keys}
+    with open(tmp_file, 'w') as f:
+        f.writelines(f"{key_hash}\n" for key_hash in hashes)
+    os.replace(tmp_file, index_file)
+    with _index_lock:
+        _indexes.pop(index_file, None)
+
+def rebuild_index(df=None):
+    """Rebuild the index from a ledger DataFrame, or from the ledger file"""
+    if df is None:
+        from fees import ledger
+        df = ledger.load_ledger()
+    write_index(get_paid_key_series(df).tolist() if not df.empty else [])
+
+def load_index():
+    """Get the set of hashed keys, reading only what was appended since the last call"""
+    index_file = config.data_path(config.PAYMENT_INDEX_FILE)
+    if not os.path.exists(index_file):
+        # Built once from the existing ledger, then kept up to date by appends
+        rebuild_index()
+
+    with _index_lock:
+        index = _indexes.get(index_file)
+        if index is None:
+            index = _indexes[index_file] = {"inode": None, "offset": 0, "keys": set()}
+            while len(_indexes) > config.MAX_CACHED_TENANTS:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(index_file)
+        stat = os.stat(index_file)
+        if index["inode"] != stat.st_ino or stat.st_size < index["offset"]:
+            # The file was rebuilt, not appended to
+            index.update({"inode": stat.st_ino, "offset": 0, "keys": set()})
+        if stat.st_size > index["offset"]:
+            with open(index_file, 'r') as f:
+                f.seek(index["offset"])
+                new_lines = f.read()
+            # Only complete lines; a partially written line is read again next time
+            complete = new_lines[:new_lines.rfind("\n") + 1]
+            index["keys"].update(complete.split())
+            index["offset"] += len(complete)
+        return index["keys"]
+
+def find_conflicts(keys):
+    """List the keys that are already in the index or repeated among themselves"""
+    index = load_index()
+    seen = set()
+    conflicts = []
+    for key in keys:
+        key_hash = hash_key(key)
+        if key_hash in index or key_hash in seen:
+            conflicts.append(key)
+        seen.add(key_hash)
+    return conflicts
+
+def add_keys(keys):
+    """Append keys to the index file and the in-memory set"""
+    if not keys:
+        return
+    index_file = config.data_path(config.PAYMENT_INDEX_FILE)
+    load_index()
+    with open(index_file, 'a') as f:
+        f.write("".join(f"{hash_key(key)}\n" for key in keys))
+    load_index()
+
+def find_duplicate_records(df):
+    """List ledger rows that pay for the same month or yearly fee as another row"""
+    if df.empty:
+        return df
+    keys = get_paid_key_series(df)
+    paid = df.loc[keys.index].assign(**{"Payment Key": keys})
+    duplicates = paid[paid.duplicated("Payment Key", keep=False)]
+    return duplicates.sort_values("Payment Key", kind="stable").reset_index(drop=True)
@@ -0,0 +1,324 @@
+import os
+import csv
+import argparse
+from collections import Counter
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from fees import config, idempotency, ledger, students
+
+# Offline integrity checker for the fee ledger CSV. Loading the ledger skips
+# malformed lines and ignores dates it cannot parse; this scanner reports
+# them instead, along with values that load but are wrong:
+#
+#   missing_column / extra_column    header does not match LEDGER_COLUMNS
+#   malformed_line                   wrong number of fields (dropped on repair)
+#   empty_row                        every field blank (dropped on repair)
+#   missing_value                    ID, name, class, year or month blank
+#   bad_amount                       amount not a whole number (0 on repair)
+#   negative_amount                  amount below zero
+#   bad_date / bad_timestamp         Date or Entry Timestamp does not parse
+#   nonstandard_date                 parses, but not in the format the app writes
+#   unknown_month                    not a month, ANNUAL or ADMISSION
+#   academic_year_mismatch           Academic Year is not the one of its Date
+#   id_mismatch                      ID is not generate_student_id(name, class)
+#   duplicate_payment                pays a month or yearly fee paid on an earlier line
+#
+# The file is streamed in blocks of BLOCK_SIZE bytes by Arrow's CSV reader,
+# so memory stays bounded however long the ledger is; across blocks only a
+# sorted array of 64-bit hashes of the paid months and one ID per student
+# are kept. Every issue is written to a CSV report as it
+# is found. A repaired copy can be written at the same time, as CSV or as a
+# typed Arrow file (.arrow); duplicates and negative amounts are reported but
+# kept, since only a person can tell which payment is wrong.
+#
+#   python -m fees.integrity --report integrity_report.csv --repair fees_data_repaired.arrow
+
+BLOCK_SIZE = 4 << 20
+MAX_SAMPLES = 5
+
+DATE_FORMAT = "%Y-%m-%d"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Formats older ledgers were saved in by writing back the display frame
+FALLBACK_DATE_FORMAT = "%d-%m-%Y"
+FALLBACK_TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M"
+
+REQUIRED_COLUMNS = ["ID", "Student Name", "Class Category", "Academic Year", "Month"]
+VALID_MONTHS = config.MONTHS + ["ANNUAL", "ADMISSION"]
+REPORT_COLUMNS = ["Line", "Issue", "Column", "Value", "Detail"]
+
+def new_scan_state():
+    """Create the state carried from one chunk to the next"""
+    return {
+        "student_ids": {},
+        "paid_hashes": np.empty(0, dtype='uint64'),
+        "paid_lines": np.empty(0, dtype='int64'),
+        "issues": Counter(),
+        "samples": {},
+        "rows": 0
+    }
+
+def add_issues(state, writer, lines, issue, column, values, details=None):
+    """Record issues for the given lines, counting them and writing them to the report"""
+    if not len(lines):
+        return
+    state["issues"][issue] += len(lines)
+    details = details if details is not None else [""] * len(lines)
+    rows = [[int(line), issue, column, value, detail] for line, value, detail in zip(lines, values, details)]
+    state["samples"].setdefault(issue, [])
+    state["samples"][issue].extend(rows[:MAX_SAMPLES - len(state["samples"][issue])])
+    if writer is not None:
+        writer.writerows(rows)
+
+def parse_dates(values, standard_format, fallback_format):
+    """Parse text dates, returning the parsed values and which ones used the fallback format"""
+    parsed = pd.to_datetime(values, format=standard_format, errors='coerce')
+    failed = parsed.isna()
+    fallback = pd.to_datetime(values[failed], format=fallback_format, errors='coerce')
+    used_fallback = pd.Series(False, index=values.index)
+    used_fallback[fallback.index] = fallback.notna()
+    parsed[failed] = fallback
+    return parsed, used_fallback
+
+def get_academic_years(dates):
+    """Vectorized get_academic_year for parsed dates"""
+    start_year = dates.dt.year - (dates.dt.month < 4)
+    return start_year.astype('Int64').astype(str) + "-" + (start_year + 1).astype('Int64').astype(str)
+
+def check_chunk(df, lines, state, writer):
+    """Check one chunk of ledger rows, returning the repaired rows"""
+    lines = np.asarray(lines)
+    blank = df.apply(lambda col: col.str.strip() == "")
+
+    empty = blank.all(axis=1).to_numpy()
+    add_issues(state, writer, lines[empty], "empty_row", "", [""] * int(empty.sum()))
+    df, blank, lines = df[~empty], blank[~empty], lines[~empty]
+    repaired = df.copy()
+
+    for col in REQUIRED_COLUMNS:
+        if col in df.columns:
+            missing = blank[col].to_numpy()
+            add_issues(state, writer, lines[missing], "missing_value", col, df[col][missing])
+
+    for col in config.AMOUNT_COLUMNS:
+        if col not in df.columns:
+            continue
+        # Plain integers are cast directly; only the rest go through to_numeric
+        text = df[col].str.strip()
+        integer = text.str.fullmatch(r"-?\d+")
+        amounts = text.where(integer, "0").astype('int64').astype('float64')
+        other = (~integer & ~blank[col]).to_numpy()
+        amounts[other] = pd.to_numeric(text[other], errors='coerce')
+        bad = (amounts.isna() | (amounts % 1 != 0)).to_numpy()
+        add_issues(state, writer, lines[bad], "bad_amount", col, df[col][bad])
+        negative = (amounts < 0).to_numpy()
+        add_issues(state, writer, lines[negative], "negative_amount", col, df[col][negative])
+        repaired[col] = amounts.where(~bad, 0).astype('int64')
+
+    dates = None
+    if "Date" in df.columns:
+        dates, nonstandard = parse_dates(df["Date"], DATE_FORMAT, FALLBACK_DATE_FORMAT)
+        bad = (dates.isna() & ~blank["Date"]).to_numpy()
+        add_issues(state, writer, lines[bad], "bad_date", "Date", df["Date"][bad])
+        add_issues(state, writer, lines[nonstandard.to_numpy()], "nonstandard_date", "Date", df["Date"][nonstandard])
+        repaired["Date"] = dates.dt.strftime(DATE_FORMAT).where(dates.notna(), df["Date"])
+
+    if "Entry Timestamp" in df.columns:
+        stamps, nonstandard = parse_dates(df["Entry Timestamp"], TIMESTAMP_FORMAT, FALLBACK_TIMESTAMP_FORMAT)
+        bad = (stamps.isna() & ~blank["Entry Timestamp"]).to_numpy()
+        add_issues(state, writer, lines[bad], "bad_timestamp", "Entry Timestamp", df["Entry Timestamp"][bad])
+        add_issues(state, writer, lines[nonstandard.to_numpy()], "nonstandard_date", "Entry Timestamp", df["Entry Timestamp"][nonstandard])
+        repaired["Entry Timestamp"] = stamps.dt.strftime(TIMESTAMP_FORMAT).where(stamps.notna(), df["Entry Timestamp"])
+
+    if "Month" in df.columns:
+        unknown = (~df["Month"].isin(VALID_MONTHS) & ~blank["Month"]).to_numpy()
+        add_issues(state, writer, lines[unknown], "unknown_month", "Month", df["Month"][unknown])
+
+    if dates is not None and "Academic Year" in df.columns:
+        expected = get_academic_years(dates)
+        mismatch = (dates.notna() & (df["Academic Year"] != expected)).to_numpy()
+        add_issues(state, writer, lines[mismatch], "academic_year_mismatch", "Academic Year",
+                   df["Academic Year"][mismatch], [f"Date is in {year}" for year in expected[mismatch]])
+        repaired["Academic Year"] = expected.where(dates.notna(), df["Academic Year"])
+
+    if {"ID", "Student Name", "Class Category"} <= set(df.columns):
+        # IDs are generated once per distinct student, not per row
+        student_ids = state["student_ids"]
+        codes, uniques = pd.factorize(df["Student Name"] + "_" + df["Class Category"])
+        first_rows = df.iloc[np.unique(codes, return_index=True)[1]]
+        for name, category in zip(first_rows["Student Name"].tolist(), first_rows["Class Category"].tolist()):
+            if f"{name}_{category}" not in student_ids:
+                student_ids[f"{name}_{category}"] = students.generate_student_id(name, category)
+        expected = pd.Series(np.array([student_ids[key] for key in uniques.tolist()])[codes], index=df.index)
+        known = ~blank["Student Name"] & ~blank["Class Category"]
+        mismatch = (known & (df["ID"] != expected)).to_numpy()
+        add_issues(state, writer, lines[mismatch], "id_mismatch", "ID", df["ID"][mismatch],
+                   [f"expected {student_id}" for student_id in expected[mismatch]])
+        repaired["ID"] = expected.where(known, df["ID"])
+
+    if set(config.FEE_COLUMNS + ["ID", "Academic Year", "Month"]) <= set(df.columns):
+        keys = idempotency.get_paid_key_series(repaired)
+        key_lines = lines[repaired.index.get_indexer(keys.index)]
+        hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+        # Paid in an earlier chunk, or earlier in this one
+        seen, seen_lines = state["paid_hashes"], state["paid_lines"]
+        positions = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+        earlier = (seen[positions] == hashes) if len(seen) else np.zeros(len(hashes), dtype=bool)
+        first_lines = np.where(earlier, seen_lines[positions] if len(seen) else 0, 0)
+        repeated = pd.Series(hashes).duplicated().to_numpy() & ~earlier
+        first_in_chunk = pd.Series(key_lines, index=hashes)
+        first_in_chunk = first_in_chunk[~first_in_chunk.index.duplicated()]
+        first_lines[repeated] = first_in_chunk[hashes[repeated]].to_numpy()
+        duplicate = earlier | repeated
+        add_issues(state, writer, key_lines[duplicate], "duplicate_payment", "Month", keys[duplicate],
+                   [f"already paid on line {line}" for line in first_lines[duplicate]])
+
+        # Merge this chunk's new keys into the sorted arrays without re-sorting them
+        new = ~duplicate
+        order = np.argsort(hashes[new])
+        new_hashes, new_lines = hashes[new][order], key_lines[new][order]
+        at = np.searchsorted(seen, new_hashes)
+        state["paid_hashes"] = np.insert(seen, at, new_hashes)
+        state["paid_lines"] = np.insert(seen_lines, at, new_lines)
+
+    state["rows"] += len(df) + int(empty.sum())
+    return repaired
+
+class RepairWriter:
+    """Write repaired chunks to a CSV or typed Arrow file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.arrow = path.endswith((".arrow", ".feather"))
+        self.writer = None
+        self.file = None
+
+    def write(self, df):
+        """Append one repaired chunk in the ledger's column order"""
+        for col in config.LEDGER_COLUMNS:
+            if col not in df.columns:
+                df[col] = 0 if col in config.AMOUNT_COLUMNS else ""
+        typed = ledger.to_typed_ledger(df[config.LEDGER_COLUMNS])
+        if not self.arrow:
+            typed.to_csv(self.path, mode='a' if self.file else 'w', header=not self.file, index=False)
+            self.file = self.path
+            return
+        table = pa.Table.from_pandas(typed, preserve_index=False)
+        if self.writer is None:
+            self.file = pa.OSFile(self.path, 'wb')
+            self.writer = pa.ipc.new_file(self.file, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        """Finish the file, writing just the header if no rows were repaired"""
+        if self.file is None:
+            self.write(pd.DataFrame(columns=config.LEDGER_COLUMNS))
+        if self.writer is not None:
+            self.writer.close()
+            self.file.close()
+
+def get_line_numbers(next_line, n_rows, skipped_lines):
+    """Number the rows of a block, which follow next_line except for skipped malformed lines"""
+    skipped = np.array([line for line in skipped_lines if line >= next_line], dtype='int64')
+    candidates = np.arange(next_line, next_line + n_rows + len(skipped))
+    return candidates[~np.isin(candidates, skipped)][:n_rows]
+
+def check_ledger(csv_file=None, report_file=None, repair_file=None, block_size=BLOCK_SIZE,
+                 report_progress=None, is_cancelled=None):
+    """Scan a ledger CSV for integrity issues, optionally writing a report and a repaired copy
+
+    Returns a summary dict with the rows scanned, issue counts and a few
+    sample issues of each kind. Line numbers count records, with the header
+    as line 1.
+    """
+    csv_file = csv_file or config.data_path(config.CSV_FILE)
+    state = new_scan_state()
+    if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
+        return {"rows": 0, "issues": {}, "samples": {}}
+    total_bytes = os.path.getsize(csv_file)
+    with open(csv_file, 'r', newline='') as f:
+        header = next(csv.reader(f), [])
+
+    malformed = []
+    def skip_malformed(row):
+        malformed.append((row.number, row.text, row.actual_columns))
+        return "skip"
+
+    def report_malformed(start):
+        rows = malformed[start:]
+        add_issues(state, writer, [line for line, _, _ in rows], "malformed_line", "",
+                   [text for _, text, _ in rows], [f"{fields} fields, expected {len(header)}" for _, _, fields in rows])
+        state["rows"] += len(rows)
+        return len(malformed)
+
+    report = open(report_file, 'w', newline='') if report_file else None
+    repair = RepairWriter(repair_file) if repair_file else None
+    source = open(csv_file, 'rb')
+    try:
+        writer = csv.writer(report) if report else None
+        if writer:
+            writer.writerow(REPORT_COLUMNS)
+        missing = [col for col in config.LEDGER_COLUMNS if col not in header]
+        extra = [col for col in header if col not in config.LEDGER_COLUMNS]
+        add_issues(state, writer, [1] * len(missing), "missing_column", "", missing)
+        add_issues(state, writer, [1] * len(extra), "extra_column", "", extra)
+
+        # Read serially so malformed lines are reported in order, with their numbers
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(use_threads=False, block_size=block_size),
+            parse_options=pa_csv.ParseOptions(
+                newlines_in_values=True, ignore_empty_lines=False, invalid_row_handler=skip_malformed
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in header}, strings_can_be_null=False
+            )
+        )
+        next_line, reported = 2, 0
+        for batch in reader:
+            if is_cancelled and is_cancelled():
+                break
+            lines = get_line_numbers(next_line, batch.num_rows, [line for line, _, _ in malformed[reported:]])
+            if len(lines):
+                next_line = int(lines[-1]) + 1
+            reported = report_malformed(reported)
+            repaired = check_chunk(batch.to_pandas(), lines, state, writer)
+            if repair:
+                repair.write(repaired)
+            if report_progress:
+                report_progress(min(source.tell() / total_bytes, 1.0))
+        else:
+            report_malformed(reported)
+    finally:
+        source.close()
+        if report:
+            report.close()
+        if repair:
+            repair.close()
+
+    return {"rows": state["rows"], "issues": dict(state["issues"]), "samples": state["samples"]}
+
+def main():
+    """Check the ledger from the command line"""
+    parser = argparse.ArgumentParser(description="Check the fee ledger for integrity issues")
+    parser.add_argument("--ledger", help="ledger CSV to check (default: the school's fees_data.csv)")
+    parser.add_argument("--report", help="write every issue to this CSV file")
+    parser.add_argument("--repair", help="write a repaired copy to this .csv or .arrow file")
+    parser.add_argument("--school", help="School ID on a deployment serving several schools")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="bytes read per block")
+    args = parser.parse_args()
+
+    with config.use_tenant(args.school):
+        summary = check_ledger(args.ledger, args.report, args.repair, args.block_size)
+
+    print(f"{summary['rows']:,} rows checked, {sum(summary['issues'].values()):,} issues")
+    for issue, count in sorted(summary["issues"].items()):
+        print(f"  {issue}: {count:,}")
+        for line, _, column, value, detail in summary["samples"][issue]:
+            print(f"    line {line}: {column} {value!r} {detail}".rstrip())
+    raise SystemExit(1 if summary["issues"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import os
+import json
+import threading
+import contextvars
+from datetime import datetime
+from hashlib import md5
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from fees import config, storage, ledger, query, balances, reports, idempotency, integrity
+
+# Background jobs for reports and exports. Jobs run on a shared thread pool,
+# their table is persisted to jobs.json, and results are cached as CSV files
+# keyed by the job parameters and the ledger version. Each school has its
+# own job table and results.
+
+JOB_WORKERS = 2
+JOB_CHUNK_SIZE = 50000
+
+_init_lock = threading.Lock()
+_executors = {}
+_registries = {}
+
+def get_job_executor():
+    """Thread pool shared by every caller in the process for running jobs"""
+    with _init_lock:
+        if "jobs" not in _executors:
+            _executors["jobs"] = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="fees-job")
+        return _executors["jobs"]
+
+def get_report_executor():
+    """Process pool shared by every caller in the process for parallel reports"""
+    with _init_lock:
+        if "reports" not in _executors:
+            _executors["reports"] = reports.get_report_executor()
+        return _executors["reports"]
+
+def get_job_registry():
+    """Shared in-memory job table for the current school, seeded from its job file"""
+    jobs_file = config.data_path(config.JOBS_FILE)
+    with _init_lock:
+        registry = _registries.setdefault(jobs_file, {})
+        if not registry:
+            try:
+                jobs = storage.read_json(jobs_file)
+            except (OSError, ValueError):
+                jobs = {}
+            
+            # Jobs that were still running when the server stopped can never finish
+            for job in jobs.values():
+                if job["status"] in ("queued", "running"):
+                    job["status"] = "interrupted"
+            
+            registry.update({"lock": threading.Lock(), "jobs": jobs, "cancel_events": {}, "futures": {}})
+        return registry
+
+def save_job_table(registry):
+    """Persist the job table; must be called with the registry lock held"""
+    storage.write_json(config.data_path(config.JOBS_FILE), registry["jobs"])
+
+def get_job_cache_key(kind, params):
+    """Build a cache key from the job parameters and the current ledger version"""
+    csv_file = config.data_path(config.CSV_FILE)
+    ledger_version = ledger.get_ledger_version() if os.path.exists(csv_file) else None
+    payload = json.dumps({"kind": kind, "params": params, "ledger": ledger_version}, sort_keys=True)
+    return md5(payload.encode('utf-8')).hexdigest()
+
+def run_records_export_job(params, report_progress, is_cancelled):
+    """Export all ledger rows, optionally limited to one academic year"""
+    academic_year = params.get("academic_year")
+    parts = []
+    for chunk in ledger.iter_ledger_chunks(JOB_CHUNK_SIZE, report_progress, is_cancelled):
+        if academic_year:
+            chunk = chunk[chunk["Academic Year"] == academic_year]
+        parts.append(chunk)
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+def run_class_summary_job(params, report_progress, is_cancelled):
+    """Total fees collected per academic year and class category"""
+    df = query.find_records(
+        ["Academic Year", "Class Category"] + config.AMOUNT_COLUMNS, academic_year=params.get("academic_year")
+    )
+    if df.empty:
+        return pd.DataFrame()
+    return reports.class_totals_report(df, executor=get_report_executor(), report_progress=report_progress)
+
+def run_monthly_collections_job(params, report_progress, is_cancelled):
+    """Total fees collected per academic year and month"""
+    df = query.find_records(["Academic Year", "Month"] + config.AMOUNT_COLUMNS, academic_year=params.get("academic_year"))
+    if df.empty:
+        return pd.DataFrame()
+    return reports.monthly_collections_report(df, executor=get_report_executor(), report_progress=report_progress)
+
+def run_arrears_report_job(params, report_progress, is_cancelled):
+    """List every student with an outstanding balance for an academic year, by default the current one"""
+    return balances.get_arrears_list(params.get("academic_year"))
+
+def run_duplicate_scan_job(params, report_progress, is_cancelled):
+    """Find ledger rows that pay for a month or yearly fee already paid by another row"""
+    return idempotency.find_duplicate_records(query.find_records(academic_year=params.get("academic_year")))
+
+def run_integrity_check_job(params, report_progress, is_cancelled):
+    """List every integrity issue in the ledger file; the whole file is always checked"""
+    results_dir = config.data_path(config.JOB_RESULTS_DIR)
+    os.makedirs(results_dir, exist_ok=True)
+    report_file = os.path.join(results_dir, f"integrity.{threading.get_ident()}.tmp")
+    try:
+        integrity.check_ledger(report_file=report_file, report_progress=report_progress, is_cancelled=is_cancelled)
+        return pd.read_csv(report_file, dtype=str)
+    finally:
+        os.remove(report_file)
+
+JOB_HANDLERS = {
+    "records_export": run_records_export_job,
+    "class_summary": run_class_summary_job,
+    "monthly_collections": run_monthly_collections_job,
+    "arrears_report": run_arrears_report_job,
+    "duplicate_scan": run_duplicate_scan_job,
+    "integrity_check": run_integrity_check_job
+}
+
+def run_job(job_id):
+    """Execute a queued job in a worker thread and record its outcome"""
+    registry = get_job_registry()
+    job = registry["jobs"][job_id]
+    cancel_event = registry["cancel_events"][job_id]
+    
+    def report_progress(fraction):
+        job["progress"] = round(fraction, 3)
+    
+    with registry["lock"]:
+        if cancel_event.is_set():
+            return
+        job["status"] = "running"
+        job["started_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        save_job_table(registry)
+    
+    try:
+        result = JOB_HANDLERS[job["kind"]](job["params"], report_progress, cancel_event.is_set)
+        if cancel_event.is_set():
+            status = "cancelled"
+        else:
+            results_dir = config.data_path(config.JOB_RESULTS_DIR)
+            os.makedirs(results_dir, exist_ok=True)
+            result_file = os.path.join(results_dir, f"{job['cache_key']}.csv")
+            result.to_csv(result_file, index=False)
+            job["result_file"] = result_file
+            job["progress"] = 1.0
+            status = "completed"
+    except Exception as e:
+        job["error"] = str(e)
+        status = "failed"
+    
+    with registry["lock"]:
+        job["status"] = status
+        job["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        registry["cancel_events"].pop(job_id, None)
+        registry["futures"].pop(job_id, None)
+        save_job_table(registry)
+
+def submit_job(kind, params, submitted_by):
+    """Queue a background job, reusing a cached or in-flight job with the same parameters"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    
+    registry = get_job_registry()
+    cache_key = get_job_cache_key(kind, params)
+    
+    with registry["lock"]:
+        for job_id, job in registry["jobs"].items():
+            if job["cache_key"] != cache_key:
+                continue
+            if job["status"] in ("queued", "running"):
+                return job_id
+            if job["status"] == "completed" and os.path.exists(job.get("result_file") or ""):
+                return job_id
+        
+        job_id = md5(f"{cache_key}_{datetime.now().timestamp()}".encode('utf-8')).hexdigest()[:12]
+        registry["jobs"][job_id] = {
+            "kind": kind,
+            "params": params,
+            "cache_key": cache_key,
+            "status": "queued",
+            "progress": 0.0,
+            "submitted_by": submitted_by,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "started_at": None,
+            "finished_at": None,
+            "result_file": None,
+            "error": None
+        }
+        registry["cancel_events"][job_id] = threading.Event()
+        save_job_table(registry)
+        # The worker thread works on the same school as the caller
+        registry["futures"][job_id] = get_job_executor().submit(contextvars.copy_context().run, run_job, job_id)
+    
+    return job_id
+
+def cancel_job(job_id):
+    """Request cancellation of a queued or running job"""
+    registry = get_job_registry()
+    with registry["lock"]:
+        job = registry["jobs"].get(job_id)
+        if not job or job["status"] not in ("queued", "running"):
+            return False
+        registry["cancel_events"][job_id].set()
+        future = registry["futures"].get(job_id)
+        if future is not None and future.cancel():
+            # Never started, so run_job will not record the outcome itself
+            job["status"] = "cancelled"
+            job["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            registry["cancel_events"].pop(job_id, None)
+            registry["futures"].pop(job_id, None)
+            save_job_table(registry)
+        return True
+
+def get_job(job_id):
+    """Get a snapshot of a job's current status"""
+    job = get_job_registry()["jobs"].get(job_id)
+    return dict(job) if job else None
+
+def wait_for_job(job_id, timeout=None):
+    """Block until a job finishes and return its final status"""
+    future = get_job_registry()["futures"].get(job_id)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass
+    return get_job(job_id)
+
+def load_job_result(job_id):
+    """Load the cached result of a completed job"""
+    job = get_job(job_id)
+    if not job or job["status"] != "completed" or not os.path.exists(job.get("result_file") or ""):
+        return None
+    return pd.read_csv(job["result_file"])
@@ -0,0 +1,304 @@
+import os
+import csv
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from fees import config
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process file locks on this platform; writes are still
+    # serialized between threads of one process
+    fcntl = None
+
+# The fee ledger: a CSV file of fee records, plus a typed Arrow copy that is
+# memory-mapped read-only and shared by every caller in the process. Each
+# school's table is cached separately, least recently used first out.
+#
+# Every write to a school's ledger holds its write lock: an RLock between
+# threads, and between processes (the app, the API, scripts) a lock on the
+# school's ledger.lock file, taken once by the outermost holder. Take the
+# write lock before a cache entry's lock, never the other way round.
+#
+# Each school's cache entry has its own locks: "lock", held only to read or
+# swap the cached table, and "build_lock", held while a stale table is rebuilt
+# from the CSV, so one school's rebuild never blocks another school's reads.
+# Rebuilds do not take the write lock; the CSV is read until its version is
+# the same before and after, so a table is never stamped with a version
+# newer than its rows. _ledger_lock only guards the cache itself.
+
+_ledger_lock = threading.Lock()
+_ledger_tables = OrderedDict()
+_write_locks = {}
+_locks_lock = threading.Lock()
+MAX_CACHED_CHUNKS = 64
+
+@contextmanager
+def get_write_lock():
+    """Hold the write lock for the current school's ledger"""
+    lock_path = config.data_path(config.LEDGER_LOCK_FILE)
+    with _locks_lock:
+        state = _write_locks.setdefault(lock_path, {"lock": threading.RLock(), "depth": 0, "file": None})
+    with state["lock"]:
+        if state["depth"] == 0:
+            lock_file = open(lock_path, 'a')
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            state["file"] = lock_file
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+            if state["depth"] == 0:
+                if fcntl:
+                    fcntl.flock(state["file"], fcntl.LOCK_UN)
+                state["file"].close()
+                state["file"] = None
+
+def initialize_csv():
+    """Initialize the CSV file with proper columns if it doesn't exist"""
+    csv_file = config.data_path(config.CSV_FILE)
+    if not os.path.exists(csv_file):
+        with open(csv_file, 'w', newline='') as f:
+            csv.writer(f).writerow(config.LEDGER_COLUMNS)
+        return
+    
+    # Only the header is needed to tell whether columns are missing
+    with open(csv_file, 'r', newline='') as f:
+        header = next(csv.reader(f), [])
+    if all(col in header for col in config.LEDGER_COLUMNS):
+        return
+    
+    df = pd.read_csv(csv_file, dtype=config.LEDGER_DTYPES)
+    for col in config.LEDGER_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+    df.to_csv(csv_file, index=False)
+
+def normalize_ledger_frame(df):
+    """Add missing columns and format dates the way the app displays them"""
+    for col in config.LEDGER_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+    
+    try:
+        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%d-%m-%Y')
+    except (ValueError, TypeError):
+        pass
+    
+    try:
+        df['Entry Timestamp'] = pd.to_datetime(df['Entry Timestamp']).dt.strftime('%d-%m-%Y %H:%M')
+    except (ValueError, TypeError):
+        pass
+    
+    return df.dropna(how='all')
+
+def load_ledger():
+    """Load the ledger CSV, skipping malformed lines and normalizing dates for display"""
+    csv_file = config.data_path(config.CSV_FILE)
+    if not os.path.exists(csv_file):
+        return pd.DataFrame()
+    
+    try:
+        df = pd.read_csv(csv_file, dtype=config.LEDGER_DTYPES)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except pd.errors.ParserError:
+        df = pd.read_csv(csv_file, dtype=config.LEDGER_DTYPES, on_bad_lines='skip')
+    
+    return normalize_ledger_frame(df)
+
+def append_records(records):
+    """Append fee records to the end of the ledger CSV without rewriting it
+
+    Returns the ledger versions before and after the write.
+    """
+    csv_file = config.data_path(config.CSV_FILE)
+    if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
+        initialize_csv()
+    
+    before_version = get_ledger_version()
+    with open(csv_file, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8')]), [])
+        # Make sure the first new row does not end up on the last existing line
+        f.seek(-1, os.SEEK_END)
+        needs_newline = f.read(1) not in (b"\n", b"\r")
+    
+    with open(csv_file, 'a', newline='') as f:
+        if needs_newline:
+            f.write("\n")
+        writer = csv.DictWriter(f, fieldnames=header, extrasaction='ignore')
+        writer.writerows(records)
+    
+    after_version = get_ledger_version()
+    apply_to_cached_table(records, before_version, after_version)
+    return before_version, after_version
+
+def write_ledger(df):
+    """Replace the ledger CSV with the given DataFrame"""
+    df.to_csv(config.data_path(config.CSV_FILE), index=False)
+
+def count_ledger_rows():
+    """Count data rows in the ledger file without parsing it"""
+    csv_file = config.data_path(config.CSV_FILE)
+    if not os.path.exists(csv_file):
+        return 0
+    with open(csv_file, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+def iter_ledger_chunks(chunk_size, report_progress=None, is_cancelled=None):
+    """Yield the ledger in chunks, reporting progress and stopping on cancellation"""
+    csv_file = config.data_path(config.CSV_FILE)
+    if not os.path.exists(csv_file):
+        return
+    total_rows = max(count_ledger_rows(), 1)
+    rows_read = 0
+    for chunk in pd.read_csv(csv_file, dtype=config.LEDGER_DTYPES, chunksize=chunk_size):
+        if is_cancelled and is_cancelled():
+            return
+        rows_read += len(chunk)
+        yield chunk
+        if report_progress:
+            report_progress(min(rows_read / total_rows, 1.0))
+
+def to_typed_ledger(df):
+    """Coerce amount columns to integers and text columns to strings for Arrow storage"""
+    ledger = df.copy()
+    for col in ledger.columns:
+        if col in config.AMOUNT_COLUMNS:
+            ledger[col] = pd.to_numeric(ledger[col], errors='coerce').fillna(0).astype('int64')
+        else:
+            ledger[col] = ledger[col].astype('string')
+    return ledger
+
+def get_ledger_version():
+    """Identify the current state of the ledger CSV by modification time and size"""
+    stat = os.stat(config.data_path(config.CSV_FILE))
+    # Filesystem timestamps are coarse, so the size catches writes in the same tick
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def write_ledger_arrow(df, ledger_version):
+    """Write the typed ledger as an uncompressed Arrow file, replacing it atomically"""
+    write_table_arrow(pa.Table.from_pandas(to_typed_ledger(df), preserve_index=False), ledger_version)
+
+def write_table_arrow(table, ledger_version):
+    """Write a typed ledger table as an uncompressed Arrow file, replacing it atomically"""
+    arrow_file = config.data_path(config.LEDGER_ARROW_FILE)
+    tmp_file = f"{arrow_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"ledger_version": ledger_version.encode()})
+    feather.write_feather(table, tmp_file, compression="uncompressed")
+    os.replace(tmp_file, arrow_file)
+
+def read_ledger_arrow(ledger_version):
+    """Memory-map the Arrow ledger if it was written from the given ledger version"""
+    arrow_file = config.data_path(config.LEDGER_ARROW_FILE)
+    if not os.path.exists(arrow_file):
+        return None
+    table = feather.read_table(arrow_file, memory_map=True)
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"ledger_version", b"").decode() != ledger_version:
+        return None
+    return table
+
+def get_cached_table():
+    """Get the current school's table cache entry, creating it if needed"""
+    csv_file = config.data_path(config.CSV_FILE)
+    with _ledger_lock:
+        entry = _ledger_tables.get(csv_file)
+        if entry is None:
+            entry = _ledger_tables[csv_file] = {
+                "lock": threading.Lock(), "build_lock": threading.Lock(),
+                "version": None, "table": None, "mapped_chunks": 0
+            }
+            while len(_ledger_tables) > config.MAX_CACHED_TENANTS:
+                _ledger_tables.popitem(last=False)
+        else:
+            _ledger_tables.move_to_end(csv_file)
+    return entry
+
+def build_ledger_table():
+    """Write the Arrow ledger from the CSV and map it; returns (table, ledger version)
+
+    The CSV is stat'ed again after it is read, and read again if it changed,
+    so the table never carries a version older than its rows.
+    """
+    while True:
+        ledger_version = get_ledger_version()
+        df = load_ledger()
+        if get_ledger_version() == ledger_version:
+            break
+    write_ledger_arrow(df, ledger_version)
+    table = read_ledger_arrow(ledger_version)
+    if table is None:
+        # The Arrow file was replaced by another writer; serve this copy from memory
+        table = pa.Table.from_pandas(to_typed_ledger(df), preserve_index=False)
+    return table, ledger_version
+
+def get_ledger_table():
+    """Get the shared read-only ledger table, regenerating it if the CSV has changed"""
+    if not os.path.exists(config.data_path(config.CSV_FILE)):
+        return None
+    
+    cached = get_cached_table()
+    with cached["lock"]:
+        is_current = cached["version"] == get_ledger_version()
+        table = cached["table"]
+    
+    if not is_current:
+        # Readers of this school wait for one rebuild instead of each parsing the CSV
+        with cached["build_lock"]:
+            with cached["lock"]:
+                ledger_version = get_ledger_version()
+                is_current = cached["version"] == ledger_version
+                table = cached["table"]
+            if not is_current:
+                table = read_ledger_arrow(ledger_version)
+                if table is None:
+                    table, ledger_version = build_ledger_table()
+                with cached["lock"]:
+                    # One mapping per ledger version, shared by every session in the process,
+                    # unless a save already brought the cached table up to date
+                    if cached["version"] != get_ledger_version():
+                        cached["table"] = table
+                        cached["version"] = ledger_version
+                        cached["mapped_chunks"] = table.column(0).num_chunks if table.num_columns else 0
+                    table = cached["table"]
+    
+    return table if table is not None and "ID" in table.column_names else None
+
+def apply_to_cached_table(records, before_version, after_version):
+    """Append newly written records to the shared table instead of reloading the ledger
+
+    Only applies when the cached table matches the ledger as it was just
+    before the write; otherwise the next read regenerates it from the CSV.
+    Call with the write lock held.
+    """
+    cached = get_cached_table()
+    with cached["lock"]:
+        table = cached["table"]
+        if table is None or cached["version"] != before_version or "ID" not in table.column_names:
+            return
+        new_rows = normalize_ledger_frame(pd.DataFrame(records)).reindex(columns=table.column_names)
+        new_table = pa.Table.from_pandas(to_typed_ledger(new_rows), schema=table.schema, preserve_index=False)
+        table = pa.concat_tables([table, new_table])
+        if table.column(0).num_chunks >= cached["mapped_chunks"] + MAX_CACHED_CHUNKS:
+            # Every save adds a chunk; once there are many, write the table
+            # out from memory and map it again, without reparsing the CSV
+            write_table_arrow(table.combine_chunks(), after_version)
+            mapped = read_ledger_arrow(after_version)
+            if mapped is not None:
+                table = mapped
+            cached["mapped_chunks"] = table.column(0).num_chunks
+        cached["table"] = table
+        cached["version"] = after_version
+
+def load_ledger_frame():
+    """Get the whole typed ledger as a DataFrame; use fees.query for filtered reads"""
+    table = get_ledger_table()
+    return table.to_pandas() if table is not None else pd.DataFrame()
@@ -0,0 +1,213 @@
+from datetime import datetime
+from fees import config, ledger, query, students, schedules, balances, rollups, audit, idempotency, receipts
+
+# The fee entry write path: build records for a payment, check it against
+# what has already been paid, and save it together with the derived
+# balances and rollups. Every ledger write is recorded in the audit log, and
+# holds ledger.get_write_lock() so a payment's validation and its save happen
+# atomically across threads and processes.
+
+FEE_TYPE_MONTHS = {"Annual Charges": "ANNUAL", "Admission Fee": "ADMISSION"}
+
+class DuplicatePaymentError(ValueError):
+    """Raised when saving records that pay for something already paid"""
+
+def initialize_data_files():
+    """Initialize the fee ledger and the files derived from it"""
+    ledger.initialize_csv()
+    schedules.initialize_student_fees()
+    balances.initialize_balances()
+    rollups.initialize_rollups()
+
+def build_fee_records(student_name, class_category, class_section, fee_type, amount,
+                      received_amount, payment_method, payment_date, signature, months=None):
+    """Build the ledger rows for one payment
+
+    Monthly fees produce one row per month with the received amount spread
+    across them; annual charges and admission fees produce a single row.
+    """
+    student_id = students.generate_student_id(student_name, class_category)
+    base_record = {
+        "ID": student_id,
+        "Student Name": student_name,
+        "Class Category": class_category,
+        "Class Section": class_section,
+        "Payment Method": payment_method,
+        "Date": payment_date.strftime("%Y-%m-%d"),
+        "Signature": signature,
+        "Entry Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Academic Year": students.get_academic_year(payment_date),
+        "Receipt No": ""
+    }
+    
+    if fee_type in FEE_TYPE_MONTHS:
+        records = [{
+            **base_record,
+            "Month": FEE_TYPE_MONTHS[fee_type],
+            "Monthly Fee": 0,
+            "Annual Charges": amount if fee_type == "Annual Charges" else 0,
+            "Admission Fee": amount if fee_type == "Admission Fee" else 0,
+            "Received Amount": received_amount
+        }]
+    else:
+        # Spread the received amount across the selected months
+        received_per_month, remainder = divmod(received_amount, len(months))
+        records = [
+            {
+                **base_record,
+                "Month": month,
+                "Monthly Fee": amount,
+                "Annual Charges": 0,
+                "Admission Fee": 0,
+                "Received Amount": received_per_month + (remainder if i == 0 else 0)
+            }
+            for i, month in enumerate(months)
+        ]
+    
+    return [{col: record[col] for col in config.LEDGER_COLUMNS} for record in records]
+
+def validate_payment(student_id, fee_type, academic_year, months=None):
+    """Check a payment against what the student has already paid
+
+    Returns an error message, or None if the payment can be recorded.
+    """
+    if fee_type not in config.FEE_TYPES:
+        return f"Unknown fee type: {fee_type}"
+    
+    if fee_type == "Monthly Fee":
+        if not months:
+            return "Please select a month for Monthly Fee payment."
+        unpaid_months = students.get_unpaid_months(student_id, academic_year)
+        already_paid = [month for month in months if month not in unpaid_months]
+        if already_paid:
+            return f"Monthly fee has already been paid for: {', '.join(already_paid)}"
+        return None
+    
+    annual_paid, admission_paid = students.check_annual_admission_paid(student_id, academic_year)
+    if fee_type == "Annual Charges" and annual_paid:
+        return "Annual charges have already been paid for this academic year!"
+    if fee_type == "Admission Fee" and admission_paid:
+        return "Admission fee has already been paid for this academic year!"
+    return None
+
+def save_records(records, actor=None):
+    """Append fee records to the ledger and apply them to balances and rollups
+
+    actor is the user or client making the change, for the audit log.
+    Each payment's rows are stamped with a receipt number; returns the
+    receipt numbers in order.
+    """
+    with ledger.get_write_lock():
+        # Checked under the write lock, so two saves of the same payment
+        # cannot both pass
+        keys = [idempotency.get_record_key(record) for record in records if idempotency.is_paid_record(record)]
+        conflicts = idempotency.find_conflicts(keys)
+        if conflicts:
+            raise DuplicatePaymentError(f"Already recorded: {describe_payment_keys(conflicts)}")
+        
+        receipts.stamp_receipts(records)
+        audit.record_baseline(actor)
+        before_version, after_version = ledger.append_records(records)
+        receipts.add_to_index(records, before_version, after_version)
+        query.add_to_index(records, before_version, after_version)
+        idempotency.add_keys(keys)
+        audit.record_append(records, actor)
+        balances.update_balances(records)
+        rollups.update_rollups(records)
+    return list(dict.fromkeys(record["Receipt No"] for record in records))
+
+def replace_records(df, actor=None):
+    """Replace the whole ledger and rebuild balances and rollups from it"""
+    with ledger.get_write_lock():
+        audit.record_baseline(actor)
+        before_rows = audit.read_ledger_rows()
+        ledger.write_ledger(df)
+        idempotency.rebuild_index(df)
+        audit.record_replace(before_rows, audit.read_ledger_rows(), actor)
+        balances.save_balances(balances.rebuild_balances(df))
+        rollups.save_rollups(rollups.rebuild_rollups(df))
+
+def get_payment_keys(student_id, fee_type, academic_year, months=None):
+    """Idempotency keys identifying what a payment pays for"""
+    if fee_type == "Monthly Fee":
+        return [idempotency.get_payment_key(student_id, academic_year, month) for month in months or []]
+    return [idempotency.get_payment_key(student_id, academic_year, FEE_TYPE_MONTHS[fee_type])]
+
+def describe_payment_keys(keys):
+    """Describe idempotency keys as the months or fees they pay for"""
+    labels = {value: fee_type for fee_type, value in FEE_TYPE_MONTHS.items()}
+    descriptions = []
+    for key in keys:
+        _, academic_year, month = key.split("|")
+        descriptions.append(f"{labels.get(month, month)} {academic_year}")
+    return ", ".join(descriptions)
+
+def prepare_payment(payment, pending_keys):
+    """Validate one payment and build its records without saving them
+
+    Returns (True, records) or (False, message). pending_keys holds what
+    earlier payments in the same batch pay for and is updated in place.
+    """
+    if not payment.get("student_name") or not payment.get("class_category") or not payment.get("signature"):
+        return False, "Please fill all required fields (*)"
+    
+    student_id = students.generate_student_id(payment["student_name"], payment["class_category"])
+    academic_year = students.get_academic_year(payment["payment_date"])
+    if payment["fee_type"] not in config.FEE_TYPES:
+        return False, f"Unknown fee type: {payment['fee_type']}"
+    keys = get_payment_keys(student_id, payment["fee_type"], academic_year, payment.get("months"))
+    if any(key in pending_keys for key in keys):
+        return False, "This payment repeats an earlier payment in the same batch."
+    
+    conflicts = idempotency.find_conflicts(keys)
+    if conflicts:
+        return False, f"Already recorded: {describe_payment_keys(conflicts)}"
+    
+    error = validate_payment(student_id, payment["fee_type"], academic_year, payment.get("months"))
+    if error:
+        return False, error
+    
+    pending_keys.update(keys)
+    return True, build_fee_records(
+        payment["student_name"], payment["class_category"], payment.get("class_section", ""),
+        payment["fee_type"], payment["amount"], payment["received_amount"],
+        payment["payment_method"], payment["payment_date"], payment["signature"], payment.get("months")
+    )
+
+def record_payments(payments, actor=None):
+    """Validate and save a batch of payments with a single ledger write
+
+    Each payment is a dict of record_payment() arguments. Returns one
+    (ok, records or message) result per payment; rejected payments do not
+    stop the others from being saved.
+    """
+    with ledger.get_write_lock():
+        pending_keys = set()
+        results = [prepare_payment(payment, pending_keys) for payment in payments]
+        # One receipt per payment, even when a student has several in the batch
+        for ok, result in results:
+            if ok:
+                receipts.stamp_receipts(result)
+        records = [record for ok, result in results if ok for record in result]
+        if records:
+            save_records(records, actor)
+    return results
+
+def record_payment(student_name, class_category, class_section, fee_type, amount,
+                   received_amount, payment_method, payment_date, signature, months=None, actor=None):
+    """Validate and save one payment
+
+    Returns (True, records) with the saved rows, or (False, message).
+    """
+    return record_payments([{
+        "student_name": student_name,
+        "class_category": class_category,
+        "class_section": class_section,
+        "fee_type": fee_type,
+        "amount": amount,
+        "received_amount": received_amount,
+        "payment_method": payment_method,
+        "payment_date": payment_date,
+        "signature": signature,
+        "months": months
+    }], actor)[0]
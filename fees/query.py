@@ -0,0 +1,220 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from fees import config, ledger
+
+# Filtered reads of the fee ledger. Callers ask for the rows or totals they
+# need by student ID, academic year, month, class, payment method and date
+# range, and only the matching rows of the requested columns are read from
+# the shared memory-mapped ledger table:
+#
+# - Equality filters probe a position index (value -> row positions) for
+#   their column, built once per ledger version on first use and extended
+#   in place when this process appends to the ledger. Several filters
+#   intersect their positions, smallest first.
+# - Date ranges compare a parsed copy of the Date column, cached the same
+#   way, at the candidate positions only.
+# - Only the requested columns of the matching rows are copied out of the
+#   table; totals are summed in Arrow without building a DataFrame of rows.
+#
+# Each filter takes one value or a list of values.
+
+FILTER_COLUMNS = {
+    "student_id": "ID",
+    "academic_year": "Academic Year",
+    "month": "Month",
+    "class_category": "Class Category",
+    "payment_method": "Payment Method",
+}
+DATE_FORMAT = "%d-%m-%Y"
+# Up to this many matches are copied out row by row; more are selected with
+# a boolean mask. Both beat take() on the memory-mapped table, which copies
+# whole columns.
+MAX_SLICED_ROWS = 256
+
+_query_lock = threading.Lock()
+_query_indexes = OrderedDict()
+
+def build_position_index(column):
+    """Map each value of a ledger column to the sorted positions of its rows"""
+    codes, values = pd.factorize(column.to_pandas())
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(values)))
+    ends = np.searchsorted(sorted_codes, np.arange(len(values)), side='right')
+    return {
+        value: order[start:end]
+        for value, start, end in zip(values.tolist(), starts.tolist(), ends.tolist())
+    }
+
+def parse_dates(column):
+    """Parse a ledger Date column to datetime64 days, with NaT for blanks and bad dates"""
+    parsed = pc.strptime(column, format=DATE_FORMAT, unit="s", error_is_null=True)
+    return parsed.to_numpy().astype('datetime64[D]')
+
+def get_query_index(table):
+    """Get the current school's query index entry for a ledger table"""
+    csv_file = config.data_path(config.CSV_FILE)
+    version = ledger.get_ledger_version()
+    with _query_lock:
+        cached = _query_indexes.get(csv_file)
+        if not cached or cached["version"] != version or cached["rows"] != table.num_rows:
+            cached = _query_indexes[csv_file] = {"version": version, "rows": table.num_rows, "columns": {}, "dates": None}
+        _query_indexes.move_to_end(csv_file)
+        while len(_query_indexes) > config.MAX_CACHED_TENANTS:
+            _query_indexes.popitem(last=False)
+    return cached
+
+def get_column_index(index, table, column):
+    """Get the position index of one column, building it on first use"""
+    positions = index["columns"].get(column)
+    if positions is None:
+        positions = build_position_index(table.column(column))
+        with _query_lock:
+            index["columns"].setdefault(column, positions)
+            positions = index["columns"][column]
+    return positions
+
+def get_dates(index, table):
+    """Get the parsed Date column, parsing it on first use"""
+    if index["dates"] is None:
+        dates = parse_dates(table.column("Date"))
+        with _query_lock:
+            if index["dates"] is None:
+                index["dates"] = dates
+    return index["dates"]
+
+def add_to_index(records, before_version, after_version):
+    """Index records just appended to the ledger, if the index matches the ledger before the write"""
+    csv_file = config.data_path(config.CSV_FILE)
+    with _query_lock:
+        cached = _query_indexes.get(csv_file)
+        if not cached or cached["version"] != before_version:
+            return
+        new_positions = np.arange(cached["rows"], cached["rows"] + len(records))
+        for column, positions in cached["columns"].items():
+            for position, record in zip(new_positions, records):
+                value = str(record.get(column, ""))
+                rows = positions.get(value)
+                positions[value] = np.append(rows, position) if rows is not None else np.array([position])
+        if cached["dates"] is not None:
+            # Saved records carry ISO dates; the table holds them as DATE_FORMAT
+            new_dates = pd.to_datetime(pd.Series([record.get("Date") for record in records]), errors='coerce')
+            cached["dates"] = np.concatenate([cached["dates"], new_dates.to_numpy('datetime64[D]')])
+        cached["rows"] += len(records)
+        cached["version"] = after_version
+
+def to_list(value):
+    """Treat a single filter value as a list of one"""
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+def to_day(value):
+    """Convert a date, datetime or YYYY-MM-DD string to a datetime64 day"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        value = value.isoformat()
+    return np.datetime64(value, 'D')
+
+def intersect_positions(smaller, larger):
+    """Positions in both sorted arrays, looking each of the smaller ones up in the larger"""
+    if not len(larger):
+        return larger
+    found = np.searchsorted(larger, smaller).clip(max=len(larger) - 1)
+    return smaller[larger[found] == smaller]
+
+def find_positions(table, filters, date_from=None, date_to=None):
+    """Find the row positions matching the filters, or None when every row matches"""
+    index = get_query_index(table)
+    candidates = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        positions = get_column_index(index, table, FILTER_COLUMNS[name])
+        matches = [positions[v] for v in to_list(value) if v in positions]
+        if len(matches) == 1:
+            candidates.append(matches[0])
+        else:
+            candidates.append(np.sort(np.concatenate(matches)) if matches else np.array([], dtype=np.int64))
+
+    result = None
+    for positions in sorted(candidates, key=len):
+        result = positions if result is None else intersect_positions(result, positions)
+        if not len(result):
+            return result
+
+    if date_from is not None or date_to is not None:
+        dates = get_dates(index, table)
+        selected = dates if result is None else dates[result]
+        keep = ~np.isnat(selected)
+        if date_from is not None:
+            keep &= selected >= to_day(date_from)
+        if date_to is not None:
+            keep &= selected <= to_day(date_to)
+        result = np.flatnonzero(keep) if result is None else result[keep]
+    return result
+
+def select_rows(table, positions, columns=None):
+    """Copy the given rows and columns out of the ledger table"""
+    if columns:
+        table = table.select(columns)
+    if positions is None:
+        return table
+    if len(positions) <= MAX_SLICED_ROWS:
+        slices = [table.slice(position, 1) for position in positions.tolist()]
+        return pa.concat_tables(slices) if slices else table.slice(0, 0)
+    mask = np.zeros(table.num_rows, dtype=bool)
+    mask[positions] = True
+    return table.filter(pa.array(mask))
+
+def find_records(columns=None, date_from=None, date_to=None, **filters):
+    """Get the ledger rows matching the filters as a DataFrame
+
+    Filters are student_id, academic_year, month, class_category and
+    payment_method; date_from and date_to bound the payment date, inclusive.
+    columns limits the columns returned.
+    """
+    unknown = set(filters) - set(FILTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown ledger filters: {', '.join(sorted(unknown))}")
+    table = ledger.get_ledger_table()
+    if table is None:
+        return pd.DataFrame(columns=columns)
+    positions = find_positions(table, filters, date_from, date_to)
+    return select_rows(table, positions, columns).to_pandas()
+
+def aggregate_records(group_by=None, value_columns=None, date_from=None, date_to=None, **filters):
+    """Sum amount columns over the ledger rows matching the filters
+
+    With group_by, returns a DataFrame with one row per group, its sums and a
+    Rows count; without, a dict of the sums and Rows.
+    """
+    unknown = set(filters) - set(FILTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown ledger filters: {', '.join(sorted(unknown))}")
+    group_by = to_list(group_by) if group_by else []
+    value_columns = list(value_columns or config.AMOUNT_COLUMNS)
+    table = ledger.get_ledger_table()
+    if table is None:
+        if group_by:
+            return pd.DataFrame(columns=group_by + value_columns + ["Rows"])
+        return {**{col: 0 for col in value_columns}, "Rows": 0}
+
+    positions = find_positions(table, filters, date_from, date_to)
+    rows = select_rows(table, positions, group_by + value_columns)
+    if not group_by:
+        sums = {col: int(pc.sum(rows.column(col)).as_py() or 0) for col in value_columns}
+        return {**sums, "Rows": rows.num_rows}
+
+    totals = rows.group_by(group_by).aggregate(
+        [(col, "sum") for col in value_columns] + [(group_by[0], "count")]
+    ).to_pandas()
+    totals = totals.rename(columns={f"{col}_sum": col for col in value_columns})
+    totals = totals.rename(columns={f"{group_by[0]}_count": "Rows"})
+    return totals[group_by + value_columns + ["Rows"]].sort_values(group_by, ignore_index=True)
@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from fees import config, storage, ledger
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process file locks on this platform; blocks are still
+    # allocated safely between threads of one process
+    fcntl = None
+
+# Receipt numbers. Each academic year has its own sequence, e.g. 2025-26/000123,
+# stamped on every row saved by one payment. The next free number of each
+# sequence is kept in receipt_counters.json, and each process reserves
+# RECEIPT_BLOCK_SIZE numbers at a time under a file lock, so saves only take
+# the file lock once per block. Numbers are unique across processes and
+# increase within a process; a process that exits leaves the rest of its
+# block unused.
+#
+# The receipt index maps each receipt number to its rows in the shared
+# ledger table, so the counter can look a receipt up with one dict lookup.
+# It is built from the table once per ledger version and extended in place
+# when this process appends to the ledger.
+
+RECEIPT_BLOCK_SIZE = 50
+
+_receipts_lock = threading.Lock()
+_blocks = {}
+_receipt_indexes = OrderedDict()
+
+def format_receipt_number(academic_year, number):
+    """Format a sequence number as a receipt number, e.g. 2025-26/000123"""
+    start_year, end_year = academic_year.split("-")
+    return f"{start_year}-{end_year[-2:]}/{number:06d}"
+
+def reserve_block(academic_year, size):
+    """Reserve the next numbers of an academic year's sequence in the counters file
+
+    Returns the first number of the block.
+    """
+    counters_file = config.data_path(config.RECEIPT_COUNTERS_FILE)
+    with open(f"{counters_file}.lock", 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            counters = storage.read_json(counters_file)
+            start = counters.get(academic_year, 1)
+            counters[academic_year] = start + size
+            storage.write_json(counters_file, counters)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return start
+
+def allocate_receipt_numbers(academic_year, count=1):
+    """Allocate receipt numbers for an academic year from this process's reserved block"""
+    numbers = []
+    key = (config.data_path(config.RECEIPT_COUNTERS_FILE), academic_year)
+    with _receipts_lock:
+        while len(numbers) < count:
+            block = _blocks.get(key)
+            if block is None or block["next"] >= block["end"]:
+                size = max(RECEIPT_BLOCK_SIZE, count - len(numbers))
+                start = reserve_block(academic_year, size)
+                block = _blocks[key] = {"next": start, "end": start + size}
+            taken = min(count - len(numbers), block["end"] - block["next"])
+            numbers.extend(range(block["next"], block["next"] + taken))
+            block["next"] += taken
+    return [format_receipt_number(academic_year, number) for number in numbers]
+
+def stamp_receipts(records):
+    """Give each payment in a batch of records one receipt number
+
+    Rows of the same student and academic year belong to the same payment.
+    Records that already carry a receipt number keep it.
+    """
+    payments = OrderedDict()
+    for record in records:
+        if not record.get("Receipt No"):
+            payments.setdefault((record["ID"], record["Academic Year"]), []).append(record)
+
+    by_year = OrderedDict()
+    for (_, academic_year), rows in payments.items():
+        by_year.setdefault(academic_year, []).append(rows)
+    for academic_year, payment_rows in by_year.items():
+        for receipt_number, rows in zip(allocate_receipt_numbers(academic_year, len(payment_rows)), payment_rows):
+            for record in rows:
+                record["Receipt No"] = receipt_number
+    return records
+
+def build_receipt_index(table):
+    """Map each receipt number in a ledger table to its row positions"""
+    if table is None or "Receipt No" not in table.column_names:
+        return {}
+    codes, receipt_numbers = pd.factorize(table.column("Receipt No").to_pandas())
+    # Group row positions by receipt with one sort instead of a groupby
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(receipt_numbers)))
+    ends = np.searchsorted(sorted_codes, np.arange(len(receipt_numbers)), side='right')
+    index = {
+        receipt_number: order[start:end]
+        for receipt_number, start, end in zip(receipt_numbers.tolist(), starts.tolist(), ends.tolist())
+    }
+    # Rows saved before receipt numbers existed have none and are not indexed
+    index.pop("", None)
+    return index
+
+def get_receipt_index():
+    """Get the current school's receipt index and the ledger table it points into"""
+    table = ledger.get_ledger_table()
+    csv_file = config.data_path(config.CSV_FILE)
+    version = ledger.get_ledger_version() if table is not None else None
+    with _receipts_lock:
+        cached = _receipt_indexes.get(csv_file)
+        if cached and cached["version"] == version and cached["rows"] == (table.num_rows if table is not None else 0):
+            _receipt_indexes.move_to_end(csv_file)
+            return cached, table
+
+    index = {"version": version, "rows": table.num_rows if table is not None else 0,
+             "receipts": build_receipt_index(table)}
+    with _receipts_lock:
+        _receipt_indexes[csv_file] = index
+        _receipt_indexes.move_to_end(csv_file)
+        while len(_receipt_indexes) > config.MAX_CACHED_TENANTS:
+            _receipt_indexes.popitem(last=False)
+    return index, table
+
+def add_to_index(records, before_version, after_version):
+    """Index records just appended to the ledger, if the index matches the ledger before the write"""
+    csv_file = config.data_path(config.CSV_FILE)
+    with _receipts_lock:
+        cached = _receipt_indexes.get(csv_file)
+        if not cached or cached["version"] != before_version:
+            return
+        receipts = cached["receipts"]
+        for position, record in enumerate(records, start=cached["rows"]):
+            if record.get("Receipt No"):
+                rows = receipts.get(record["Receipt No"])
+                receipts[record["Receipt No"]] = np.append(rows, position) if rows is not None else np.array([position])
+        cached["rows"] += len(records)
+        cached["version"] = after_version
+
+def find_receipt(receipt_number):
+    """Get the ledger rows of a receipt, or an empty DataFrame if there is no such receipt"""
+    index, table = get_receipt_index()
+    positions = index["receipts"].get(receipt_number.strip())
+    if positions is None or table is None:
+        return pd.DataFrame()
+    # A receipt is a row or two, so slicing beats a take() over the whole table
+    rows = [row for position in positions.tolist() for row in table.slice(position, 1).to_pylist()]
+    return pd.DataFrame(rows, columns=table.column_names)
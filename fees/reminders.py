@@ -0,0 +1,216 @@
+import os
+import json
+import argparse
+from datetime import datetime
+from string import Template
+import pandas as pd
+from fees import config, query, schedules, students, balances
+
+# Defaulter lists and fee reminders. For an academic year and a month, every
+# enrolled student is checked in one pass for unpaid months up to that
+# month, unpaid annual charges and admission fee, and partly paid fees.
+# Enrolled students are those with a record in that year or the year
+# before, or with fees set on the Set Student Fees page, so a student who
+# has paid nothing yet this year is still listed. Reminders are rendered
+# from templates and written to a local outbox directory, one folder per
+# batch, for a messaging gateway or printer to pick up:
+#
+#   outbox/<batch>/defaulters.csv   the defaulter list
+#   outbox/<batch>/letters/<ID>.txt one letter per student
+#   outbox/<batch>/sms.jsonl        one SMS message per line
+#
+# Templates can be overridden by reminder_templates/letter.txt and sms.txt
+# in the data directory; they use $placeholders (see TEMPLATE_FIELDS).
+#
+#   python -m fees.reminders --academic-year 2025-2026 --month OCTOBER
+
+OUTBOX_DIR = "outbox"
+TEMPLATES_DIR = "reminder_templates"
+
+TEMPLATE_FIELDS = [
+    "student_name", "student_id", "class_category", "class_section", "academic_year",
+    "month", "unpaid_months", "months_due", "monthly_due", "annual_due",
+    "admission_due", "shortfall", "total_due"
+]
+
+DEFAULT_TEMPLATES = {
+    "letter": (
+        "Dear Parent/Guardian of $student_name ($class_category),\n\n"
+        "Our records for the $academic_year academic year show the following fees outstanding as of $month:\n\n"
+        "  Unpaid months:        $unpaid_months\n"
+        "  Monthly fees due:     $monthly_due\n"
+        "  Annual charges due:   $annual_due\n"
+        "  Admission fee due:    $admission_due\n"
+        "  Partly paid balance:  $shortfall\n\n"
+        "  Total due:            $total_due\n\n"
+        "Please clear the outstanding amount at the school office at your earliest convenience.\n"
+        "If you have already paid, please ignore this letter.\n\n"
+        "Student ID: $student_id\n"
+    ),
+    "sms": "Fee reminder: $student_name ($class_category) has $total_due outstanding for $academic_year ($unpaid_months). Please pay at the school office."
+}
+
+def get_due_months(month):
+    """Months of the academic year from April up to and including a month"""
+    return config.MONTHS[:config.MONTHS.index(month) + 1]
+
+def get_enrolled_students(df):
+    """Name, class and section of every enrolled student, indexed by ID
+
+    df holds the records of the year and the year before. Students with
+    fees set but no record in those years are named from the running
+    balances; ones with no record at all have no name to remind and are
+    skipped.
+    """
+    info = df.groupby("ID")[["Student Name", "Class Category", "Class Section"]].last()
+    known = balances.load_balances()
+    scheduled = [
+        {"ID": student_id, "Student Name": known[student_id]["student_name"],
+         "Class Category": known[student_id]["class_category"], "Class Section": ""}
+        for student_id in schedules.load_student_fees()
+        if student_id not in info.index and student_id in known
+    ]
+    if scheduled:
+        info = pd.concat([info, pd.DataFrame(scheduled).set_index("ID")])
+    return info
+
+def find_defaulters(academic_year, month, df=None):
+    """List every enrolled student with fees outstanding for an academic year as of a month
+
+    df, if given, is the whole ledger; otherwise the records are queried.
+    Returns one row per student who owes anything, largest total first.
+    """
+    years = [students.get_previous_academic_year(academic_year), academic_year]
+    if df is None:
+        df = query.find_records(academic_year=years)
+    else:
+        df = df[df["Academic Year"].isin(years)]
+    if "ID" not in df.columns:
+        # No ledger yet
+        return pd.DataFrame()
+
+    amounts = df[config.AMOUNT_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+    df = df.assign(**{col: amounts[col] for col in config.AMOUNT_COLUMNS})
+    info = get_enrolled_students(df)
+    if info.empty:
+        return pd.DataFrame()
+    # Only this year's records count as payments
+    df = df[df["Academic Year"] == academic_year]
+
+    # One row per student and one column per month, True where the month is paid
+    due_months = get_due_months(month)
+    paid = (
+        df[df["Monthly Fee"] > 0].assign(paid=True)
+        .pivot_table(index="ID", columns="Month", values="paid", aggfunc="any")
+        .reindex(index=info.index, columns=due_months)
+        .fillna(False)
+        .astype(bool)
+    )
+    unpaid = ~paid
+    months_due = unpaid.sum(axis=1)
+    unpaid_names = unpaid.dot(pd.Index(due_months) + ", ").str[:-2]
+
+    fees_data = schedules.load_student_fees()
+    schedule = pd.DataFrame(
+        [schedules.get_fee_schedule(student_id, fees_data)[0] for student_id in info.index],
+        index=info.index
+    )
+
+    totals = df.groupby("ID")[config.AMOUNT_COLUMNS].sum().reindex(info.index, fill_value=0)
+    annual_due = schedule["annual_charges"].where(totals["Annual Charges"] == 0, 0)
+    admission_due = schedule["admission_fee"].where(totals["Admission Fee"] == 0, 0)
+    shortfall = (totals[config.FEE_COLUMNS].sum(axis=1) - totals["Received Amount"]).clip(lower=0)
+
+    result = info.assign(**{
+        "Unpaid Months": unpaid_names,
+        "Months Due": months_due,
+        "Monthly Due": months_due * schedule["monthly_fee"],
+        "Annual Charges Due": annual_due,
+        "Admission Fee Due": admission_due,
+        "Partly Paid Balance": shortfall
+    })
+    result["Total Due"] = result[["Monthly Due", "Annual Charges Due", "Admission Fee Due", "Partly Paid Balance"]].sum(axis=1)
+    result = result[result["Total Due"] > 0].astype({
+        col: "int64" for col in ["Months Due", "Monthly Due", "Annual Charges Due", "Admission Fee Due", "Partly Paid Balance", "Total Due"]
+    })
+    return result.sort_values("Total Due", ascending=False).reset_index()
+
+def load_templates():
+    """Get the letter and SMS templates, preferring ones saved in the data directory"""
+    templates = {}
+    for channel, default in DEFAULT_TEMPLATES.items():
+        path = os.path.join(config.data_path(TEMPLATES_DIR), f"{channel}.txt")
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                default = f.read()
+        templates[channel] = Template(default)
+    return templates
+
+def format_amount(value):
+    """Format an amount the way the app displays currency"""
+    return f"Rs. {int(value):,}"
+
+def get_template_values(row, academic_year, month):
+    """Build the template placeholders for one defaulter"""
+    return {
+        "student_name": row["Student Name"],
+        "student_id": row["ID"],
+        "class_category": row["Class Category"],
+        "class_section": row["Class Section"] if isinstance(row["Class Section"], str) else "",
+        "academic_year": academic_year,
+        "month": month,
+        "unpaid_months": row["Unpaid Months"] or "none",
+        "months_due": row["Months Due"],
+        "monthly_due": format_amount(row["Monthly Due"]),
+        "annual_due": format_amount(row["Annual Charges Due"]),
+        "admission_due": format_amount(row["Admission Fee Due"]),
+        "shortfall": format_amount(row["Partly Paid Balance"]),
+        "total_due": format_amount(row["Total Due"])
+    }
+
+def write_outbox(defaulters, academic_year, month, channels=("letter", "sms")):
+    """Render reminders for every defaulter and write them to a new outbox batch
+
+    Returns the batch directory.
+    """
+    templates = load_templates()
+    batch = f"{academic_year}_{month}_{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+    batch_dir = os.path.join(config.data_path(OUTBOX_DIR), batch)
+    os.makedirs(batch_dir)
+    defaulters.to_csv(os.path.join(batch_dir, "defaulters.csv"), index=False)
+
+    rows = [get_template_values(row, academic_year, month) for row in defaulters.to_dict('records')]
+    if "letter" in channels:
+        letters_dir = os.path.join(batch_dir, "letters")
+        os.makedirs(letters_dir)
+        for values in rows:
+            with open(os.path.join(letters_dir, f"{values['student_id']}.txt"), 'w') as f:
+                f.write(templates["letter"].safe_substitute(values))
+    if "sms" in channels:
+        # Recipients are student IDs; the gateway maps them to phone numbers
+        with open(os.path.join(batch_dir, "sms.jsonl"), 'w') as f:
+            f.writelines(
+                json.dumps({"to": values["student_id"], "body": templates["sms"].safe_substitute(values)}) + "\n"
+                for values in rows
+            )
+    return batch_dir
+
+def main():
+    """Write a defaulter list and reminders for a month from the command line"""
+    today = datetime.now()
+    parser = argparse.ArgumentParser(description="Generate the defaulter list and fee reminders")
+    parser.add_argument("--academic-year", default=students.get_academic_year(today))
+    parser.add_argument("--month", default=config.MONTHS[(today.month - 4) % 12], choices=config.MONTHS)
+    parser.add_argument("--school", help="School ID on a deployment serving several schools")
+    args = parser.parse_args()
+
+    with config.use_tenant(args.school):
+        defaulters = find_defaulters(args.academic_year, args.month)
+        if defaulters.empty:
+            print("No outstanding fees.")
+            return
+        batch_dir = write_outbox(defaulters, args.academic_year, args.month)
+    print(f"{len(defaulters)} defaulters, {defaulters['Total Due'].sum():,} due; reminders written to {batch_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from fees import config
+from fees.ledger import to_typed_ledger
+
+# Report computations over the fee ledger, fanned out to worker processes.
+# The ledger is split into partitions that are written once as uncompressed
+# Arrow files; workers memory-map them, so only file paths and the small
+# partial aggregates cross process boundaries.
+#
+# Writing the partitions and starting workers cost more than they save on
+# small ledgers and on machines with few CPUs: for 2M rows on 1 CPU, 4 workers
+# took 3.6s end to end against 0.21s in one process (benchmarks/
+# bench_reports.py). Below PARALLEL_MIN_ROWS rows or PARALLEL_MIN_CPUS CPUs,
+# reports run in the calling process.
+
+PARALLEL_MIN_ROWS = 200000
+PARALLEL_MIN_CPUS = 4
+
+def get_report_executor(max_workers=None):
+    """Create a process pool for report workers using the spawn start method"""
+    # Forking a threaded Streamlit server is unsafe, so always spawn
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+def write_partitions(df, out_dir, partition_by=None, num_partitions=None):
+    """Write the ledger as one memory-mappable Arrow file per partition"""
+    os.makedirs(out_dir, exist_ok=True)
+    ledger = to_typed_ledger(df)
+
+    if partition_by:
+        parts = [group for _, group in ledger.groupby(partition_by, sort=False, dropna=False)]
+    else:
+        num_partitions = num_partitions or os.cpu_count()
+        parts = [ledger.iloc[idx] for idx in np.array_split(np.arange(len(ledger)), num_partitions) if len(idx)]
+
+    paths = []
+    for i, part in enumerate(parts):
+        path = os.path.join(out_dir, f"part-{i:04d}.arrow")
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        feather.write_feather(table, path, compression="uncompressed")
+        paths.append(path)
+    return paths
+
+def aggregate_frame(part, group_by, value_columns):
+    """Sum value columns and count records per group for one partition"""
+    grouped = part.groupby(group_by, sort=False, dropna=False)
+    partial = grouped[value_columns].sum()
+    partial["Records"] = grouped.size()
+    return partial
+
+def aggregate_partition(path, group_by, value_columns):
+    """Aggregate a single memory-mapped partition file"""
+    table = feather.read_table(path, columns=group_by + value_columns, memory_map=True)
+    return aggregate_frame(table.to_pandas(), group_by, value_columns)
+
+def merge_partials(partials, group_by, value_columns):
+    """Combine partial aggregates from all partitions into the final report"""
+    if not partials:
+        return pd.DataFrame(columns=group_by + value_columns + ["Records"])
+    merged = pd.concat(partials)
+    return merged.groupby(level=list(range(len(group_by))), dropna=False).sum().reset_index()
+
+def parallel_aggregate(paths, group_by, value_columns, executor=None, report_progress=None):
+    """Aggregate partition files in worker processes and merge the results"""
+    own_executor = executor is None
+    if own_executor:
+        executor = get_report_executor(min(len(paths), os.cpu_count()) or 1)
+
+    try:
+        futures = [executor.submit(aggregate_partition, path, group_by, value_columns) for path in paths]
+        partials = []
+        for done, future in enumerate(as_completed(futures), start=1):
+            partials.append(future.result())
+            if report_progress:
+                report_progress(done / len(futures))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    return merge_partials(partials, group_by, value_columns)
+
+def use_workers(rows):
+    """Whether aggregating this many rows in worker processes pays off on this machine"""
+    return rows >= PARALLEL_MIN_ROWS and (os.cpu_count() or 1) >= PARALLEL_MIN_CPUS
+
+def aggregate_ledger(df, group_by, value_columns, partition_by=None, executor=None, report_progress=None):
+    """Aggregate the ledger, using worker processes only when it is large enough to pay off"""
+    columns = group_by + value_columns + ([partition_by] if partition_by and partition_by not in group_by else [])
+    ledger = df[columns]
+
+    if not use_workers(len(ledger)):
+        partial = aggregate_frame(to_typed_ledger(ledger), group_by, value_columns)
+        if report_progress:
+            report_progress(1.0)
+        return merge_partials([partial], group_by, value_columns)
+
+    with tempfile.TemporaryDirectory(prefix="fees-report-") as partition_dir:
+        paths = write_partitions(ledger, partition_dir, partition_by=partition_by)
+        return parallel_aggregate(paths, group_by, value_columns, executor, report_progress)
+
+def class_totals_report(df, **kwargs):
+    """Fee totals per academic year and class category"""
+    return aggregate_ledger(df, ["Academic Year", "Class Category"], config.AMOUNT_COLUMNS, **kwargs)
+
+def monthly_collections_report(df, **kwargs):
+    """Collections per academic year and month"""
+    return aggregate_ledger(df, ["Academic Year", "Month"], config.AMOUNT_COLUMNS, **kwargs)
+
+def paid_matrix_report(df, academic_year, **kwargs):
+    """Student by month matrix of monthly fees paid in one academic year"""
+    year_df = df[df["Academic Year"] == academic_year]
+    totals = aggregate_ledger(year_df, ["ID", "Student Name", "Month"], ["Monthly Fee"], **kwargs)
+    matrix = totals.pivot_table(
+        index=["ID", "Student Name"], columns="Month", values="Monthly Fee", aggfunc="sum", fill_value=0
+    )
+    return (matrix > 0).reset_index()
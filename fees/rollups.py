@@ -0,0 +1,99 @@
+import os
+import pandas as pd
+from fees import config, storage, ledger
+
+# Collection rollups keyed by date x class category x payment method x fee
+# type, maintained incrementally as records are saved so the dashboard never
+# scans the ledger. Stored as a keyed JSON store (storage.load_keyed_json),
+# so a save appends the few rollups it changed instead of rewriting them all.
+
+ROLLUP_DIMENSIONS = ["Date", "Class Category", "Payment Method", "Fee Type"]
+
+def initialize_rollups():
+    """Build the collection rollups from existing fee records if they don't exist"""
+    if not os.path.exists(config.data_path(config.ROLLUPS_FILE)):
+        with ledger.get_write_lock():
+            if not os.path.exists(config.data_path(config.ROLLUPS_FILE)):
+                save_rollups(rebuild_rollups(ledger.load_ledger()))
+
+def get_fee_type(month):
+    """Derive the fee type of a ledger row from its Month value"""
+    if month == "ANNUAL":
+        return "Annual Charges"
+    if month == "ADMISSION":
+        return "Admission Fee"
+    return "Monthly Fee"
+
+def normalize_dates(dates):
+    """Parse ledger dates stored either as YYYY-MM-DD or DD-MM-YYYY into YYYY-MM-DD strings"""
+    parsed = pd.to_datetime(dates, format="%Y-%m-%d", errors='coerce')
+    parsed = parsed.fillna(pd.to_datetime(dates, format="%d-%m-%Y", errors='coerce'))
+    return parsed.dt.strftime("%Y-%m-%d")
+
+def get_rollup_key(date, class_category, payment_method, fee_type):
+    """Build the rollup key for one date, class, payment method and fee type"""
+    return "|".join([str(date), str(class_category), str(payment_method), fee_type])
+
+def load_rollups():
+    """Load the collection rollups"""
+    return storage.load_keyed_json(config.data_path(config.ROLLUPS_FILE))
+
+def save_rollups(rollups):
+    """Replace all the collection rollups; call with the ledger write lock held"""
+    storage.write_keyed_json(config.data_path(config.ROLLUPS_FILE), rollups)
+
+def rebuild_rollups(df):
+    """Recompute the collection rollups from the full ledger"""
+    if df.empty:
+        return {}
+    
+    collections = pd.DataFrame({
+        "Date": normalize_dates(df["Date"]),
+        "Class Category": df["Class Category"],
+        "Payment Method": df["Payment Method"],
+        "Fee Type": df["Month"].map(get_fee_type),
+        "Amount": pd.to_numeric(df["Received Amount"], errors='coerce').fillna(0)
+    })
+    totals = collections.groupby(ROLLUP_DIMENSIONS, sort=False).agg(
+        amount=("Amount", "sum"),
+        records=("Amount", "size")
+    )
+    
+    return {
+        get_rollup_key(*dimensions): {"amount": int(row.amount), "records": int(row.records)}
+        for dimensions, row in totals.iterrows()
+    }
+
+def apply_rollup_records(rollups, records):
+    """Add newly saved fee records to the collection rollups
+
+    Returns the updated rollups of the keys in the records, without changing
+    the ones passed in, which may be shared with other readers.
+    """
+    changes = {}
+    for record in records:
+        key = get_rollup_key(
+            record["Date"], record["Class Category"], record["Payment Method"], get_fee_type(record["Month"])
+        )
+        entry = dict(changes.get(key) or rollups.get(key, {"amount": 0, "records": 0}))
+        changes[key] = entry
+        entry["amount"] += int(record.get("Received Amount") or 0)
+        entry["records"] += 1
+    return changes
+
+def update_rollups(records):
+    """Incrementally apply newly saved fee records to the collection rollups"""
+    storage.update_keyed_json(config.data_path(config.ROLLUPS_FILE), apply_rollup_records(load_rollups(), records))
+
+def get_rollups_frame(rollups=None):
+    """Get the collection rollups as a DataFrame with one row per rollup key"""
+    if rollups is None:
+        rollups = load_rollups()
+    
+    rows = [
+        key.split("|") + [entry["amount"], entry["records"]]
+        for key, entry in rollups.items()
+    ]
+    rollup_df = pd.DataFrame(rows, columns=ROLLUP_DIMENSIONS + ["Amount", "Records"])
+    rollup_df["Date"] = pd.to_datetime(rollup_df["Date"], errors='coerce')
+    return rollup_df
@@ -0,0 +1,27 @@
+from fees import config, storage
+
+# Per-student fee schedules, stored in student_fees.json keyed by student ID
+
+def initialize_student_fees():
+    """Initialize the student fees JSON file if it doesn't exist"""
+    storage.initialize_json(config.data_path(config.STUDENT_FEES_FILE))
+
+def load_student_fees():
+    """Load student-specific fees"""
+    return storage.read_json_shared(config.data_path(config.STUDENT_FEES_FILE))
+
+def save_student_fees(fees_data):
+    """Save student-specific fees"""
+    storage.write_json(config.data_path(config.STUDENT_FEES_FILE), fees_data)
+
+def get_fee_schedule(student_id, fees_data=None):
+    """Get a student's fees, falling back to the default amounts
+
+    Returns (schedule, is_predefined) where is_predefined tells whether the
+    student has fees set by an admin.
+    """
+    if fees_data is None:
+        fees_data = load_student_fees()
+    predefined_fees = fees_data.get(student_id, {})
+    schedule = {key: predefined_fees.get(key, default) for key, default in config.DEFAULT_FEES.items()}
+    return schedule, bool(predefined_fees)
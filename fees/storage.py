@@ -0,0 +1,147 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from fees import config
+
+# JSON file helpers shared by the fee service modules
+
+# Parsed JSON files keyed by path, with the file state they were read from,
+# least recently used first out
+_shared_lock = threading.Lock()
+_shared_files = OrderedDict()
+MAX_SHARED_FILES_PER_TENANT = 4
+
+def read_json(path, default=None):
+    """Load a JSON file, returning default if it doesn't exist"""
+    if not os.path.exists(path):
+        return {} if default is None else default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def get_file_version(path):
+    """Identify the current state of a file by modification time and size"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def read_json_shared(path, default=None):
+    """Load a JSON file once per change and share the parsed data
+
+    The returned data is shared by every caller in the process and must be
+    treated as read-only; copy it before making changes.
+    """
+    if not os.path.exists(path):
+        return {} if default is None else default
+    
+    with _shared_lock:
+        version = get_file_version(path)
+        cached = _shared_files.get(path)
+        if cached and cached["version"] == version:
+            _shared_files.move_to_end(path)
+            return cached["data"]
+    
+    data = read_json(path, default)
+    with _shared_lock:
+        _shared_files[path] = {"version": version, "data": data}
+        _shared_files.move_to_end(path)
+        while len(_shared_files) > config.MAX_CACHED_TENANTS * MAX_SHARED_FILES_PER_TENANT:
+            _shared_files.popitem(last=False)
+    return data
+
+def write_json(path, data, indent=4):
+    """Write a JSON file atomically so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+    
+    # Keep shared readers from parsing back what was just written
+    with _shared_lock:
+        if path in _shared_files:
+            _shared_files[path] = {"version": get_file_version(path), "data": data}
+
+def initialize_json(path):
+    """Create an empty JSON object file if it doesn't exist"""
+    if not os.path.exists(path):
+        write_json(path, {})
+
+# Keyed JSON stores (e.g. per-student balances): a compact JSON object in the
+# file itself plus <file>.deltas, one JSON line per save holding the new
+# value of every key the save changed. A save appends one short line instead
+# of rewriting every key; once the deltas pass MAX_DELTA_BYTES they are
+# folded back into the file. Lines hold whole values, not increments, so a
+# reader that applies a line twice still ends up with the right data, and
+# other processes' saves are picked up by reading only the new lines.
+MAX_DELTA_BYTES = 1024 * 1024
+_keyed_lock = threading.Lock()
+_keyed_files = OrderedDict()
+
+def get_deltas_path(path):
+    """Get the path of a keyed store's delta file"""
+    return f"{path}.deltas"
+
+def load_keyed_json(path):
+    """Load a keyed JSON store, reading only the deltas appended since the last call
+
+    The returned data is shared like read_json_shared() and must be treated
+    as read-only.
+    """
+    with _keyed_lock:
+        cached = _keyed_files.get(path)
+        if cached:
+            _keyed_files.move_to_end(path)
+    
+    # The delta file is opened before the file is read, so if the store is
+    # compacted in between, the lines read are ones already folded into it
+    try:
+        deltas = open(get_deltas_path(path), 'rb')
+    except FileNotFoundError:
+        deltas = None
+    try:
+        inode = os.fstat(deltas.fileno()).st_ino if deltas else None
+        version = get_file_version(path) if os.path.exists(path) else None
+        if cached and cached["version"] == version and cached["inode"] == inode:
+            data, offset, is_copy = cached["data"], cached["offset"], False
+        else:
+            data, offset, is_copy = read_json(path), 0, True
+        if deltas:
+            deltas.seek(offset)
+            # A line without its newline is still being written and is left for later
+            new_lines = deltas.read().rpartition(b"\n")[0]
+            if new_lines:
+                if not is_copy:
+                    data = dict(data)
+                for line in new_lines.split(b"\n"):
+                    if line.strip():
+                        data.update(json.loads(line))
+                offset += len(new_lines) + 1
+    finally:
+        if deltas:
+            deltas.close()
+    
+    with _keyed_lock:
+        _keyed_files[path] = {"version": version, "inode": inode, "offset": offset, "data": data}
+        _keyed_files.move_to_end(path)
+        while len(_keyed_files) > config.MAX_CACHED_TENANTS * MAX_SHARED_FILES_PER_TENANT:
+            _keyed_files.popitem(last=False)
+    return data
+
+def write_keyed_json(path, data):
+    """Replace a keyed JSON store with data, emptying its deltas; call with the writers' lock held"""
+    write_json(path, data, indent=None)
+    # A new, empty delta file rather than a truncated one, so readers see it has changed
+    deltas_path = get_deltas_path(path)
+    tmp_path = f"{deltas_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    open(tmp_path, 'wb').close()
+    os.replace(tmp_path, deltas_path)
+
+def update_keyed_json(path, changes):
+    """Save new values for some keys of a keyed JSON store; call with the writers' lock held"""
+    if not changes:
+        return
+    deltas_path = get_deltas_path(path)
+    with open(deltas_path, 'ab') as f:
+        f.write(json.dumps(changes, separators=(",", ":")).encode('utf-8') + b"\n")
+        size = f.tell()
+    if size > MAX_DELTA_BYTES:
+        write_keyed_json(path, load_keyed_json(path))
@@ -0,0 +1,51 @@
+import re
+from hashlib import md5
+from fees import config, query
+
+# Student identity, academic years and per-student payment status
+
+def generate_student_id(student_name, class_category):
+    """Generate a unique 8-character ID based on student name and class"""
+    unique_str = f"{student_name}_{class_category}".encode('utf-8')
+    return md5(unique_str).hexdigest()[:8].upper()
+
+def get_academic_year(date):
+    """Determine academic year based on date"""
+    year = date.year
+    if date.month >= 4:  # Academic year starts in April
+        return f"{year}-{year+1}"
+    return f"{year-1}-{year}"
+
+def get_previous_academic_year(academic_year):
+    """Get the academic year before one like 2025-2026"""
+    if not re.match(r"^\d{4}-\d{4}$", academic_year):
+        raise ValueError("Academic year must look like 2025-2026")
+    start = int(academic_year[:4])
+    return f"{start - 1}-{start}"
+
+def check_annual_admission_paid(student_id, academic_year):
+    """Check if annual charges or admission fee have been paid for the academic year"""
+    totals = query.aggregate_records(
+        value_columns=["Annual Charges", "Admission Fee"], student_id=student_id, academic_year=academic_year
+    )
+    return totals["Annual Charges"] > 0, totals["Admission Fee"] > 0
+
+def get_unpaid_months(student_id, academic_year):
+    """Get list of months a student has not paid for in an academic year"""
+    all_months = list(config.MONTHS)
+    
+    if student_id is None:
+        return all_months
+    
+    student_records = query.find_records(["Month", "Monthly Fee"], student_id=student_id, academic_year=academic_year)
+    if student_records.empty:
+        return all_months
+    
+    paid_months = student_records[student_records['Monthly Fee'] > 0]['Month'].unique().tolist()
+    
+    return [month for month in all_months if month not in paid_months]
+
+def remove_paid_months(unpaid_months, records):
+    """Drop the months paid by newly saved records from a list of unpaid months"""
+    paid_months = {record["Month"] for record in records if record.get("Monthly Fee", 0) > 0}
+    return [month for month in unpaid_months if month not in paid_months]
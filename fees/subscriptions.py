@@ -0,0 +1,124 @@
+import os
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from fees import config, users
+
+# Trial and subscription expiry. Each account stores its expiry as epoch
+# seconds in "trial_end_ts" (older accounts only have the "trial_end" text,
+# which is parsed once when the index is built). The index holds every
+# account's expiry in a dict for O(1) checks on each rerun, plus a min-heap
+# for listing the accounts that expire soonest. It is rebuilt only when
+# users.json changes, and kept per school.
+
+DAY_SECONDS = 24 * 60 * 60
+
+_expiry_lock = threading.Lock()
+_expiry_indexes = OrderedDict()
+
+def parse_trial_end(user):
+    """Get an account's expiry as epoch seconds, or None if it never expires"""
+    if user.get("trial_end_ts") is not None:
+        return int(user["trial_end_ts"])
+    if user.get("trial_end"):
+        return int(datetime.strptime(user["trial_end"], "%Y-%m-%d %H:%M:%S").timestamp())
+    return None
+
+def format_expiry(expiry):
+    """Format epoch seconds the way trial_end is stored"""
+    return datetime.fromtimestamp(expiry).strftime("%Y-%m-%d %H:%M:%S")
+
+def build_expiry_index(all_users):
+    """Build the expiry lookup and heap from the user accounts"""
+    expiry = {username: parse_trial_end(user) for username, user in all_users.items()}
+    heap = [(ts, username) for username, ts in expiry.items() if ts is not None]
+    heapq.heapify(heap)
+    return {"expiry": expiry, "heap": heap}
+
+def get_expiry_index():
+    """Get the current school's expiry index, rebuilding it if users.json has changed"""
+    user_file = config.data_path(config.USER_DB_FILE)
+    if not os.path.exists(user_file):
+        return {"expiry": {}, "heap": []}
+
+    stat = os.stat(user_file)
+    version = f"{stat.st_mtime_ns}:{stat.st_size}"
+    with _expiry_lock:
+        cached = _expiry_indexes.get(user_file)
+        if cached and cached["version"] == version:
+            _expiry_indexes.move_to_end(user_file)
+            return cached
+
+    index = build_expiry_index(users.load_users())
+    index["version"] = version
+    with _expiry_lock:
+        _expiry_indexes[user_file] = index
+        _expiry_indexes.move_to_end(user_file)
+        while len(_expiry_indexes) > config.MAX_CACHED_TENANTS:
+            _expiry_indexes.popitem(last=False)
+    return index
+
+def get_expiry(username):
+    """Get a user's expiry as epoch seconds, or None if it never expires"""
+    return get_expiry_index()["expiry"].get(username)
+
+def get_remaining_seconds(username, now=None):
+    """Seconds of trial left for a user, or None if the account never expires"""
+    expiry = get_expiry(username)
+    if expiry is None:
+        return None
+    return expiry - int(now if now is not None else time.time())
+
+def is_active(username, now=None):
+    """Tell whether a user's account exists and has not expired"""
+    index = get_expiry_index()
+    if username not in index["expiry"]:
+        return False
+    expiry = index["expiry"][username]
+    return expiry is None or expiry > (now if now is not None else time.time())
+
+def list_expiring(within_seconds, now=None):
+    """List (expiry, username) for accounts expiring within a time window, soonest first
+
+    Already expired accounts are included. Only the part of the heap below
+    the cutoff is visited, so the cost grows with the number of matches,
+    not the number of accounts.
+    """
+    heap = get_expiry_index()["heap"]
+    cutoff = (now if now is not None else time.time()) + within_seconds
+    matches = []
+    pending = [0] if heap else []
+    while pending:
+        i = pending.pop()
+        if heap[i][0] > cutoff:
+            # Children of a heap node are never earlier than the node
+            continue
+        matches.append(heap[i])
+        pending.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(heap))
+    return sorted(matches)
+
+def extend_trials(days, usernames=None):
+    """Extend the trials of some users, or of every user with a trial, by a number of days
+
+    Expired trials are extended from now rather than from their old end.
+    Returns the number of accounts extended.
+    """
+    with users.get_users_lock():
+        all_users = users.load_users()
+        now = int(time.time())
+        extended = 0
+        for username, user in all_users.items():
+            if usernames is not None and username not in usernames:
+                continue
+            expiry = parse_trial_end(user)
+            if expiry is None:
+                continue
+            new_expiry = max(expiry, now) + int(days * DAY_SECONDS)
+            user["trial_end_ts"] = new_expiry
+            user["trial_end"] = format_expiry(new_expiry)
+            extended += 1
+        if extended:
+            users.save_users(all_users)
+    return extended
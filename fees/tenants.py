@@ -0,0 +1,73 @@
+import os
+import argparse
+import threading
+from datetime import datetime
+from fees import config, storage
+
+# Registry of the schools served by one deployment, stored in tenants.json
+# at the top of DATA_DIR. Each school's data, users and jobs live in its own
+# directory, so one school's users and admins never see another's records.
+#
+#   python -m fees.tenants create green-valley --name "Green Valley School"
+#   python -m fees.tenants list
+
+_tenants_lock = threading.Lock()
+
+def get_tenants_file():
+    """Get the path of the school registry, which is shared by all schools"""
+    return os.path.join(config.DATA_DIR, config.TENANTS_FILE)
+
+def load_tenants():
+    """Load the registered schools keyed by school ID"""
+    return storage.read_json_shared(get_tenants_file())
+
+def tenant_exists(tenant_id):
+    """Tell whether a school is registered; None is the single-school data directory"""
+    return tenant_id is None or tenant_id in load_tenants()
+
+def create_tenant(tenant_id, name):
+    """Register a school and create its data files
+
+    Returns (True, message) or (False, message).
+    """
+    try:
+        config.validate_tenant_id(tenant_id)
+    except ValueError as e:
+        return False, str(e)
+    if not tenant_id:
+        return False, "School ID is required"
+
+    with _tenants_lock:
+        tenants = dict(load_tenants())
+        if tenant_id in tenants:
+            return False, f"School '{tenant_id}' already exists"
+
+        os.makedirs(config.get_tenant_dir(tenant_id), exist_ok=True)
+        with config.use_tenant(tenant_id):
+            from fees import users, payments
+            users.initialize_user_db()
+            payments.initialize_data_files()
+
+        tenants[tenant_id] = {"name": name or tenant_id, "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        storage.write_json(get_tenants_file(), tenants)
+    return True, f"School '{tenant_id}' created"
+
+def main():
+    """Create or list schools from the command line"""
+    parser = argparse.ArgumentParser(description="Manage the schools served by this deployment")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create = subparsers.add_parser("create", help="register a new school")
+    create.add_argument("tenant_id")
+    create.add_argument("--name")
+    subparsers.add_parser("list", help="list registered schools")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        ok, message = create_tenant(args.tenant_id, args.name)
+        print(message)
+        raise SystemExit(0 if ok else 1)
+    for tenant_id, tenant in sorted(load_tenants().items()):
+        print(f"{tenant_id}\t{tenant['name']}\t{tenant['created_at']}")
+
+if __name__ == "__main__":
+    main()
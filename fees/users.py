@@ -0,0 +1,129 @@
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from hashlib import sha256
+from fees import config, storage
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process file locks on this platform; account changes are
+    # still serialized between threads of one process
+    fcntl = None
+
+# User accounts, stored in users.json keyed by username. Every change to the
+# accounts loads, modifies and saves the whole file under get_users_lock(),
+# so two changes in different threads or processes cannot overwrite each
+# other.
+
+_users_locks = {}
+_locks_lock = threading.Lock()
+
+@contextmanager
+def get_users_lock():
+    """Hold the lock for changing the current school's user accounts; not reentrant"""
+    lock_path = config.data_path(config.USERS_LOCK_FILE)
+    with _locks_lock:
+        lock = _users_locks.setdefault(lock_path, threading.Lock())
+    with lock, open(lock_path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def initialize_user_db():
+    """Initialize the user database if it doesn't exist"""
+    storage.initialize_json(config.data_path(config.USER_DB_FILE))
+
+def load_users():
+    """Load all user accounts"""
+    return storage.read_json(config.data_path(config.USER_DB_FILE))
+
+def save_users(users):
+    """Save all user accounts; call with get_users_lock() held after loading them"""
+    storage.write_json(config.data_path(config.USER_DB_FILE), users, indent=None)
+
+def hash_password(password):
+    """Hash a password for storing"""
+    return sha256(password.encode('utf-8')).hexdigest()
+
+def verify_password(stored_password, provided_password):
+    """Verify a stored password against one provided by user"""
+    return stored_password == sha256(provided_password.encode('utf-8')).hexdigest()
+
+def validate_email(email):
+    """Validate email format and ensure it's a Gmail address"""
+    email_pattern = r'^[a-zA-Z0-9._%+-]+@gmail\.com$'
+    return re.match(email_pattern, email) is not None
+
+def authenticate_user(username, password):
+    """Authenticate a user and check trial status
+
+    Returns (True, session) with the user's admin flag and remaining trial
+    time, or (False, message) when the login is rejected.
+    """
+    users = load_users()
+    user = users.get(username)
+    if not user or not verify_password(user['password'], password):
+        return False, "Invalid username or password"
+    
+    from fees import subscriptions
+    trial_remaining = None
+    remaining_seconds = subscriptions.get_remaining_seconds(username)
+    if remaining_seconds is not None:
+        if remaining_seconds <= 0:
+            return False, "Your free trial has expired. Please contact support."
+        trial_remaining = timedelta(seconds=remaining_seconds)
+    
+    return True, {
+        "username": username,
+        "is_admin": user.get('is_admin', False),
+        "trial_remaining": trial_remaining
+    }
+
+def check_new_user(users, username, email):
+    """Check that an account can be created with this username and email
+
+    Returns (True, "") or (False, message).
+    """
+    if not validate_email(email):
+        return False, "Please use a valid Gmail address (e.g., username@gmail.com)"
+    
+    if username in users:
+        return False, "This username is already taken. Please choose another or log in."
+    
+    # Check for email uniqueness
+    for user in users.values():
+        if 'email' in user and user['email'] == email:
+            return False, "This Gmail address is already registered. Please use a different Gmail address or log in."
+    return True, ""
+
+def create_user(username, password, email, is_admin=False):
+    """Create a new user account with email and 1-month trial"""
+    try:
+        with get_users_lock():
+            users = load_users()
+            
+            valid, message = check_new_user(users, username, email)
+            if not valid:
+                return False, message
+            
+            now = datetime.now().replace(microsecond=0)
+            trial_start = now.strftime("%Y-%m-%d %H:%M:%S")
+            trial_end = now + timedelta(days=config.TRIAL_DAYS)
+            
+            users[username] = {
+                "password": hash_password(password),
+                "is_admin": is_admin,
+                "email": email,
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "trial_start": trial_start,
+                "trial_end": trial_end.strftime("%Y-%m-%d %H:%M:%S"),
+                "trial_end_ts": int(trial_end.timestamp())
+            }
+            
+            save_users(users)
+            
+            return True, "User created successfully"
+    except Exception as e:
+        return False, f"Error creating user: {str(e)}"
@@ -1,14 +1,41 @@
 # type:ignore   #https://knai-school.streamlit.app/
 import streamlit as st
 from datetime import datetime, timedelta
-import os
-import pandas as pd
-import numpy as np
-from hashlib import md5, sha256
-import json
-from PIL import Image
-import base64
-import re
+import importlib
+from fees import config, users, tenants, subscriptions
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access"""
+    
+    def __init__(self, name):
+        self._name = name
+    
+    def __getattr__(self, attr):
+        # Kept out of sys.modules until first use, so introspection such as
+        # inspect.getmodule() does not trigger the import early
+        return getattr(importlib.import_module(self._name), attr)
+
+# Data libraries and the fee services built on them are only needed once a
+# user is logged in, so the landing and login pages render without paying
+# for their import
+pd = LazyModule("pandas")
+ledger = LazyModule("fees.ledger")
+students = LazyModule("fees.students")
+schedules = LazyModule("fees.schedules")
+balances = LazyModule("fees.balances")
+rollups = LazyModule("fees.rollups")
+payments = LazyModule("fees.payments")
+jobs = LazyModule("fees.jobs")
+reminders = LazyModule("fees.reminders")
+receipts = LazyModule("fees.receipts")
+query = LazyModule("fees.query")
+capture = LazyModule("fees.capture")
+
+# Longer tables are shown a page at a time, so only one page is formatted and sent
+TABLE_PAGE_SIZE = 500
+
+# How long a save waits for the ledger before leaving the entry in the capture queue
+CAPTURE_WAIT_SECONDS = 0.5
 
 # Hide GitHub icon and other Streamlit elements
 def hide_streamlit_elements():
@@ -52,253 +79,108 @@ def hide_streamlit_elements():
     </style>
     """, unsafe_allow_html=True)
 
-# Initialize or load files
-CSV_FILE = "fees_data.csv"
-USER_DB_FILE = "users.json"
-STUDENT_FEES_FILE = "student_fees.json"
-
-# Initialize session state for authentication and app state
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'current_user' not in st.session_state:
-    st.session_state.current_user = None
-if 'is_admin' not in st.session_state:
-    st.session_state.is_admin = False
-if 'form_key' not in st.session_state:
-    st.session_state.form_key = 0
-if 'available_months' not in st.session_state:
-    st.session_state.available_months = []
-if 'current_student_id' not in st.session_state:
-    st.session_state.current_student_id = None
-if 'last_saved_records' not in st.session_state:
-    st.session_state.last_saved_records = None
-if 'last_student_name' not in st.session_state:
-    st.session_state.last_student_name = ""
-if 'last_class_category' not in st.session_state:
-    st.session_state.last_class_category = None
-if 'last_class_section' not in st.session_state:
-    st.session_state.last_class_section = ""
-if 'trial_remaining' not in st.session_state:
-    st.session_state.trial_remaining = None
-
-def initialize_files():
-    """Initialize all required files"""
-    initialize_csv()
-    initialize_user_db()
-    initialize_student_fees()
-
-def initialize_user_db():
-    """Initialize the user database if it doesn't exist"""
-    if not os.path.exists(USER_DB_FILE):
-        with open(USER_DB_FILE, 'w') as f:
-            json.dump({}, f)
-
-def initialize_student_fees():
-    """Initialize the student fees JSON file if it doesn't exist"""
-    if not os.path.exists(STUDENT_FEES_FILE):
-        with open(STUDENT_FEES_FILE, 'w') as f:
-            json.dump({}, f)
-
-def hash_password(password):
-    """Hash a password for storing"""
-    return sha256(password.encode('utf-8')).hexdigest()
-
-def verify_password(stored_password, provided_password):
-    """Verify a stored password against one provided by user"""
-    return stored_password == sha256(provided_password.encode('utf-8')).hexdigest()
+def initialize_session_state():
+    """Initialize session state for authentication and app state"""
+    defaults = {
+        'authenticated': False,
+        'current_user': None,
+        'is_admin': False,
+        'form_key': 0,
+        'available_months': [],
+        'current_student_id': None,
+        'last_saved_records': None,
+        'last_student_name': "",
+        'last_class_category': None,
+        'last_class_section': "",
+        'trial_remaining': None,
+        'my_jobs': [],
+        'queued_entries': [],
+        'show_login': False,
+        'data_files_ready': False,
+        'tenant': None
+    }
+    for key, value in defaults.items():
+        if key not in st.session_state:
+            st.session_state[key] = value
 
-def validate_email(email):
-    """Validate email format and ensure it's a Gmail address"""
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@gmail\.com$'
-    return re.match(email_pattern, email) is not None
+def get_tenant_input(value):
+    """Turn the School ID typed on the login page into a school ID, None for the main school"""
+    return value.strip().lower() or None
 
-def authenticate_user(username, password):
-    """Authenticate a user and check trial status"""
+def authenticate_user(username, password, tenant_id=None):
+    """Authenticate a user of a school and store the login in session state"""
     try:
-        with open(USER_DB_FILE, 'r') as f:
-            users = json.load(f)
-            
-        if username in users:
-            if verify_password(users[username]['password'], password):
-                st.session_state.authenticated = True
-                st.session_state.current_user = username
-                st.session_state.is_admin = users[username].get('is_admin', False)
-                
-                # Check trial status
-                trial_end = users[username].get('trial_end')
-                if trial_end:
-                    trial_end_date = datetime.strptime(trial_end, "%Y-%m-%d %H:%M:%S")
-                    if datetime.now() > trial_end_date:
-                        st.session_state.authenticated = False
-                        st.error("Your free trial has expired. Please contact support.")
-                        return False
-                    remaining = trial_end_date - datetime.now()
-                    st.session_state.trial_remaining = remaining
-                else:
-                    st.session_state.trial_remaining = None
-                
-                return True
-        return False
+        if not tenants.tenant_exists(config.validate_tenant_id(tenant_id)):
+            st.error("Unknown School ID")
+            return False
+        with config.use_tenant(tenant_id):
+            success, result = users.authenticate_user(username, password)
     except Exception as e:
         st.error(f"Authentication error: {str(e)}")
         return False
-
-def create_user(username, password, email, is_admin=False):
-    """Create a new user account with email and 1-month trial"""
-    try:
-        if os.path.exists(USER_DB_FILE):
-            with open(USER_DB_FILE, 'r') as f:
-                users = json.load(f)
-        else:
-            users = {}
-            
-        if not validate_email(email):
-            return False, "Please use a valid Gmail address (e.g., username@gmail.com)"
-            
-        # Check for email uniqueness
-        for user in users.values():
-            if 'email' in user and user['email'] == email:
-                return False, "This Gmail address is already registered. Please use a different Gmail address or log in."
-            
-        trial_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        trial_end = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
-        
-        users[username] = {
-            "password": hash_password(password),
-            "is_admin": is_admin,
-            "email": email,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "trial_start": trial_start,
-            "trial_end": trial_end
-        }
-        
-        with open(USER_DB_FILE, 'w') as f:
-            json.dump(users, f)
-        
-        return True, "User created successfully"
-    except Exception as e:
-        return False, f"Error creating user: {str(e)}"
-
-def initialize_csv():
-    """Initialize the CSV file with proper columns if it doesn't exist"""
-    if not os.path.exists(CSV_FILE):
-        columns = [
-            "ID", "Student Name", "Class Category", "Class Section", "Month", 
-            "Monthly Fee", "Annual Charges", "Admission Fee",
-            "Received Amount", "Payment Method", "Date", "Signature",
-            "Entry Timestamp", "Academic Year"
-        ]
-        pd.DataFrame(columns=columns).to_csv(CSV_FILE, index=False)
-    else:
-        try:
-            df = pd.read_csv(CSV_FILE)
-            expected_columns = [
-                "ID", "Student Name", "Class Category", "Class Section", "Month", 
-                "Monthly Fee", "Annual Charges", "Admission Fee",
-                "Received Amount", "Payment Method", "Date", "Signature",
-                "Entry Timestamp", "Academic Year"
-            ]
-            
-            for col in expected_columns:
-                if col not in df.columns:
-                    df[col] = np.nan
-            
-            df.to_csv(CSV_FILE, index=False)
-        except Exception as e:
-            st.error(f"Error initializing CSV: {str(e)}")
-            pd.DataFrame(columns=expected_columns).to_csv(CSV_FILE, index=False)
-
-def generate_student_id(student_name, class_category):
-    """Generate a unique 8-character ID based on student name and class"""
-    unique_str = f"{student_name}_{class_category}".encode('utf-8')
-    return md5(unique_str).hexdigest()[:8].upper()
+    
+    if not success:
+        st.error(result)
+        return False
+    
+    # Every later run of this session works on this school's data only
+    st.session_state.tenant = tenant_id
+    config.set_tenant(tenant_id)
+    st.session_state.authenticated = True
+    st.session_state.current_user = result["username"]
+    st.session_state.is_admin = result["is_admin"]
+    st.session_state.trial_remaining = result["trial_remaining"]
+    return True
 
 def save_to_csv(data):
-    """Save data to CSV with proper validation"""
+    """Save fee records through the capture queue, showing an error in the app if it fails
+
+    The records are journaled first, so a slow or locked ledger does not lose
+    them; if they are not in the ledger within CAPTURE_WAIT_SECONDS they are
+    saved in the background and show_queued_entries() reports the outcome.
+    """
     try:
-        if os.path.exists(CSV_FILE):
-            df = pd.read_csv(CSV_FILE)
-        else:
-            df = pd.DataFrame(columns=data[0].keys())
-        
-        new_df = pd.DataFrame(data)
-        df = pd.concat([df, new_df], ignore_index=True)
-        
-        df.to_csv(CSV_FILE, index=False)
-        return True
+        entry_id = capture.capture_records(data, actor=st.session_state.current_user)
     except Exception as e:
         st.error(f"Error saving data: {str(e)}")
         return False
-
-def load_data():
-    """Load data from CSV with robust error handling"""
-    if not os.path.exists(CSV_FILE):
-        return pd.DataFrame()
     
-    try:
-        try:
-            df = pd.read_csv(CSV_FILE)
-        except pd.errors.EmptyDataError:
-            return pd.DataFrame()
-        except pd.errors.ParserError:
-            df = pd.read_csv(CSV_FILE, on_bad_lines='skip')
-        
-        expected_columns = [
-            "ID", "Student Name", "Class Category", "Class Section", "Month", 
-            "Monthly Fee", "Annual Charges", "Admission Fee",
-            "Received Amount", "Payment Method", "Date", "Signature",
-            "Entry Timestamp", "Academic Year"
-        ]
-        
-        for col in expected_columns:
-            if col not in df.columns:
-                df[col] = np.nan
-        
-        try:
-            df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%d-%m-%Y')
-        except:
-            pass
-        
-        try:
-            df['Entry Timestamp'] = pd.to_datetime(df['Entry Timestamp']).dt.strftime('%d-%m-%Y %H:%M')
-        except:
-            pass
-        
-        return df.dropna(how='all')
-    
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        return pd.DataFrame()
-
-def update_data(updated_df):
-    """Update the CSV file with the modified DataFrame"""
-    try:
-        updated_df.to_csv(CSV_FILE, index=False)
-        return True
-    except Exception as e:
-        st.error(f"Error updating data: {str(e)}")
+    status = capture.wait_for_entries([entry_id], CAPTURE_WAIT_SECONDS)[0]
+    if status and status.startswith("rejected: "):
+        st.error(f"This payment was not saved. {status[len('rejected: '):]}")
         return False
+    if status == "pending":
+        st.info("⏳ The ledger is busy; this entry is queued and will be saved in the background.")
+        months = ", ".join(record["Month"] for record in data)
+        st.session_state.queued_entries.append({"id": entry_id, "label": f"{data[0]['Student Name']} ({months})"})
+    return True
 
-def load_student_fees():
-    """Load student-specific fees from JSON file"""
-    try:
-        if os.path.exists(STUDENT_FEES_FILE):
-            with open(STUDENT_FEES_FILE, 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        st.error(f"Error loading student fees: {str(e)}")
-        return {}
-
-def save_student_fees(fees_data):
-    """Save student-specific fees to JSON file"""
-    try:
-        with open(STUDENT_FEES_FILE, 'w') as f:
-            json.dump(fees_data, f, indent=4)
-        return True
-    except Exception as e:
-        st.error(f"Error saving student fees: {str(e)}")
-        return False
+def show_queued_entries():
+    """Report this session's queued entries that were saved or rejected since the last rerun"""
+    still_pending = []
+    for entry in st.session_state.queued_entries:
+        status = capture.get_status(entry["id"])
+        if status == "pending":
+            still_pending.append(entry)
+        elif status == "saved":
+            st.success(f"✅ Queued entry for {entry['label']} has been saved.")
+        elif status and status.startswith("rejected: "):
+            st.error(f"❌ Queued entry for {entry['label']} was not saved. {status[len('rejected: '):]}")
+    st.session_state.queued_entries = still_pending
+    
+    for entry in still_pending:
+        st.sidebar.markdown(f"⏳ Waiting to be saved: {entry['label']}")
+    
+    if st.session_state.is_admin:
+        rejected = capture.load_rejected()
+        if rejected:
+            with st.sidebar.expander(f"⚠️ {len(rejected)} rejected fee entr{'y' if len(rejected) == 1 else 'ies'}"):
+                for entry in reversed(rejected[-20:]):
+                    record = entry["records"][0] if entry["records"] else {}
+                    st.markdown(
+                        f"**{record.get('Student Name', '')}** ({', '.join(r.get('Month', '') for r in entry['records'])}) – "
+                        f"by {entry.get('actor') or 'unknown'}, {entry['time'][:16].replace('T', ' ')}: {entry['reason']}"
+                    )
 
 def format_currency(val):
     """Format currency with Pakistani Rupees symbol and thousand separators"""
@@ -307,68 +189,141 @@ def format_currency(val):
     except:
         return "Rs. 0"
 
-def style_row(row):
-    """Apply styling to DataFrame rows based on payment status"""
-    today = datetime.now()
-    is_between_1st_and_10th = 1 <= today.day <= 10
-    styles = [''] * len(row)
-    
-    if is_between_1st_and_10th:
-        if row['Monthly Fee'] == 0:
-            styles[0] = 'color: red'
-        else:
-            styles[0] = 'color: green'
-    return styles
-
-def get_academic_year(date):
-    """Determine academic year based on date"""
-    year = date.year
-    if date.month >= 4:  # Academic year starts in April
-        return f"{year}-{year+1}"
-    return f"{year-1}-{year}"
+def format_currency_column(values):
+    """Format a whole column of amounts the way format_currency formats one value"""
+    amounts = pd.to_numeric(values, errors='coerce').fillna(0).astype('int64')
+    return "Rs. " + amounts.map("{:,}".format)
 
-def check_annual_admission_paid(student_id, academic_year):
-    """Check if annual charges or admission fee have been paid for the academic year"""
-    df = load_data()
-    if df.empty:
-        return False, False
-    
-    student_records = df[(df['ID'] == student_id) & (df['Academic Year'] == academic_year)]
-    annual_paid = student_records['Annual Charges'].sum() > 0
-    admission_paid = student_records['Admission Fee'].sum() > 0
-    
-    return annual_paid, admission_paid
+def get_row_status(df):
+    """Mark rows red or green for monthly fee status during the 1st to 10th of the month"""
+    if not 1 <= datetime.now().day <= 10:
+        return pd.Series("", index=df.index)
+    paid = df['Monthly Fee'] > 0
+    return paid.map({True: "🟢", False: "🔴"})
 
-def get_unpaid_months(student_id):
-    """Get list of unpaid months for a specific student"""
-    df = load_data()
-    all_months = [
-        "APRIL", "MAY", "JUNE", "JULY", "AUGUST", "SEPTEMBER",
-        "OCTOBER", "NOVEMBER", "DECEMBER", "JANUARY", "FEBRUARY", "MARCH"
-    ]
-    
-    if df.empty or student_id is None:
-        return all_months
+def show_table(df, currency_columns, key, show_status=False, hide_index=False):
+    """Show a table with precomputed currency columns, one page at a time for long tables"""
+    if len(df) > TABLE_PAGE_SIZE:
+        page_count = -(-len(df) // TABLE_PAGE_SIZE)
+        page = st.number_input(
+            f"Page (of {page_count}, {TABLE_PAGE_SIZE} rows each)",
+            min_value=1, max_value=page_count, value=1, key=f"page_{key}"
+        )
+        df = df.iloc[(page - 1) * TABLE_PAGE_SIZE:page * TABLE_PAGE_SIZE]
     
-    paid_months = df[(df['ID'] == student_id) & (df['Monthly Fee'] > 0)]['Month'].unique().tolist()
+    display_df = df.copy()
+    for col in currency_columns:
+        display_df[col] = format_currency_column(df[col])
     
-    unpaid_months = [month for month in all_months if month not in paid_months]
+    column_config = {col: st.column_config.TextColumn(col) for col in currency_columns}
+    if show_status:
+        display_df.insert(0, "Status", get_row_status(df))
+        column_config["Status"] = st.column_config.TextColumn("", width="small")
     
-    return unpaid_months
+    st.dataframe(display_df, column_config=column_config, use_container_width=True, hide_index=hide_index)
 
 def update_student_data():
-    """Update session state with student data when name or class changes"""
+    """Update session state with student data when name or class changes
+
+    The unpaid months are those of the academic year of the payment date.
+    """
     student_name = st.session_state.get(f"student_name_{st.session_state.form_key}", "")
     class_category = st.session_state.get(f"class_category_{st.session_state.form_key}", None)
     
     if student_name and class_category:
-        student_id = generate_student_id(student_name, class_category)
+        student_id = students.generate_student_id(student_name, class_category)
         st.session_state.current_student_id = student_id
-        st.session_state.available_months = get_unpaid_months(student_id)
+        payment_date = st.session_state.get(f"payment_date_{st.session_state.form_key}", datetime.now())
+        st.session_state.available_months = students.get_unpaid_months(
+            student_id, students.get_academic_year(payment_date)
+        )
     else:
         st.session_state.current_student_id = None
         st.session_state.available_months = []
 
+JOB_LABELS = {
+    "records_export": "Records Export",
+    "class_summary": "Class Summary Report",
+    "monthly_collections": "Monthly Collections Report",
+    "arrears_report": "Arrears Report",
+    "duplicate_scan": "Duplicate Payments Scan",
+    "integrity_check": "Ledger Integrity Check"
+}
+
+@st.fragment(run_every="2s")
+def show_job_status():
+    """Poll and display the status of this session's background jobs"""
+    # A timed rerun of the fragment runs outside main(), without the
+    # session's school set in its context
+    with config.use_tenant(st.session_state.tenant):
+        if not st.session_state.my_jobs:
+            st.info("No background jobs started in this session.")
+            return
+        
+        for job_id in reversed(st.session_state.my_jobs):
+            job = jobs.get_job(job_id)
+            if not job:
+                continue
+        
+            label = JOB_LABELS.get(job["kind"], job["kind"])
+            academic_year = job["params"].get("academic_year") or "All Years"
+            st.markdown(f"**{label}** ({academic_year}) – {job['status'].title()}")
+        
+            if job["status"] in ("queued", "running"):
+                col1, col2 = st.columns([4, 1])
+                col1.progress(job["progress"])
+                if col2.button("✖ Cancel", key=f"cancel_job_{job_id}"):
+                    jobs.cancel_job(job_id)
+                    st.rerun(scope="fragment")
+            elif job["status"] == "completed":
+                with open(job["result_file"], 'rb') as f:
+                    st.download_button(
+                        "📥 Download CSV",
+                        f.read(),
+                        file_name=f"{job['kind']}_{academic_year}.csv",
+                        mime="text/csv",
+                        key=f"download_job_{job_id}"
+                    )
+            elif job["status"] == "failed":
+                st.error(f"Job failed: {job['error']}")
+
+def logout():
+    """Clear the login and everything the session was working on"""
+    st.session_state.authenticated = False
+    st.session_state.tenant = None
+    config.set_tenant(None)
+    st.session_state.data_files_ready = False
+    st.session_state.current_user = None
+    st.session_state.is_admin = False
+    st.session_state.show_login = False
+    st.session_state.menu = None
+    st.session_state.form_key = 0
+    st.session_state.available_months = []
+    st.session_state.current_student_id = None
+    st.session_state.last_saved_records = None
+    st.session_state.last_student_name = ""
+    st.session_state.last_class_category = None
+    st.session_state.last_class_section = ""
+    st.session_state.trial_remaining = None
+    st.session_state.my_jobs = []
+    st.session_state.queued_entries = []
+
+def check_subscription():
+    """Log the session out if its account has expired or been removed since login
+
+    Runs on every rerun; the expiry lookup is an in-memory dict access.
+    """
+    username = st.session_state.current_user
+    if not subscriptions.is_active(username):
+        logout()
+        st.session_state.show_login = True
+        st.session_state.login_notice = "Your free trial has expired. Please contact support."
+        return False
+    
+    remaining_seconds = subscriptions.get_remaining_seconds(username)
+    st.session_state.trial_remaining = timedelta(seconds=remaining_seconds) if remaining_seconds is not None else None
+    return True
+
 def format_trial_remaining(remaining):
     """Format remaining trial time"""
     if remaining is None:
@@ -502,6 +457,7 @@ def home_page():
     st.markdown('<div class="circle-container">', unsafe_allow_html=True)
     
     try:
+        import base64
         with open("school-pic.jpeg", "rb") as img_file:
             img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
         img_html = f'<img src="data:image/jpeg;base64,{img_base64}" alt="School Logo">'
@@ -687,6 +643,9 @@ def login_page():
     
     st.title("🔒 School Fees Management - Login / Sign Up")
     
+    if st.session_state.get("login_notice"):
+        st.error(st.session_state.pop("login_notice"))
+    
     st.markdown("**New users, including admins, must sign up with their Gmail address to start a 1-month free trial.**")
     st.markdown("**⚠️ Please use the same Gmail address you used to access this app.**")
     
@@ -694,11 +653,13 @@ def login_page():
     
     with tabs[0]:
         with st.form("signup_form"):
+            new_school = st.text_input("School ID", placeholder="e.g. green-valley", help="Leave blank for the main school. A new School ID registers a new school.")
+            new_school_name = st.text_input("School Name", help="Only needed when registering a new school.")
             new_username = st.text_input("Username*")
             new_email = st.text_input("Gmail Address*", placeholder="yourname@gmail.com", help="Only the Gmail address used to access this app is allowed.")
             new_password = st.text_input("Password*", type="password", key="signup_pass")
             confirm_password = st.text_input("Confirm Password*", type="password", key="signup_confirm")
-            is_admin = st.checkbox("Register as Admin User")
+            is_admin = st.checkbox("Register as Admin User", help="Only for a new school; admins of an existing school add its other admins.")
             show_password = st.checkbox("Show Password")
             
             if show_password:
@@ -712,27 +673,46 @@ def login_page():
                 elif new_password != confirm_password:
                     st.error("Passwords do not match!")
                 else:
-                    success, message = create_user(new_username, new_password, new_email, is_admin)
+                    tenant_id = get_tenant_input(new_school)
+                    try:
+                        config.validate_tenant_id(tenant_id)
+                        is_new_school = not tenants.tenant_exists(tenant_id)
+                        # Checked before a new school is registered, so a bad sign-up leaves nothing behind
+                        with config.use_tenant(tenant_id):
+                            existing_users = users.load_users()
+                            success, message = users.check_new_user(existing_users, new_username, new_email)
+                        if success and is_admin and existing_users:
+                            # Only the first account of a school may make itself an admin
+                            success, message = False, (
+                                "This school already has accounts, so only one of its admins can add another admin. "
+                                "Untick 'Register as Admin User' to sign up as a staff user."
+                            )
+                        if success and is_new_school:
+                            success, message = tenants.create_tenant(tenant_id, new_school_name.strip())
+                        if success:
+                            with config.use_tenant(tenant_id):
+                                success, message = users.create_user(new_username, new_password, new_email, is_admin)
+                    except ValueError as e:
+                        success, message = False, str(e)
                     if success:
                         st.success(f"{message} Your 1-month free trial has started!")
                         st.info(f"User '{new_username}' created with email: {new_email}")
-                        if authenticate_user(new_username, new_password):
+                        if authenticate_user(new_username, new_password, tenant_id):
                             st.rerun()
                     else:
                         st.error(message)
 
     with tabs[1]:
         with st.form("login_form"):
+            school = st.text_input("School ID", placeholder="Leave blank for the main school")
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             submit = st.form_submit_button("Login")
             
             if submit:
-                if authenticate_user(username, password):
+                if authenticate_user(username, password, get_tenant_input(school)):
                     st.success(f"Welcome {username}!")
                     st.rerun()
-                else:
-                    st.error("Invalid username or password")
 
 def main_app():
     """Main application after login"""
@@ -743,6 +723,17 @@ def main_app():
     
     st.title("📚 School Fees Management System")
     
+    # The data files only need creating once per session, not on every rerun
+    if not st.session_state.data_files_ready:
+        payments.initialize_data_files()
+        # Picks up entries left in the capture queue by a previous run
+        capture.start_flusher()
+        st.session_state.data_files_ready = True
+    
+    if st.session_state.tenant:
+        school = tenants.load_tenants().get(st.session_state.tenant, {})
+        st.sidebar.markdown(f"🏫 {school.get('name', st.session_state.tenant)}")
+    
     # Display trial status in sidebar
     if st.session_state.trial_remaining:
         st.sidebar.markdown(
@@ -750,6 +741,11 @@ def main_app():
             unsafe_allow_html=True
         )
     
+    pending_entries = capture.count_pending()
+    if pending_entries:
+        st.sidebar.markdown(f"⏳ {pending_entries} fee entr{'y' if pending_entries == 1 else 'ies'} waiting to be saved")
+    show_queued_entries()
+    
     if 'menu' not in st.session_state:
         st.session_state.menu = "Enter Fees"
     
@@ -757,7 +753,8 @@ def main_app():
         st.sidebar.markdown(f"Logged in as Admin: {st.session_state.current_user}")
         menu_options = [
             "Enter Fees", "View All Records", "Paid & Unpaid Students Record", 
-            "Student Yearly Report", "User Management", "Set Student Fees"
+            "Student Yearly Report", "User Management", "Set Student Fees",
+            "Collections Dashboard", "Fee Reminders"
         ]
         menu = st.sidebar.selectbox("Menu", menu_options, key="menu_select")
         st.session_state.menu = menu
@@ -768,29 +765,9 @@ def main_app():
         menu = "Enter Fees"
     
     if st.sidebar.button("🚪 Logout"):
-        st.session_state.authenticated = False
-        st.session_state.current_user = None
-        st.session_state.is_admin = False
-        st.session_state.show_login = False
-        st.session_state.menu = None
-        st.session_state.form_key = 0
-        st.session_state.available_months = []
-        st.session_state.current_student_id = None
-        st.session_state.last_saved_records = None
-        st.session_state.last_student_name = ""
-        st.session_state.last_class_category = None
-        st.session_state.last_class_section = ""
-        st.session_state.trial_remaining = None
+        logout()
         st.rerun()
     
-    CLASS_CATEGORIES = [
-        "Nursery", "KGI", "KGII", 
-        "Class 1", "Class 2", "Class 3", "Class 4", "Class 5",
-        "Class 6", "Class 7", "Class 8", "Class 9", "Class 10 (Matric)"
-    ]
-    
-    PAYMENT_METHODS = ["Cash", "Bank Transfer", "Cheque", "Online Payment", "Other"]
-    
     if menu == "Enter Fees":
         st.header("➕ Enter Fee Details")
         
@@ -807,8 +784,8 @@ def main_app():
             with col2:
                 class_category = st.selectbox(
                     "Class Category*", 
-                    CLASS_CATEGORIES, 
-                    index=CLASS_CATEGORIES.index(st.session_state.last_class_category) if st.session_state.last_class_category in CLASS_CATEGORIES else 0,
+                    config.CLASS_CATEGORIES, 
+                    index=config.CLASS_CATEGORIES.index(st.session_state.last_class_category) if st.session_state.last_class_category in config.CLASS_CATEGORIES else 0,
                     key=f"class_category_{st.session_state.form_key}"
                 )
             
@@ -831,25 +808,16 @@ def main_app():
             # Show student records if student_id is available
             if student_id:
                 st.subheader("📋 Student Payment History")
-                df = load_data()
-                student_records = df[df['ID'] == student_id]
+                student_records = query.find_records(student_id=student_id)
                 
                 if not student_records.empty:
                     # Display all records for the student
                     display_df = student_records[[
-                        "Student Name", "Month", "Monthly Fee", "Annual Charges", 
+                        "Receipt No", "Student Name", "Month", "Monthly Fee", "Annual Charges", 
                         "Admission Fee", "Received Amount", "Payment Method", "Date", "Academic Year"
                     ]].sort_values("Date", ascending=False)
                     
-                    st.dataframe(
-                        display_df.style.format({
-                            "Monthly Fee": format_currency,
-                            "Annual Charges": format_currency,
-                            "Admission Fee": format_currency,
-                            "Received Amount": format_currency
-                        }),
-                        use_container_width=True
-                    )
+                    show_table(display_df, config.AMOUNT_COLUMNS, key="student_history", show_status=True)
                     
                     # Calculate totals
                     total_monthly = student_records["Monthly Fee"].sum()
@@ -857,18 +825,26 @@ def main_app():
                     total_admission = student_records["Admission Fee"].sum()
                     total_received = student_records["Received Amount"].sum()
                     
-                    col1, col2, col3, col4 = st.columns(4)
+                    payment_date = st.session_state.get(f"payment_date_{st.session_state.form_key}", datetime.now())
+                    academic_year = students.get_academic_year(payment_date)
+                    balance = balances.get_student_balance(student_id, academic_year)
+                    
+                    col1, col2, col3, col4, col5 = st.columns(5)
                     col1.metric("Total Monthly", format_currency(total_monthly))
                     col2.metric("Total Annual", format_currency(total_annual))
                     col3.metric("Total Admission", format_currency(total_admission))
                     col4.metric("Total Received", format_currency(total_received))
+                    col5.metric(
+                        "Outstanding",
+                        format_currency(balance["outstanding"]),
+                        help=f"Fees due for {academic_year} so far by the student's fee schedule, less the amount "
+                             "received for the year; negative when paid in advance."
+                    )
                     
                     # Show payment status
                     st.subheader("Payment Status")
-                    payment_date = st.session_state.get(f"payment_date_{st.session_state.form_key}", datetime.now())
-                    academic_year = get_academic_year(payment_date)
                     
-                    annual_paid, admission_paid = check_annual_admission_paid(student_id, academic_year)
+                    annual_paid, admission_paid = students.check_annual_admission_paid(student_id, academic_year)
                     unpaid_months = st.session_state.available_months
                     
                     col_paid, col_unpaid = st.columns(2)
@@ -907,7 +883,7 @@ def main_app():
             
             payment_date = st.date_input("Payment Date", value=datetime.now(),
                                        key=f"payment_date_{st.session_state.form_key}")
-            academic_year = get_academic_year(payment_date)
+            academic_year = students.get_academic_year(payment_date)
             
             fee_type = st.radio("Select Fee Type*",
                               ["Monthly Fee", "Annual Charges", "Admission Fee"],
@@ -919,11 +895,10 @@ def main_app():
             annual_charges = 0
             admission_fee = 0
             
-            fees_data = load_student_fees()
-            predefined_fees = fees_data.get(student_id, {})
-            default_monthly_fee = predefined_fees.get("monthly_fee", 2000)
-            default_annual_charges = predefined_fees.get("annual_charges", 5000)
-            default_admission_fee = predefined_fees.get("admission_fee", 1000)
+            fee_schedule, has_predefined_fees = schedules.get_fee_schedule(student_id)
+            default_monthly_fee = fee_schedule["monthly_fee"]
+            default_annual_charges = fee_schedule["annual_charges"]
+            default_admission_fee = fee_schedule["admission_fee"]
             
             if fee_type == "Monthly Fee":
                 if not student_id:
@@ -935,7 +910,7 @@ def main_app():
                         "Monthly Fee Amount per Month*",
                         min_value=0,
                         value=default_monthly_fee,
-                        disabled=bool(predefined_fees) and not st.session_state.is_admin,
+                        disabled=has_predefined_fees and not st.session_state.is_admin,
                         key=f"monthly_fee_{st.session_state.form_key}"
                     )
                     # Month selection as dropdown
@@ -952,7 +927,7 @@ def main_app():
             
             elif fee_type == "Annual Charges":
                 if student_id:
-                    annual_paid, _ = check_annual_admission_paid(student_id, academic_year)
+                    annual_paid, _ = students.check_annual_admission_paid(student_id, academic_year)
                     if annual_paid:
                         st.error("Annual charges have already been paid for this academic year!")
                     else:
@@ -961,7 +936,7 @@ def main_app():
                             "Annual Charges Amount*",
                             min_value=0,
                             value=default_annual_charges,
-                            disabled=bool(predefined_fees) and not st.session_state.is_admin,
+                            disabled=has_predefined_fees and not st.session_state.is_admin,
                             key=f"annual_charges_{st.session_state.form_key}"
                         )
                 else:
@@ -969,7 +944,7 @@ def main_app():
             
             elif fee_type == "Admission Fee":
                 if student_id:
-                    _, admission_paid = check_annual_admission_paid(student_id, academic_year)
+                    _, admission_paid = students.check_annual_admission_paid(student_id, academic_year)
                     if admission_paid:
                         st.error("Admission fee has already been paid for this academic year!")
                     else:
@@ -978,7 +953,7 @@ def main_app():
                             "Admission Fee Amount*",
                             min_value=0,
                             value=default_admission_fee,
-                            disabled=bool(predefined_fees) and not st.session_state.is_admin,
+                            disabled=has_predefined_fees and not st.session_state.is_admin,
                             key=f"admission_fee_{st.session_state.form_key}"
                         )
                 else:
@@ -996,7 +971,7 @@ def main_app():
                 
                 payment_method = st.selectbox(
                     "Payment Method*",
-                    PAYMENT_METHODS,
+                    config.PAYMENT_METHODS,
                     key=f"payment_method_{st.session_state.form_key}"
                 )
             with col4:
@@ -1040,46 +1015,11 @@ def main_app():
                 elif fee_type == "Admission Fee" and admission_paid:
                     st.error("Admission fee has already been paid for this academic year!")
                 else:
-                    fee_records = []
-                    
-                    if fee_type in ["Annual Charges", "Admission Fee"]:
-                        fee_data = {
-                            "ID": student_id,
-                            "Student Name": student_name,
-                            "Class Category": class_category,
-                            "Class Section": class_section,
-                            "Month": selected_months[0],
-                            "Monthly Fee": 0,
-                            "Annual Charges": annual_charges,
-                            "Admission Fee": admission_fee,
-                            "Received Amount": received_amount,
-                            "Payment Method": payment_method,
-                            "Date": payment_date.strftime("%Y-%m-%d"),
-                            "Signature": signature,
-                            "Entry Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "Academic Year": academic_year
-                        }
-                        fee_records.append(fee_data)
-                    
-                    elif fee_type == "Monthly Fee":
-                        for month in selected_months:
-                            fee_data = {
-                                "ID": student_id,
-                                "Student Name": student_name,
-                                "Class Category": class_category,
-                                "Class Section": class_section,
-                                "Month": month,
-                                "Monthly Fee": monthly_fee,
-                                "Annual Charges": 0,
-                                "Admission Fee": 0,
-                                "Received Amount": monthly_fee,
-                                "Payment Method": payment_method,
-                                "Date": payment_date.strftime("%Y-%m-%d"),
-                                "Signature": signature,
-                                "Entry Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "Academic Year": academic_year
-                            }
-                            fee_records.append(fee_data)
+                    fee_records = payments.build_fee_records(
+                        student_name, class_category, class_section, fee_type,
+                        monthly_fee + annual_charges + admission_fee, received_amount,
+                        payment_method, payment_date, signature, months=selected_months
+                    )
                     
                     if save_to_csv(fee_records):
                         st.session_state.last_student_name = student_name
@@ -1087,7 +1027,10 @@ def main_app():
                         st.session_state.last_class_section = class_section or ""
                         
                         st.session_state.form_key += 1
-                        st.session_state.available_months = get_unpaid_months(student_id)
+                        # Apply the saved months instead of re-reading the student's history
+                        st.session_state.available_months = students.remove_paid_months(
+                            st.session_state.available_months, fee_records
+                        )
                         st.session_state.last_saved_records = fee_records
                         st.success("✅ Fee record(s) saved successfully!")
                         st.balloons()
@@ -1097,26 +1040,239 @@ def main_app():
         if st.session_state.last_saved_records:
             st.subheader("📋 Last Saved Fee Record(s)")
             saved_df = pd.DataFrame(st.session_state.last_saved_records)
+            st.markdown(f"**Receipt No:** {', '.join(saved_df['Receipt No'].unique())}")
             display_df = saved_df[[
-                "Student Name", "Class Category", "Month", "Monthly Fee", 
+                "Receipt No", "Student Name", "Class Category", "Month", "Monthly Fee", 
                 "Annual Charges", "Admission Fee", "Received Amount",
                 "Payment Method", "Date", "Signature"
             ]]
-            st.dataframe(
-                display_df.style.format({
-                    "Monthly Fee": format_currency,
-                    "Annual Charges": format_currency,
-                    "Admission Fee": format_currency,
-                    "Received Amount": format_currency
-                }),
-                use_container_width=True
+            show_table(display_df, config.AMOUNT_COLUMNS, key="last_saved")
+        
+        show_receipt_lookup()
+    
+    elif menu == "View All Records":
+        st.header("🗂️ Reports & Exports")
+        st.markdown("Large reports run in the background, so you can keep working while they are prepared.")
+        
+        with st.form("report_job_form"):
+            report_kind = st.selectbox(
+                "Report",
+                list(JOB_LABELS.keys()),
+                format_func=lambda kind: JOB_LABELS[kind]
             )
+            academic_year = st.text_input("Academic Year", placeholder="e.g. 2025-2026 (leave blank for all years)")
+            start_job = st.form_submit_button("▶ Start Report")
+            
+            if start_job:
+                params = {"academic_year": academic_year.strip() or None}
+                job_id = jobs.submit_job(report_kind, params, st.session_state.current_user)
+                if job_id not in st.session_state.my_jobs:
+                    st.session_state.my_jobs.append(job_id)
+        
+        st.subheader("⏳ Background Jobs")
+        show_job_status()
+    
+    elif menu == "Collections Dashboard":
+        show_collections_dashboard()
+    
+    elif menu == "Fee Reminders":
+        show_fee_reminders()
+    
+    elif menu == "User Management":
+        show_user_management()
+    
+    elif menu == "Paid & Unpaid Students Record":
+        st.header("📊 Outstanding Fees")
+        academic_year = students.get_academic_year(datetime.now())
+        st.caption(
+            f"Fees due for {academic_year} up to this month by each student's fee schedule, less what "
+            "they have paid for the year. Students with a record this year or last year, or with fees "
+            "set, are included."
+        )
+        
+        arrears_df = balances.get_arrears_list(academic_year)
+        if arrears_df.empty:
+            st.success("No outstanding fees. Every student has paid what is due so far!")
+        else:
+            col1, col2 = st.columns(2)
+            col1.metric("Students with Arrears", len(arrears_df))
+            col2.metric("Total Outstanding", format_currency(arrears_df["Outstanding"].sum()))
+            
+            show_table(arrears_df, ["Owed", "Received", "Outstanding"], key="arrears", hide_index=True)
+
+def show_receipt_lookup():
+    """Look up the fee records of a receipt number"""
+    with st.expander("🔎 Find Receipt"):
+        receipt_number = st.text_input("Receipt No", placeholder="e.g. 2025-26/000123", key="receipt_lookup")
+        if not receipt_number:
+            return
+        receipt_df = receipts.find_receipt(receipt_number)
+        if receipt_df.empty:
+            st.warning(f"No receipt {receipt_number.strip()} found.")
+            return
+        first = receipt_df.iloc[0]
+        st.markdown(
+            f"**{first['Student Name']}** ({first['Class Category']}) – {first['Date']}, "
+            f"{first['Payment Method']}, received by {first['Signature']}"
+        )
+        show_table(
+            receipt_df[["Month", "Monthly Fee", "Annual Charges", "Admission Fee", "Received Amount", "Academic Year"]],
+            config.AMOUNT_COLUMNS,
+            key="receipt",
+            hide_index=True
+        )
+
+def show_user_management():
+    """Display accounts whose trial ends soon, add users and extend trials in bulk"""
+    st.header("👥 User Management")
+    
+    window_days = st.number_input("Show trials ending within (days)", min_value=1, max_value=365, value=7)
+    expiring = subscriptions.list_expiring(window_days * subscriptions.DAY_SECONDS)
+    now = datetime.now().timestamp()
+    
+    col1, col2 = st.columns(2)
+    col1.metric("Accounts", len(users.load_users()))
+    col2.metric(f"Trials Ending Within {window_days} Days", len(expiring))
+    
+    if expiring:
+        st.dataframe(
+            pd.DataFrame({
+                "Username": [username for _, username in expiring],
+                "Trial Ends": [subscriptions.format_expiry(expiry) for expiry, _ in expiring],
+                "Status": ["Expired" if expiry <= now else "Active" for expiry, _ in expiring]
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.info("No trials end in this period.")
+    
+    st.subheader("Add User")
+    with st.form("add_user_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        add_username = col1.text_input("Username*")
+        add_email = col2.text_input("Gmail Address*", placeholder="name@gmail.com")
+        add_password = col1.text_input("Password*", type="password")
+        add_is_admin = col2.checkbox("Admin User")
+        add_user = st.form_submit_button("Add User")
+        
+        if add_user:
+            if not add_username or not add_password or not add_email:
+                st.error("Username, password, and Gmail address are required!")
+            else:
+                success, message = users.create_user(add_username, add_password, add_email, add_is_admin)
+                if success:
+                    st.success(f"User '{add_username}' added{' as an admin' if add_is_admin else ''}.")
+                else:
+                    st.error(message)
+    
+    st.subheader("Extend Trials")
+    with st.form("extend_trials_form"):
+        extend_days = st.number_input("Days to add", min_value=1, max_value=365, value=30)
+        extend_scope = st.radio("Accounts", ["Trials ending in this period", "All accounts with a trial"], horizontal=True)
+        extend = st.form_submit_button("Extend Trials")
+        
+        if extend:
+            usernames = None if extend_scope == "All accounts with a trial" else {username for _, username in expiring}
+            count = subscriptions.extend_trials(extend_days, usernames)
+            st.success(f"Extended {count} trial(s) by {extend_days} days.")
+
+def show_fee_reminders():
+    """Display the defaulter list for a month and write reminders to the outbox"""
+    st.header("📨 Fee Reminders")
+    
+    today = datetime.now()
+    col_year, col_month = st.columns(2)
+    with col_year:
+        academic_year = st.text_input("Academic Year", value=students.get_academic_year(today), key="reminder_year")
+    with col_month:
+        month = st.selectbox("Outstanding as of", config.MONTHS, index=(today.month - 4) % 12, key="reminder_month")
+    
+    try:
+        defaulters = reminders.find_defaulters(academic_year.strip(), month)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if defaulters.empty:
+        st.success("No outstanding fees for this period.")
+        return
+    
+    col1, col2 = st.columns(2)
+    col1.metric("Defaulters", len(defaulters))
+    col2.metric("Total Due", format_currency(defaulters["Total Due"].sum()))
+    
+    show_table(
+        defaulters,
+        ["Monthly Due", "Annual Charges Due", "Admission Fee Due", "Partly Paid Balance", "Total Due"],
+        key="defaulters",
+        hide_index=True
+    )
+    
+    channels = st.multiselect("Reminders", ["letter", "sms"], default=["letter", "sms"], format_func=str.upper)
+    if st.button("📤 Write Reminders to Outbox", disabled=not channels):
+        batch_dir = reminders.write_outbox(defaulters, academic_year.strip(), month, channels)
+        st.success(f"Wrote reminders for {len(defaulters)} students to {batch_dir}")
+
+def show_collections_dashboard():
+    """Display collection totals and charts computed from the rollups only"""
+    st.header("📈 Collections Dashboard")
+    
+    rollup_df = rollups.get_rollups_frame()
+    if rollup_df.empty:
+        st.info("No collections recorded yet.")
+        return
+    
+    today = pd.Timestamp(datetime.now().date())
+    month_start = today.replace(day=1)
+    academic_year_start = pd.Timestamp(today.year if today.month >= 4 else today.year - 1, 4, 1)
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Collected Today", format_currency(rollup_df.loc[rollup_df["Date"] == today, "Amount"].sum()))
+    col2.metric("Collected This Month", format_currency(rollup_df.loc[rollup_df["Date"] >= month_start, "Amount"].sum()))
+    col3.metric("Collected This Academic Year", format_currency(rollup_df.loc[rollup_df["Date"] >= academic_year_start, "Amount"].sum()))
+    
+    col_start, col_end = st.columns(2)
+    with col_start:
+        start_date = st.date_input("From", value=(today - pd.Timedelta(days=30)).date(), key="dashboard_start")
+    with col_end:
+        end_date = st.date_input("To", value=today.date(), key="dashboard_end")
+    
+    period_df = rollup_df[
+        (rollup_df["Date"] >= pd.Timestamp(start_date)) & (rollup_df["Date"] <= pd.Timestamp(end_date))
+    ]
+    if period_df.empty:
+        st.info("No collections in the selected period.")
+        return
+    
+    st.subheader("Daily Collections")
+    st.bar_chart(period_df.groupby("Date")["Amount"].sum())
+    
+    col_method, col_type = st.columns(2)
+    with col_method:
+        st.subheader("By Payment Method")
+        st.bar_chart(period_df.groupby("Payment Method")["Amount"].sum())
+    with col_type:
+        st.subheader("By Fee Type")
+        st.bar_chart(period_df.groupby("Fee Type")["Amount"].sum())
+    
+    st.subheader("By Class")
+    st.bar_chart(period_df.groupby("Class Category")["Amount"].sum())
+    
+    if st.button("🔄 Rebuild Rollups from Ledger", help="Recompute all rollups from the fee records"):
+        # Held so no save lands between reading the ledger and replacing the rollups
+        with ledger.get_write_lock():
+            rollups.save_rollups(rollups.rebuild_rollups(ledger.load_ledger()))
+        st.success("Collection rollups rebuilt.")
+        st.rerun()
 
 def main():
-    initialize_files()
+    initialize_session_state()
+    # Each run of the script works on the logged-in school's data
+    config.set_tenant(st.session_state.tenant)
+    users.initialize_user_db()
     
-    if 'show_login' not in st.session_state:
-        st.session_state.show_login = False
+    if st.session_state.authenticated:
+        check_subscription()
     
     if not st.session_state.authenticated:
         if st.session_state.show_login:
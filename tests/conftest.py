@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from fees import config, payments
+
+# Every test works on a fresh data directory of its own. The fees modules
+# key their caches by file path, so nothing leaks between tests.
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Point the fees package at an empty data directory"""
+    monkeypatch.setattr(config, "DATA_DIR", str(tmp_path))
+    config.set_tenant(None)
+    payments.initialize_data_files()
+    return str(tmp_path)
+
+def run_processes(code, data_dir, count, timeout=120):
+    """Run count Python processes on the same data directory, started together
+
+    Each process runs code after FEES_DATA_DIR is set and every process has
+    started; returns their stdout, one string per process.
+    """
+    go_file = os.path.join(data_dir, "go")
+    script = (
+        "import os, sys, time\n"
+        f"while not os.path.exists({go_file!r}):\n"
+        "    time.sleep(0.01)\n"
+        + code
+    )
+    env = dict(os.environ, FEES_DATA_DIR=data_dir, PYTHONPATH=ROOT_DIR)
+    children = [
+        subprocess.Popen([sys.executable, "-c", script], env=env, cwd=ROOT_DIR,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(count)
+    ]
+    open(go_file, 'w').close()
+    outputs = []
+    for child in children:
+        stdout, stderr = child.communicate(timeout=timeout)
+        assert child.returncode == 0, stderr
+        outputs.append(stdout)
+    return outputs
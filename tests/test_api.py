@@ -0,0 +1,114 @@
+import os
+import json
+import asyncio
+from fees import api, config, ledger, tenants
+
+def call(method, path, body=None, query_string="", headers=()):
+    """Send one request to the ASGI app and return (status, JSON payload)"""
+    messages = [{"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}]
+    sent = []
+    async def receive():
+        return messages.pop(0)
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": method, "path": path, "query_string": query_string.encode(), "headers": list(headers)}
+    asyncio.run(api.app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+def make_payment(**fields):
+    """Build a valid payment object, with fields replaced"""
+    payment = {
+        "student_name": "Ali Khan", "class_category": "Class 3", "fee_type": "Monthly Fee",
+        "amount": 2000, "payment_method": "Cash", "payment_date": "2025-05-02",
+        "signature": "bank", "months": ["APRIL", "MAY"]
+    }
+    return {**payment, **fields}
+
+def test_a_single_payment_is_saved_in_full():
+    status, payload = call("POST", "/payments", make_payment())
+    assert status == 201
+    assert payload["ok"]
+    records = ledger.load_ledger_frame()
+    assert sorted(records["Month"]) == ["APRIL", "MAY"]
+    # Without received_amount, every month is taken as paid in full
+    assert records["Received Amount"].sum() == 4000
+    assert records["Monthly Fee"].sum() == 4000
+
+def test_a_batch_saves_each_payment():
+    status, payload = call("POST", "/payments", {"payments": [
+        make_payment(),
+        make_payment(student_name="Sara Ahmed", fee_type="Annual Charges", amount=5000, months=None),
+    ]})
+    assert status == 200
+    assert [result["ok"] for result in payload["results"]] == [True, True]
+    assert ledger.count_ledger_rows() == 3
+
+def test_a_duplicate_payment_is_refused():
+    assert call("POST", "/payments", make_payment(months=["MAY"]))[0] == 201
+    status, payload = call("POST", "/payments", make_payment(months=["MAY"]))
+    assert status == 409
+    assert "already" in payload["error"].lower()
+    assert ledger.count_ledger_rows() == 1
+
+def test_a_malformed_item_fails_alone():
+    status, payload = call("POST", "/payments", {"payments": [
+        make_payment(fee_type="Tuition"),
+        make_payment(amount="a lot"),
+        make_payment(),
+    ]})
+    assert status == 200
+    results = payload["results"]
+    assert [result["ok"] for result in results] == [False, False, True]
+    assert "fee_type" in results[0]["error"]
+    assert ledger.count_ledger_rows() == 2
+
+    status, payload = call("POST", "/payments", make_payment(payment_date="02/05/2025"))
+    assert status == 400
+
+def test_records_and_totals_can_be_read_back():
+    call("POST", "/payments", make_payment())
+    student_id = call("GET", "/students/id", query_string="student_name=Ali Khan&class_category=Class 3")[1]["student_id"]
+    status, payload = call("GET", "/records", query_string=f"student_id={student_id}&month=MAY")
+    assert status == 200
+    assert payload["matched"] == 1
+    status, payload = call("GET", "/records/totals", query_string="group_by=Month")
+    assert status == 200
+    assert {row["Month"]: row["Received Amount"] for row in payload["totals"]} == {"APRIL": 2000, "MAY": 2000}
+    status, payload = call("GET", f"/students/{student_id}/unpaid-months", query_string="academic_year=2025-2026")
+    assert "MAY" not in payload["unpaid_months"]
+    status, payload = call("GET", f"/students/{student_id}/unpaid-months", query_string="academic_year=2026-2027")
+    assert "MAY" in payload["unpaid_months"]
+    receipt_number = ledger.load_ledger_frame()["Receipt No"].iloc[0]
+    status, payload = call("GET", f"/receipts/{receipt_number}")
+    assert status == 200
+    assert len(payload["records"]) == 2
+
+def test_amounts_must_be_whole_numbers():
+    for amount in [1999.9, True, "2000"]:
+        status, payload = call("POST", "/payments", make_payment(amount=amount))
+        assert status == 400
+        assert "whole number" in payload["error"]
+    status, payload = call("POST", "/payments", make_payment(received_amount=3999.5))
+    assert status == 400
+    assert ledger.count_ledger_rows() == 0
+
+def test_requests_need_the_api_key_when_one_is_set(monkeypatch):
+    monkeypatch.setenv("FEES_API_KEY", "s3cret")
+    assert call("GET", "/health")[0] == 401
+    assert call("GET", "/health", headers=[(b"x-api-key", b"wrong")])[0] == 401
+    assert call("GET", "/health", headers=[(b"x-api-key", b"s3cret")])[0] == 200
+
+def test_startup_initializes_every_school():
+    tenants.create_tenant("north", None)
+    with config.use_tenant("north"):
+        balances_file = config.data_path(config.BALANCES_FILE)
+    os.remove(balances_file)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+    async def receive():
+        return messages.pop(0)
+    async def send(message):
+        sent.append(message)
+    asyncio.run(api.app({"type": "lifespan"}, receive, send))
+    assert [message["type"] for message in sent] == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert os.path.exists(balances_file)
@@ -0,0 +1,74 @@
+from datetime import date
+from fees import audit, payments
+from tests.conftest import run_processes
+
+def record_monthly_fee(i):
+    """Record one month's fee for a fresh student"""
+    ok, message = payments.record_payment(
+        f"Student {i}", "Class 2", "B", "Monthly Fee", 1500, 1500,
+        "Cash", date(2025, 6, 3), "clerk", months=["JUNE"]
+    )
+    assert ok, message
+
+def test_verify_log_matches_the_ledger():
+    for i in range(5):
+        record_monthly_fee(i)
+    ok, message = audit.verify_log()
+    assert ok, message
+    assert message.startswith("5 events")
+
+def test_replay_applies_appends_and_removals_to_one_list():
+    rows = audit.pad_rows([["a"], ["b"], ["a"]])
+    same_rows = rows
+    audit.apply_event(rows, {"removed": [["a"]], "added": [["c"]]})
+    audit.apply_event(rows, {"removed": [], "added": [["d"]]})
+    assert rows is same_rows
+    assert [row[0] for row in rows] == ["b", "a", "c", "d"]
+
+    for i in range(3):
+        record_monthly_fee(i)
+    df = audit.rebuild_ledger()
+    payments.replace_records(df[df["Student Name"] != "Student 1"])
+    record_monthly_fee(3)
+    _, rows = audit.rebuild_rows()
+    assert sorted(row[1] for row in rows) == ["Student 0", "Student 2", "Student 3"]
+
+def test_verify_log_detects_an_edited_event():
+    for i in range(3):
+        record_monthly_fee(i)
+    segment = audit.list_segments()[0]
+    with open(segment) as f:
+        lines = f.readlines()
+    lines[1] = lines[1].replace('"clerk"', '"someone else"')
+    with open(segment, 'w') as f:
+        f.writelines(lines)
+    ok, message = audit.verify_log()
+    assert not ok
+    assert "Event 3" in message
+
+def test_events_from_concurrent_processes_form_one_chain(data_dir):
+    run_processes(
+        "from datetime import date\n"
+        "from fees import payments\n"
+        "for i in range(20):\n"
+        "    ok, message = payments.record_payment(f'Student {os.getpid()} {i}', 'Class 2', 'B', 'Monthly Fee',\n"
+        "                                         1500, 1500, 'Cash', date(2025, 6, 3), 'clerk', months=['JUNE'])\n"
+        "    assert ok, message\n",
+        data_dir, count=3
+    )
+    ok, message = audit.verify_log()
+    assert ok, message
+    assert message.startswith("60 events")
+
+def test_snapshots_are_written_off_the_save_path_and_pruned(monkeypatch):
+    monkeypatch.setattr(audit, "SNAPSHOT_EVERY", 2)
+    for i in range(12):
+        record_monthly_fee(i)
+        for thread in audit._snapshot_threads.values():
+            thread.join()
+    snapshots = audit.list_snapshots()
+    assert len(snapshots) == audit.MAX_SNAPSHOTS
+    assert audit.get_file_seq(snapshots[-1]) == 12
+    ok, message = audit.verify_log()
+    assert ok, message
+    assert len(audit.rebuild_rows(seq=7)[1]) == 7
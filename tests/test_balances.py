@@ -0,0 +1,55 @@
+from datetime import date, datetime
+from fees import balances, config, payments, schedules, storage, students
+
+def pay(student_name, fee_type, received, payment_date, months=None):
+    """Record one payment of a Class 2 student"""
+    ok, message = payments.record_payment(
+        student_name, "Class 2", "A", fee_type, received, received,
+        "Cash", payment_date, "clerk", months=months
+    )
+    assert ok, message
+
+def set_fees(student_name, monthly_fee, annual_charges, admission_fee):
+    """Set a Class 2 student's fee schedule"""
+    student_id = students.generate_student_id(student_name, "Class 2")
+    fees_data = schedules.load_student_fees()
+    fees_data[student_id] = {"monthly_fee": monthly_fee, "annual_charges": annual_charges, "admission_fee": admission_fee}
+    schedules.save_student_fees(fees_data)
+    return student_id
+
+def test_owed_comes_from_the_fee_schedule_for_the_months_due():
+    student_id = set_fees("Zara", 1500, 4000, 500)
+    pay("Zara", "Monthly Fee", 1000, date(2025, 4, 3), ["APRIL"])
+    pay("Zara", "Annual Charges", 4000, date(2025, 4, 3))
+    balance = balances.get_student_balance(student_id, "2025-2026", "JUNE")
+    assert balance == {"owed": 1500 * 3 + 4000 + 500, "received": 5000, "outstanding": 4000}
+
+def test_payments_count_only_towards_their_academic_year():
+    student_id = set_fees("Omar", 1000, 0, 0)
+    pay("Omar", "Monthly Fee", 1000, date(2025, 3, 3), ["MARCH"])
+    pay("Omar", "Monthly Fee", 1000, date(2025, 4, 3), ["APRIL"])
+    assert balances.get_student_balance(student_id, "2025-2026", "APRIL")["outstanding"] == 0
+    assert balances.get_student_balance(student_id, "2024-2025", "MARCH")["received"] == 1000
+
+def test_arrears_list_students_enrolled_this_year_or_last():
+    set_fees("Paid Up", 1000, 0, 0)
+    set_fees("Behind", 1000, 0, 0)
+    pay("Paid Up", "Monthly Fee", 12000, date(2024, 4, 3), config.MONTHS)
+    pay("Behind", "Monthly Fee", 1000, date(2023, 4, 3), ["APRIL"])
+    pay("Long Gone", "Monthly Fee", 2000, date(2021, 4, 3), ["APRIL"])
+    pay("Behind", "Monthly Fee", 1000, date(2024, 4, 3), ["APRIL"])
+    arrears = balances.get_arrears_list("2024-2025").set_index("Student Name")
+    assert arrears.index.tolist() == ["Behind"]
+    assert arrears.loc["Behind", "Outstanding"] == 11000
+
+def test_balances_kept_in_the_old_format_are_rebuilt():
+    pay("Zara", "Monthly Fee", 2000, date(2025, 4, 3), ["APRIL"])
+    student_id = students.generate_student_id("Zara", "Class 2")
+    storage.write_keyed_json(config.data_path(config.BALANCES_FILE), {student_id: {"owed": 2000, "received": 2000}})
+    payments.initialize_data_files()
+    assert balances.load_balances()[student_id]["received_by_year"] == {"2025-2026": 2000}
+
+def test_fees_are_due_up_to_this_month_this_year_and_all_of_an_earlier_year():
+    this_year = students.get_academic_year(datetime.now())
+    assert balances.get_due_month(this_year) == config.MONTHS[(datetime.now().month - 4) % 12]
+    assert balances.get_due_month(students.get_previous_academic_year(this_year)) == "MARCH"
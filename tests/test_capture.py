@@ -0,0 +1,82 @@
+import os
+import json
+from datetime import date
+import pytest
+from fees import capture, ledger, payments, storage
+
+def make_records(student_name="Sara Ahmed", fee_type="Annual Charges"):
+    """Build the records of one payment"""
+    return payments.build_fee_records(
+        student_name, "Class 4", "C", fee_type, 6000, 6000,
+        "Bank Transfer", date(2025, 8, 4), "clerk"
+    )
+
+def test_captured_entries_are_drained_into_the_ledger():
+    entry_ids = [capture.capture_records(make_records(f"Student {i}"), actor="clerk") for i in range(3)]
+    assert capture.wait_for_entries(entry_ids, 10) == ["saved"] * 3
+    assert ledger.count_ledger_rows() == 3
+
+def test_replaying_a_drained_journal_saves_nothing_twice():
+    entry_id = capture.capture_records(make_records(), actor="clerk")
+    assert capture.wait_for_entries([entry_id], 10) == ["saved"]
+    # As after a crash between saving the entries and recording the offset
+    journal = next(iter(capture._journals.values()))
+    with capture._capture_lock:
+        with open(journal["path"], 'a') as f:
+            f.write(json.dumps({"id": "replayed", "time": "", "actor": "clerk", "records": ledger.load_ledger_frame().to_dict('records')}) + "\n")
+    assert capture.flush()
+    assert ledger.count_ledger_rows() == 1
+    assert capture.load_rejected() == []
+
+def test_a_payment_already_recorded_is_rejected():
+    payments.save_records(make_records())
+    entry_id = capture.capture_records(make_records(), actor="clerk")
+    status = capture.wait_for_entries([entry_id], 10)[0]
+    assert status.startswith("rejected: Already recorded")
+    assert [entry["id"] for entry in capture.load_rejected()] == [entry_id]
+    assert ledger.count_ledger_rows() == 1
+
+def test_other_errors_keep_the_entry_for_a_retry(monkeypatch):
+    save_records = payments.save_records
+    def fail_to_save(records, actor=None):
+        raise json.JSONDecodeError("Expecting value", "", 0)
+    monkeypatch.setattr(payments, "save_records", fail_to_save)
+    entry_id = capture.capture_records(make_records(), actor="clerk")
+    assert capture.wait_for_entries([entry_id], 0.5) == ["pending"]
+    with pytest.raises(json.JSONDecodeError):
+        capture.flush()
+    assert capture.get_status(entry_id) == "pending"
+    assert capture.load_rejected() == []
+    assert capture._flusher.is_alive()
+
+    monkeypatch.setattr(payments, "save_records", save_records)
+    assert capture.flush()
+    assert capture.get_status(entry_id) == "saved"
+    assert ledger.count_ledger_rows() == 1
+
+def test_a_value_error_after_the_append_is_retried_not_rejected(monkeypatch):
+    from fees import balances
+    update_balances = balances.update_balances
+    def fail_to_update(records):
+        raise ValueError("could not convert string to float: '2,000'")
+    monkeypatch.setattr(balances, "update_balances", fail_to_update)
+    entry_id = capture.capture_records(make_records(), actor="clerk")
+    assert capture.wait_for_entries([entry_id], 0.5) == ["pending"]
+    assert capture.load_rejected() == []
+
+    # The records reached the ledger, so the retry marks the entry saved
+    monkeypatch.setattr(balances, "update_balances", update_balances)
+    assert capture.flush()
+    assert capture.get_status(entry_id) == "saved"
+    assert ledger.count_ledger_rows() == 1
+
+def test_an_abandoned_journal_is_drained_and_deleted():
+    # The journal of a process that exited before its entries were saved
+    path = os.path.join(capture.get_capture_dir(), f"{capture.JOURNAL_PREFIX}999999{capture.JOURNAL_SUFFIX}")
+    entry = {"id": "abandoned", "time": "", "actor": "clerk", "records": make_records()}
+    with open(path, 'w') as f:
+        f.write(json.dumps(entry) + "\n")
+    storage.write_json(f"{path}.offset", {"offset": 0})
+    assert capture.flush()
+    assert ledger.count_ledger_rows() == 1
+    assert not os.path.exists(path)
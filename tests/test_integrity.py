@@ -0,0 +1,45 @@
+import csv
+from datetime import date
+import pandas as pd
+from fees import config, integrity, payments
+
+def append_rows(rows):
+    """Append raw lines to the ledger CSV, as a hand edit would"""
+    with open(config.data_path(config.CSV_FILE), 'a', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+def make_ledger():
+    """Save two good payments and append a duplicate, a bad amount and a malformed line"""
+    for student_name in ["Ayesha", "Bilal"]:
+        ok, message = payments.record_payment(
+            student_name, "Class 8", "A", "Monthly Fee", 2500, 2500,
+            "Cash", date(2025, 4, 7), "clerk", months=["APRIL"]
+        )
+        assert ok, message
+    with open(config.data_path(config.CSV_FILE), newline='') as f:
+        first_row = list(csv.reader(f))[1]
+    bad_amount = list(first_row)
+    bad_amount[config.LEDGER_COLUMNS.index("Month")] = "MAY"
+    bad_amount[config.LEDGER_COLUMNS.index("Received Amount")] = "2,500"
+    append_rows([first_row, bad_amount, ["only", "three", "fields"]])
+
+def test_issues_are_reported_with_their_line_numbers(tmp_path):
+    make_ledger()
+    report_file = str(tmp_path / "report.csv")
+    # A tiny block size makes the scan cross several blocks
+    summary = integrity.check_ledger(report_file=report_file, block_size=256)
+    assert summary["rows"] == 5
+    assert summary["issues"] == {"duplicate_payment": 1, "bad_amount": 1, "malformed_line": 1}
+    report = pd.read_csv(report_file).set_index("Issue")
+    assert report.loc["duplicate_payment", "Line"] == 4
+    assert report.loc["bad_amount", "Line"] == 5
+    assert report.loc["malformed_line", "Line"] == 6
+
+def test_repair_drops_malformed_lines_and_zeroes_bad_amounts(tmp_path):
+    make_ledger()
+    repair_file = str(tmp_path / "repaired.csv")
+    integrity.check_ledger(repair_file=repair_file)
+    repaired = pd.read_csv(repair_file)
+    assert len(repaired) == 4
+    assert repaired["Received Amount"].tolist() == [2500, 2500, 2500, 0]
+    assert integrity.check_ledger(repair_file)["issues"] == {"duplicate_payment": 1}
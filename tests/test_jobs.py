@@ -0,0 +1,42 @@
+from datetime import date
+from fees import config, jobs, payments, tenants
+
+def pay_annual_charges(student_name, class_category="Class 7"):
+    """Record annual charges paid in full"""
+    ok, message = payments.record_payment(
+        student_name, class_category, "A", "Annual Charges", 5000, 5000,
+        "Cash", date(2025, 6, 2), "clerk"
+    )
+    assert ok, message
+
+def test_a_report_job_is_reused_until_the_ledger_changes():
+    pay_annual_charges("Asad")
+    job_id = jobs.submit_job("class_summary", {"academic_year": "2025-2026"}, "admin")
+    assert jobs.wait_for_job(job_id, 30)["status"] == "completed"
+    result = jobs.load_job_result(job_id)
+    assert result["Received Amount"].tolist() == [5000]
+    assert jobs.submit_job("class_summary", {"academic_year": "2025-2026"}, "admin") == job_id
+
+    pay_annual_charges("Bilal")
+    new_job_id = jobs.submit_job("class_summary", {"academic_year": "2025-2026"}, "admin")
+    assert new_job_id != job_id
+    assert jobs.wait_for_job(new_job_id, 30)["status"] == "completed"
+    assert jobs.load_job_result(new_job_id)["Received Amount"].tolist() == [10000]
+
+def test_a_job_runs_on_the_school_that_submitted_it():
+    pay_annual_charges("Main School Student")
+    tenants.create_tenant("north", None)
+    with config.use_tenant("north"):
+        job_id = jobs.submit_job("records_export", {"academic_year": None}, "admin")
+        assert jobs.wait_for_job(job_id, 30)["status"] == "completed"
+        assert jobs.load_job_result(job_id).empty
+
+def test_a_failing_job_records_its_error(monkeypatch):
+    def fail(params, report_progress, is_cancelled):
+        raise RuntimeError("disk full")
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "duplicate_scan", fail)
+    job_id = jobs.submit_job("duplicate_scan", {"academic_year": None}, "admin")
+    job = jobs.wait_for_job(job_id, 30)
+    assert job["status"] == "failed"
+    assert job["error"] == "disk full"
+    assert jobs.load_job_result(job_id) is None
@@ -0,0 +1,98 @@
+import os
+import csv
+import time
+import threading
+from datetime import date
+from fees import config, ledger, payments, tenants
+
+def make_records(i):
+    """Build the records of one monthly fee payment for a fresh student"""
+    return payments.build_fee_records(
+        f"Student {i}", "Class 1", "A", "Monthly Fee", 1000, 1000,
+        "Cash", date(2025, 7, 1), "clerk", months=["JULY"]
+    )
+
+def test_table_is_rebuilt_when_the_csv_changes_while_it_is_read(monkeypatch):
+    payments.save_records(make_records(0))
+    ledger._ledger_tables.clear()
+    load_ledger = ledger.load_ledger
+    calls = []
+    def load_ledger_then_append():
+        df = load_ledger()
+        if not calls:
+            # Another process appends a row just after this one read the CSV
+            with open(config.data_path(config.CSV_FILE), 'a', newline='') as f:
+                csv.DictWriter(f, fieldnames=config.LEDGER_COLUMNS, extrasaction='ignore').writerows(make_records(1))
+        calls.append(len(df))
+        return df
+    monkeypatch.setattr(ledger, "load_ledger", load_ledger_then_append)
+
+    table = ledger.get_ledger_table()
+    assert calls == [1, 2]
+    assert table.num_rows == 2
+
+def test_saves_during_rebuilds_are_not_applied_twice():
+    saving = threading.Event()
+    def save_payments():
+        for i in range(30):
+            payments.save_records(make_records(i))
+        saving.set()
+    writer = threading.Thread(target=save_payments)
+    writer.start()
+    while not saving.is_set():
+        # Force a rebuild from the CSV, as after another process's write
+        ledger._ledger_tables.clear()
+        ledger.get_ledger_table()
+    writer.join()
+    assert ledger.get_ledger_table().num_rows == ledger.count_ledger_rows() == 30
+
+def test_many_appends_are_compacted_without_reading_the_csv(monkeypatch):
+    monkeypatch.setattr(ledger, "MAX_CACHED_CHUNKS", 4)
+    payments.save_records(make_records(0))
+    ledger.get_ledger_table()
+    def fail_to_load():
+        raise AssertionError("the CSV was read again")
+    monkeypatch.setattr(ledger, "load_ledger", fail_to_load)
+    for i in range(1, 10):
+        payments.save_records(make_records(i))
+    table = ledger.get_ledger_table()
+    assert table.num_rows == 10
+    assert table.column(0).num_chunks < 5
+    assert sorted(table.column("Student Name").to_pylist()) == sorted(f"Student {i}" for i in range(10))
+
+def test_a_rebuild_holds_off_neither_other_schools_nor_saves(monkeypatch):
+    tenants.create_tenant("north", None)
+    payments.save_records(make_records(0))
+    with config.use_tenant("north"):
+        payments.save_records(make_records(1))
+        arrow_file = config.data_path(config.LEDGER_ARROW_FILE)
+        if os.path.exists(arrow_file):
+            os.remove(arrow_file)
+    ledger._ledger_tables.clear()
+
+    reading = threading.Event()
+    release = threading.Event()
+    load_ledger = ledger.load_ledger
+    def slow_load_ledger():
+        if config.get_tenant() == "north":
+            reading.set()
+            release.wait(10)
+        return load_ledger()
+    monkeypatch.setattr(ledger, "load_ledger", slow_load_ledger)
+    def read_north():
+        with config.use_tenant("north"):
+            ledger.get_ledger_table()
+    reader = threading.Thread(target=read_north)
+    reader.start()
+    assert reading.wait(10)
+    try:
+        start = time.perf_counter()
+        assert ledger.get_ledger_table().num_rows == 1
+        with config.use_tenant("north"):
+            payments.save_records(make_records(2))
+        assert time.perf_counter() - start < 5
+    finally:
+        release.set()
+        reader.join()
+    with config.use_tenant("north"):
+        assert ledger.get_ledger_table().num_rows == 2
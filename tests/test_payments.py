@@ -0,0 +1,69 @@
+import csv
+import threading
+from datetime import date
+from fees import config, idempotency, ledger, payments, query
+from tests.conftest import run_processes
+
+def record_annual_charges(student_name="Ali Khan"):
+    """Record the same annual charges payment for a student"""
+    return payments.record_payment(
+        student_name, "Class 3", "A", "Annual Charges", 5000, 5000,
+        "Cash", date(2025, 5, 2), "clerk"
+    )
+
+def test_record_payment_saves_one_row_per_month():
+    ok, records = payments.record_payment(
+        "Ali Khan", "Class 3", "A", "Monthly Fee", 2000, 3000,
+        "Cash", date(2025, 5, 2), "clerk", months=["APRIL", "MAY"]
+    )
+    assert ok
+    saved = query.find_records(student_id=records[0]["ID"])
+    assert sorted(saved["Month"]) == ["APRIL", "MAY"]
+    assert saved["Received Amount"].sum() == 3000
+    assert saved["Academic Year"].unique().tolist() == ["2025-2026"]
+    assert len(set(saved["Receipt No"])) == 1
+
+def test_record_payment_rejects_a_payment_already_made():
+    assert record_annual_charges()[0]
+    ok, message = record_annual_charges()
+    assert not ok
+    assert "already" in message.lower()
+    assert len(ledger.load_ledger_frame()) == 1
+
+def test_duplicate_payments_from_threads_save_once():
+    results = []
+    def record():
+        results.append(record_annual_charges()[0])
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+    assert len(ledger.load_ledger_frame()) == 1
+
+def test_duplicate_payments_from_processes_save_once(data_dir):
+    outputs = run_processes(
+        "from datetime import date\n"
+        "from fees import payments\n"
+        "ok, _ = payments.record_payment('Ali Khan', 'Class 3', 'A', 'Annual Charges', 5000, 5000,\n"
+        "                                'Cash', date(2025, 5, 2), 'clerk')\n"
+        "print(ok)\n",
+        data_dir, count=4
+    )
+    assert [output.strip() for output in outputs].count("True") == 1
+    saved = ledger.load_ledger_frame()
+    assert len(saved) == 1
+    assert saved["Receipt No"].nunique() == 1
+
+def test_malformed_amounts_do_not_break_the_payment_index():
+    ok, records = record_annual_charges()
+    assert ok
+    # A row typed in by hand with a thousands separator in a fee column
+    malformed = dict(records[0], **{"Student Name": "Hina Raza", "ID": "HR-1", "Annual Charges": "2,000"})
+    with open(config.data_path(config.CSV_FILE), 'a', newline='') as f:
+        csv.DictWriter(f, fieldnames=config.LEDGER_COLUMNS, extrasaction='ignore').writerow(malformed)
+    idempotency.rebuild_index()
+    assert idempotency.find_conflicts([idempotency.get_record_key(records[0])])
+    assert not idempotency.find_conflicts([idempotency.get_record_key(malformed)])
+    assert not idempotency.is_paid_record(malformed)
@@ -0,0 +1,40 @@
+from datetime import date
+import pytest
+from fees import config, ledger, payments, query
+
+def save_payments(start, count):
+    """Save monthly fees for students spread over classes, methods and dates"""
+    for i in range(start, start + count):
+        payments.save_records(payments.build_fee_records(
+            f"Student {i}", config.CLASS_CATEGORIES[i % 3], "A", "Monthly Fee", 1000, 1000 + i,
+            config.PAYMENT_METHODS[i % 2], date(2025, 4 + i % 3, 1 + i % 5), "clerk",
+            months=[config.MONTHS[i % 4]]
+        ))
+
+def expected_rows(df, **filters):
+    """Filter the whole ledger frame with pandas, as the query layer should"""
+    for name, values in filters.items():
+        df = df[df[query.FILTER_COLUMNS[name]].isin(values)]
+    return sorted(df["Receipt No"])
+
+def test_filtered_reads_match_a_full_scan_after_more_saves():
+    save_payments(0, 30)
+    # Build the indexes, then save more rows so they are extended in place
+    query.find_records(["ID"], class_category="Nursery", month=["APRIL"])
+    save_payments(30, 15)
+    df = ledger.load_ledger_frame()
+    filters = {"class_category": ["Nursery", "KGI"], "month": ["APRIL", "MAY"], "payment_method": ["Cash"]}
+    found = query.find_records(["Receipt No"], **filters)
+    assert sorted(found["Receipt No"]) == expected_rows(df, **filters)
+    assert len(found) > 0
+
+def test_date_bounds_are_inclusive_and_totals_match():
+    save_payments(0, 20)
+    found = query.find_records(date_from="2025-05-01", date_to=date(2025, 5, 3))
+    assert sorted(found["Date"].unique()) == ["01-05-2025", "02-05-2025", "03-05-2025"]
+    totals = query.aggregate_records(value_columns=["Received Amount"], date_from="2025-05-01", date_to="2025-05-03")
+    assert totals == {"Received Amount": int(found["Received Amount"].sum()), "Rows": len(found)}
+
+def test_unknown_filters_are_refused():
+    with pytest.raises(ValueError, match="student"):
+        query.find_records(student="X")
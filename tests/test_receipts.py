@@ -0,0 +1,36 @@
+import threading
+from datetime import date
+from fees import payments, receipts
+from tests.conftest import run_processes
+
+def test_receipt_numbers_are_unique_across_threads():
+    numbers = []
+    def allocate():
+        for _ in range(40):
+            numbers.extend(receipts.allocate_receipt_numbers("2025-2026", 3))
+    threads = [threading.Thread(target=allocate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(numbers) == len(set(numbers)) == 480
+
+def test_receipt_numbers_are_unique_across_processes(data_dir):
+    outputs = run_processes(
+        "from fees import receipts\n"
+        "for _ in range(30):\n"
+        "    print('\\n'.join(receipts.allocate_receipt_numbers('2025-2026', 7)))\n",
+        data_dir, count=3
+    )
+    numbers = [line for output in outputs for line in output.split()]
+    assert len(numbers) == len(set(numbers)) == 630
+    assert all(number.startswith("2025-26/") for number in numbers)
+
+def test_a_saved_payment_can_be_found_by_its_receipt():
+    receipt_numbers = payments.save_records(payments.build_fee_records(
+        "Ali Khan", "Class 3", "A", "Monthly Fee", 2000, 4000,
+        "Cash", date(2025, 5, 2), "clerk", months=["APRIL", "MAY"]
+    ))
+    assert receipt_numbers == ["2025-26/000001"]
+    found = receipts.find_receipt(receipt_numbers[0])
+    assert sorted(found["Month"]) == ["APRIL", "MAY"]
@@ -0,0 +1,46 @@
+import os
+from datetime import date
+from fees import config, payments, reminders, schedules, students
+
+def pay_monthly_fee(student_name, payment_date, months):
+    """Record monthly fees paid in full"""
+    ok, message = payments.record_payment(
+        student_name, "Class 5", "A", "Monthly Fee", 2000, 2000 * len(months),
+        "Cash", payment_date, "clerk", months=months
+    )
+    assert ok, message
+
+def test_a_student_who_has_paid_nothing_this_year_is_listed():
+    pay_monthly_fee("Last Year Only", date(2025, 2, 1), ["FEBRUARY"])
+    pay_monthly_fee("Paid Up", date(2025, 5, 1), ["APRIL", "MAY"])
+    defaulters = reminders.find_defaulters("2025-2026", "MAY").set_index("Student Name")
+    assert sorted(defaulters.index) == ["Last Year Only", "Paid Up"]
+    row = defaulters.loc["Last Year Only"]
+    assert row["Unpaid Months"] == "APRIL, MAY"
+    assert row["Monthly Due"] == 4000
+    assert row["Annual Charges Due"] > 0
+    # Still owes the yearly fees, but no months
+    assert defaulters.loc["Paid Up", "Monthly Due"] == 0
+
+def test_a_student_with_fees_set_is_listed_from_an_older_year():
+    pay_monthly_fee("Long Gone", date(2022, 5, 1), ["MAY"])
+    pay_monthly_fee("Returning", date(2022, 5, 1), ["MAY"])
+    student_id = students.generate_student_id("Returning", "Class 5")
+    schedules.save_student_fees({student_id: {"monthly_fee": 1500, "annual_charges": 0, "admission_fee": 0}})
+    defaulters = reminders.find_defaulters("2025-2026", "APRIL")
+    assert defaulters["Student Name"].tolist() == ["Returning"]
+    assert defaulters["Total Due"].tolist() == [1500]
+
+def test_a_month_paid_last_year_is_due_and_can_be_paid_this_year():
+    pay_monthly_fee("Two Years", date(2024, 4, 5), ["APRIL"])
+    student_id = students.generate_student_id("Two Years", "Class 5")
+    assert "APRIL" in students.get_unpaid_months(student_id, "2025-2026")
+    assert "APRIL" not in students.get_unpaid_months(student_id, "2024-2025")
+    defaulters = reminders.find_defaulters("2025-2026", "APRIL")
+    assert defaulters["Unpaid Months"].tolist() == ["APRIL"]
+    pay_monthly_fee("Two Years", date(2025, 4, 5), ["APRIL"])
+    assert reminders.find_defaulters("2025-2026", "APRIL")["Monthly Due"].tolist() == [0]
+
+def test_no_ledger_means_no_defaulters():
+    os.remove(config.data_path(config.CSV_FILE))
+    assert reminders.find_defaulters("2025-2026", "MAY").empty
@@ -0,0 +1,33 @@
+import os
+import pandas as pd
+from fees import config, reports
+
+def make_frame():
+    """A small ledger frame of monthly fees over two years and two classes"""
+    return pd.DataFrame([
+        {"Academic Year": year, "Class Category": category, "Month": "APRIL",
+         "Monthly Fee": 2000, "Annual Charges": 0, "Admission Fee": 0, "Received Amount": received}
+        for year in ["2024-2025", "2025-2026"]
+        for category, received in [("Class 1", 2000), ("Class 2", 1500), ("Class 2", 2000)]
+    ])
+
+def test_few_cpus_keep_reports_in_one_process(monkeypatch):
+    monkeypatch.setattr(reports, "PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    def fail_to_write(*args, **kwargs):
+        raise AssertionError("partitions written")
+    monkeypatch.setattr(reports, "write_partitions", fail_to_write)
+    report = reports.class_totals_report(make_frame()).set_index(["Academic Year", "Class Category"])
+    assert report.loc[("2025-2026", "Class 2"), "Received Amount"] == 3500
+    assert report.loc[("2025-2026", "Class 2"), "Records"] == 2
+
+def test_worker_processes_give_the_same_totals(monkeypatch):
+    expected = reports.monthly_collections_report(make_frame())
+    monkeypatch.setattr(reports, "PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setattr(reports, "PARALLEL_MIN_CPUS", 1)
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    report = reports.monthly_collections_report(make_frame())
+    columns = ["Academic Year", "Month"] + config.AMOUNT_COLUMNS + ["Records"]
+    assert report[columns].sort_values("Academic Year").reset_index(drop=True).equals(
+        expected[columns].sort_values("Academic Year").reset_index(drop=True)
+    )
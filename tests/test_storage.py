@@ -0,0 +1,50 @@
+import os
+from datetime import date
+from fees import balances, config, ledger, payments, rollups, storage
+
+def test_keyed_store_saves_only_the_changed_keys(data_dir, monkeypatch):
+    path = os.path.join(data_dir, "store.json")
+    storage.write_keyed_json(path, {"a": 1, "b": 2})
+    storage.update_keyed_json(path, {"b": 3})
+    storage.update_keyed_json(path, {"c": 4})
+    assert storage.load_keyed_json(path) == {"a": 1, "b": 3, "c": 4}
+    assert storage.read_json(path) == {"a": 1, "b": 2}
+
+    # Another process reads the file and every delta from scratch
+    storage._keyed_files.clear()
+    assert storage.load_keyed_json(path) == {"a": 1, "b": 3, "c": 4}
+
+    monkeypatch.setattr(storage, "MAX_DELTA_BYTES", 10)
+    storage.update_keyed_json(path, {"a": 5})
+    assert storage.read_json(path) == {"a": 5, "b": 3, "c": 4}
+    assert os.path.getsize(storage.get_deltas_path(path)) == 0
+    assert storage.load_keyed_json(path) == {"a": 5, "b": 3, "c": 4}
+
+def test_keyed_store_data_already_loaded_is_not_changed(data_dir):
+    path = os.path.join(data_dir, "store.json")
+    storage.write_keyed_json(path, {"a": 1})
+    loaded = storage.load_keyed_json(path)
+    storage.update_keyed_json(path, {"a": 2})
+    assert storage.load_keyed_json(path) == {"a": 2}
+    assert loaded == {"a": 1}
+
+def test_running_balances_match_a_rebuild_from_the_ledger():
+    for i, received in enumerate([2000, 1500, 0, 2000]):
+        payments.save_records(payments.build_fee_records(
+            f"Student {i % 2}", "Class 6", "A", "Monthly Fee", 2000, received,
+            "Cash", date(2025, 9, 1), "clerk", months=[config.MONTHS[i]]
+        ))
+    assert balances.load_balances() == balances.rebuild_balances(ledger.load_ledger())
+    # Twelve months at 2000 plus the default annual charges and admission fee
+    arrears = balances.get_arrears_list("2025-2026")
+    assert arrears["Received"].tolist() == [2000, 3500]
+    assert arrears["Outstanding"].tolist() == [30000 - 2000, 30000 - 3500]
+
+def test_running_rollups_match_a_rebuild_from_the_ledger():
+    for i in range(6):
+        payments.save_records(payments.build_fee_records(
+            f"Student {i}", "Class 6", "A", "Monthly Fee", 2000, 2000,
+            config.PAYMENT_METHODS[i % 2], date(2025, 9, 1 + i % 3), "clerk", months=["SEPTEMBER"]
+        ))
+    assert rollups.load_rollups() == rollups.rebuild_rollups(ledger.load_ledger())
+    assert len(rollups.load_rollups()) == 6
@@ -0,0 +1,35 @@
+import time
+from fees import subscriptions, users
+
+DAY = subscriptions.DAY_SECONDS
+
+def test_expiry_is_indexed_and_refreshed_when_users_change():
+    users.create_user("trial", "secret", "trial@gmail.com")
+    now = time.time()
+    assert subscriptions.is_active("trial", now)
+    assert not subscriptions.is_active("trial", now + 31 * DAY)
+    assert not subscriptions.is_active("nobody", now)
+
+    assert subscriptions.extend_trials(10, usernames=["trial"]) == 1
+    assert subscriptions.is_active("trial", now + 31 * DAY)
+
+def test_expiring_accounts_are_listed_soonest_first():
+    for name in ["a", "b", "c"]:
+        users.create_user(name, "secret", f"{name}@gmail.com")
+    subscriptions.extend_trials(5, usernames=["b"])
+    subscriptions.extend_trials(1, usernames=["c"])
+    now = time.time()
+    assert [name for _, name in subscriptions.list_expiring(32 * DAY, now)] == ["a", "c"]
+    assert [name for _, name in subscriptions.list_expiring(40 * DAY, now)] == ["a", "c", "b"]
+    assert subscriptions.list_expiring(DAY, now) == []
+
+def test_an_old_account_with_only_a_text_expiry_is_read():
+    users.create_user("old", "secret", "old@gmail.com")
+    with users.get_users_lock():
+        all_users = users.load_users()
+        del all_users["old"]["trial_end_ts"]
+        all_users["old"]["trial_end"] = "2000-01-01 00:00:00"
+        users.save_users(all_users)
+    assert not subscriptions.is_active("old")
+    assert subscriptions.extend_trials(2, usernames=["old"]) == 1
+    assert 0 < subscriptions.get_remaining_seconds("old") <= 2 * DAY
@@ -0,0 +1,36 @@
+from datetime import date
+import pytest
+from fees import config, ledger, payments, query, tenants, users
+
+def pay_annual_charges(student_name):
+    """Record annual charges paid in full"""
+    ok, message = payments.record_payment(
+        student_name, "Class 9", "B", "Annual Charges", 7000, 7000,
+        "Cash", date(2025, 7, 1), "clerk"
+    )
+    assert ok, message
+
+def test_each_school_sees_only_its_own_records_and_accounts():
+    assert tenants.create_tenant("north", "North Campus")[0]
+    assert tenants.create_tenant("south", None)[0]
+    with config.use_tenant("north"):
+        pay_annual_charges("Same Name")
+        users.create_user("clerk", "secret", "clerk@gmail.com")
+    with config.use_tenant("south"):
+        # The same student and payment are new at another school
+        pay_annual_charges("Same Name")
+        pay_annual_charges("Only South")
+        assert ledger.count_ledger_rows() == 2
+        assert users.load_users() == {}
+    with config.use_tenant("north"):
+        assert query.find_records(["Student Name"])["Student Name"].tolist() == ["Same Name"]
+        assert users.authenticate_user("clerk", "secret")[0]
+    assert ledger.count_ledger_rows() == 0
+
+def test_school_ids_are_checked():
+    assert tenants.create_tenant("north", None)[0]
+    assert not tenants.create_tenant("north", None)[0]
+    assert not tenants.create_tenant("../etc", None)[0]
+    assert tenants.tenant_exists("north") and not tenants.tenant_exists("east")
+    with pytest.raises(ValueError):
+        config.set_tenant("../etc")
@@ -0,0 +1,16 @@
+from fees import users
+from tests.conftest import run_processes
+
+def test_concurrent_account_changes_are_all_kept(data_dir):
+    outputs = run_processes(
+        "from fees import subscriptions, users\n"
+        "for i in range(20):\n"
+        "    name = f'user{os.getpid()}x{i}'\n"
+        "    ok, message = users.create_user(name, 'secret', f'{name}@gmail.com')\n"
+        "    assert ok, message\n"
+        "    subscriptions.extend_trials(1)\n"
+        "print('done')\n",
+        data_dir, count=4
+    )
+    assert [output.strip() for output in outputs] == ["done"] * 4
+    assert len(users.load_users()) == 80